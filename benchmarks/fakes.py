@@ -0,0 +1,118 @@
+"""Deterministic stand-ins for GigaChat and GigaChat embeddings.
+
+Responses depend only on the prompt, latency is simulated with sleeps, so
+pipeline benchmarks are reproducible and need no API key.
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+DISHES = [
+    "Овсянка с ягодами", "Омлет с овощами", "Сырники со сметаной", "Гречка с грибами", "Курица с рисом",
+    "Суп с фрикадельками", "Борщ", "Паста с томатами", "Рыба с картофелем", "Салат с тунцом",
+    "Тушеные овощи с индейкой", "Плов", "Чечевичный суп", "Творожная запеканка", "Греческий салат",
+    "Котлеты с пюре", "Лосось с брокколи", "Рагу из кабачков", "Блины с творогом", "Куриный суп",
+]
+
+PRODUCTS = ["Куриное филе", "Рис", "Гречка", "Овсянка", "Молоко", "Творог", "Морковь", "Картофель", "Лук",
+            "Брокколи", "Томаты", "Сыр", "Лосось", "Кабачок", "Сметана", "Мука"]
+
+WORDS = ["Куриное", "филе", "—", "200", "г", "Рис", "100", "Морковь", "1", "шт", "Калории:", "450,",
+         "Белки:", "35", "Жиры:", "10", "Углеводы:", "50", "Отварить,", "обжарить", "и", "подать."]
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+class FakeChatModel(SimpleChatModel):
+    """Chat model that answers each pipeline prompt in the expected format.
+
+    `latency` is the delay before the first token, `token_delay` the delay
+    per token and `tokens` the length of free-form answers (plans and
+    shopping lists).
+    """
+
+    latency: float = 0.0
+    token_delay: float = 0.0
+    tokens: int = 200
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gigachat"
+
+    def _response(self, prompt):
+        rng = np.random.default_rng(_seed(prompt))
+        if "Дни готовки" in prompt:
+            return "Дни готовки: 3; Время готовки: 60 минут."
+        if "список из ровно 10 блюд" in prompt:
+            return "\n".join(rng.choice(DISHES, size=10, replace=False))
+        if "Составь итоговый план питания" in prompt:
+            # План в формате из промпта: по приему пищи на треть ответа, с разбираемым списком ингредиентов
+            meals = []
+            for meal, dish in zip(("Завтрак", "Обед", "Ужин"), rng.choice(DISHES, size=3, replace=False)):
+                products = rng.choice(PRODUCTS, size=4, replace=False)
+                amounts = [int(rng.integers(1, 20)) * 10 for _ in products]
+                description = " ".join(rng.choice(WORDS, size=max(self.tokens // 3 - 20, 1)))
+                meals.append((meal, str(dish), description, list(zip(products, amounts))))
+            if '"meals"' in prompt:
+                return json.dumps({"meals": [
+                    {"meal": meal, "dish": dish, "description": description,
+                     "ingredients": [{"name": str(product), "amount": amount, "unit": "г"}
+                                     for product, amount in ingredients],
+                     "calories": 450, "proteins": 35, "fats": 10, "carbs": 50}
+                    for meal, dish, description, ingredients in meals]}, ensure_ascii=False)
+            return "\n\n".join(
+                f"**{meal}:**\n{dish}\n{description}\nИнгредиенты: ["
+                + ", ".join(f'"{product} - {amount} г"' for product, amount in ingredients) + "]"
+                for meal, dish, description, ingredients in meals)
+        words = rng.choice(WORDS, size=self.tokens)
+        return "**Список продуктов:**\n" + " ".join(words)
+
+    def _call(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+              **kwargs: Any) -> str:
+        response = self._response(messages[-1].content)
+        time.sleep(self.latency + self.token_delay * len(response.split()))
+        return response
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = self._response(messages[-1].content)
+        time.sleep(self.latency)
+        for word in response.split(" "):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class FakeEmbeddings(Embeddings):
+    """Hash-seeded unit vectors with a fixed delay per call and per text."""
+
+    def __init__(self, size=256, latency=0.0, text_latency=0.0):
+        self.size = size
+        self.latency = latency
+        self.text_latency = text_latency
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        vector = np.random.default_rng(_seed(text)).normal(size=self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        time.sleep(self.latency + self.text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
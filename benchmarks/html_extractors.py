@@ -0,0 +1,96 @@
+"""Throughput and peak memory of the recipe HTML extraction backends.
+
+Parses every *.html file in a directory of saved recipe pages with each
+installed backend and checks that the result matches the bs4 backend.
+Without a directory the sample pages from tests/fixtures are used:
+
+    python -m benchmarks.html_extractors --rounds 50
+    python -m benchmarks.html_extractors path/to/pages --rounds 3
+
+Each backend runs in a separate process so peak RSS is not shared.
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from utils.recipe_extractors import available_backends, get_extractor
+
+FIXTURE_PAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "tests", "fixtures", "eda", "recipes")
+
+
+def load_pages(pages_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append((path, f.read()))
+    return pages
+
+
+def run_backend(backend, pages_dir, rounds):
+    pages = load_pages(pages_dir)
+    extractor = get_extractor(backend)
+    reference = get_extractor("bs4")
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = [extractor.extract_recipe(html, path) for path, html in pages]
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Пик памяти Python меряем отдельным проходом: tracemalloc сильно замедляет разбор
+    tracemalloc.start()
+    for path, html in pages:
+        extractor.extract_recipe(html, path)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mismatches = sum(1 for (path, html), result in zip(pages, results)
+                     if result != reference.extract_recipe(html, path))
+    return {
+        "backend": backend,
+        "pages": len(pages) * rounds,
+        "seconds": elapsed,
+        "pages_per_sec": len(pages) * rounds / elapsed if elapsed else 0.0,
+        "python_peak_mb": python_peak / 2 ** 20,
+        "rss_growth_mb": (rss_after - rss_before) / 1024,  # ru_maxrss в килобайтах (Linux)
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages_dir", nargs="?", default=FIXTURE_PAGES,
+                        help="каталог с сохраненными страницами рецептов (*.html), по умолчанию — тестовые страницы")
+    parser.add_argument("--rounds", type=int, default=3, help="сколько раз прогнать весь каталог")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.pages_dir, args.rounds)))
+        return
+
+    if not load_pages(args.pages_dir):
+        sys.exit(f"В каталоге {args.pages_dir} нет файлов *.html")
+
+    print(f"{'бэкенд':<11} {'страниц':>7} {'стр/с':>9} {'пик Python, МБ':>15} {'рост RSS, МБ':>13} {'расхождений':>11}")
+    for backend in available_backends():
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.html_extractors", args.pages_dir,
+             "--rounds", str(args.rounds), "--backend", backend],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['backend']:<11} {result['pages']:>7} {result['pages_per_sec']:>9.1f} "
+              f"{result['python_peak_mb']:>15.1f} {result['rss_growth_mb']:>13.1f} {result['mismatches']:>11}")
+
+
+if __name__ == "__main__":
+    main()
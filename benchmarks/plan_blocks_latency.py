@@ -0,0 +1,48 @@
+"""Latency of sequential vs parallel day-block generation.
+
+LLM calls are replaced by sleeps, so the numbers show only how the
+orchestration scales with the number of cooking days:
+
+    python -m benchmarks.plan_blocks_latency --plan-latency 6 --shopping-latency 4
+"""
+import argparse
+import time
+
+from utils.plan_blocks import split_days_into_blocks, generate_blocks_sequential, generate_blocks_parallel
+
+
+def make_fake_stage(latency, name):
+    def stage(text, block_days, current_state):
+        time.sleep(latency)
+        return f"{name}: {', '.join(block_days)}"
+    return stage
+
+
+def measure(generate_blocks, blocks, recipes, plan_latency, shopping_latency):
+    start = time.perf_counter()
+    generate_blocks(blocks, recipes,
+                    make_fake_stage(plan_latency, "План"),
+                    make_fake_stage(shopping_latency, "Закупки"))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plan-latency", type=float, default=0.6, help="секунд на один вызов generate_final_plan")
+    parser.add_argument("--shopping-latency", type=float, default=0.4,
+                        help="секунд на один вызов generate_shopping_schedule")
+    parser.add_argument("--recipes", type=int, default=10, help="сколько рецептов найдено для плана")
+    args = parser.parse_args()
+
+    recipes = [f"Рецепт {i}" for i in range(args.recipes)]
+
+    print(f"{'дни готовки':>11} {'блоков':>6} {'последовательно, с':>19} {'параллельно, с':>15} {'ускорение':>9}")
+    for cooking_days in range(1, 8):
+        blocks = split_days_into_blocks(cooking_days)
+        sequential = measure(generate_blocks_sequential, blocks, recipes, args.plan_latency, args.shopping_latency)
+        parallel = measure(generate_blocks_parallel, blocks, recipes, args.plan_latency, args.shopping_latency)
+        print(f"{cooking_days:>11} {len(blocks):>6} {sequential:>19.2f} {parallel:>15.2f} {sequential / parallel:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""End-to-end latency and throughput of the meal plan pipeline, offline.
+
+GigaChat and its embeddings are replaced by the deterministic fakes from
+benchmarks.fakes, and all indexes, caches and conversation memory go to a
+temporary directory. One cold plan is built first, then `--users` plans are
+submitted at once through PlanGenerationService:
+
+    python -m benchmarks.plan_pipeline --users 8 --workers 2 --llm-latency 0.5 --token-delay 0.005
+
+The report lists wall time per pipeline stage, LLM and embedding calls and
+prompt sizes; `--metrics` also prints what /metrics would export. `--edit`
+also times an /edit_plan request against a freshly built plan:
+
+    python -m benchmarks.plan_pipeline --users 1 --edit "Замени ужин в среду на рыбу"
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+
+class StageStats:
+    """Collects stage timings and LLM prompt sizes reported by utils.instrumentation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seconds = defaultdict(list)
+            self.prompt_chars = []
+            self.output_chars = []
+
+    def __call__(self, name, seconds, info):
+        with self._lock:
+            self.seconds[name].append(seconds)
+            if name == "llm":
+                self.prompt_chars.append(info["prompt_chars"])
+                self.output_chars.append(info.get("output_chars", 0))
+
+    def report(self, title, embeddings_calls, embeddings_texts):
+        print(f"\n{title}")
+        print(f"{'этап':<18} {'вызовов':>8} {'всего, с':>9} {'среднее, с':>11} {'макс, с':>8}")
+        for name, values in self.seconds.items():
+            print(f"{name:<18} {len(values):>8} {sum(values):>9.2f} {statistics.mean(values):>11.3f} "
+                  f"{max(values):>8.3f}")
+        if self.prompt_chars:
+            print(f"LLM: {len(self.prompt_chars)} вызовов, промпт в среднем {statistics.mean(self.prompt_chars):.0f} "
+                  f"символов (макс {max(self.prompt_chars)}), ответ в среднем "
+                  f"{statistics.mean(self.output_chars):.0f} символов")
+        print(f"Эмбеддинги: {embeddings_calls} вызовов, {embeddings_texts} текстов")
+
+
+def make_profile(user_id, cooking_days):
+    return {
+        "about_user": f"Пользователь {user_id}, 30 лет, хочет питаться сбалансированно",
+        "forbidden_products": ["грибы", "орехи", ""][user_id % 3],
+        "favorite_products": ["курица, рис", "рыба, овощи", "творог, ягоды"][user_id % 3],
+        "cooking_preferences": f"Готовлю {cooking_days} раза в неделю, до часа",
+        "cooking_analysis": None,
+    }
+
+
+class NullProgress:
+    # Включает потоковую генерацию, как при работе бота, но никуда не отправляет текст
+    def on_token(self, block_index, text):
+        pass
+
+    def on_block_done(self, block_index, block_plan, block_shopping):
+        pass
+
+
+async def run_users(ai_tools, users, workers, cooking_days, stream):
+    from utils.plan_service import PlanGenerationService
+
+    service = PlanGenerationService(workers, queue_size=users)
+    await service.start()
+    latencies = []
+
+    async def one_user(user_id):
+        start = time.perf_counter()
+        await service.submit(user_id, ai_tools.create_meal_and_coocking_plan, user_id,
+                             user_info=make_profile(user_id, cooking_days),
+                             progress=NullProgress() if stream else None)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_user(user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - start
+    await service.shutdown()
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4, help="сколько пользователей одновременно строят план")
+    parser.add_argument("--workers", type=int, default=2, help="воркеров PlanGenerationService")
+    parser.add_argument("--cooking-days", type=int, default=3, help="дней готовки в профиле")
+    parser.add_argument("--block-mode", choices=["parallel", "sequential"], default="parallel")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="секунд до первого токена")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="секунд на токен ответа")
+    parser.add_argument("--tokens", type=int, default=200, help="длина плана и списка покупок в токенах")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="секунд на вызов эмбеддингов")
+    parser.add_argument("--stream", action="store_true", help="стримить ответы, как при работе бота")
+    parser.add_argument("--metrics", action="store_true", help="напечатать метрики в формате Prometheus")
+    parser.add_argument("--edit", help="текст правки для /edit_plan: замерить частичную перестройку плана")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="plan_bench_")
+    os.environ.update({
+        "RECIPES_STORE": os.path.join(workdir, "recipes.jsonl"),
+        "CHROMA_DIR": os.path.join(workdir, "chroma"),
+        "QUERY_CACHE_PATH": os.path.join(workdir, "query_cache.sqlite"),
+        "MEMORY_DIR": os.path.join(workdir, "memory"),
+        "PLAN_BLOCK_MODE": args.block_mode,
+    })
+
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+    from utils.instrumentation import add_stage_listener
+    from utils.llm_backends import set_backends
+    from utils.metrics import observe_stage, registry
+
+    embeddings = FakeEmbeddings(latency=args.embed_latency)
+    set_backends(llm=FakeChatModel(latency=args.llm_latency, token_delay=args.token_delay, tokens=args.tokens),
+                 embeddings=embeddings)
+    stats = StageStats()
+    add_stage_listener(stats)
+    add_stage_listener(observe_stage)
+
+    start = time.perf_counter()
+    from utils import ai_tools
+    print(f"Загрузка utils.ai_tools (индекс, кэши): {time.perf_counter() - start:.2f} с, "
+          f"эмбеддингов при построении индекса: {embeddings.texts}")
+
+    def measure(title, users):
+        stats.reset()
+        calls, texts = embeddings.calls, embeddings.texts
+        elapsed, latencies = asyncio.run(run_users(ai_tools, users, args.workers, args.cooking_days, args.stream))
+        stats.report(title, embeddings.calls - calls, embeddings.texts - texts)
+        latencies.sort()
+        print(f"Время: {elapsed:.2f} с, {users / elapsed * 60:.1f} планов в минуту, "
+              f"задержка p50 {latencies[len(latencies) // 2]:.2f} с, макс {latencies[-1]:.2f} с")
+
+    measure("Один пользователь (холодный кэш):", 1)
+    measure(f"{args.users} пользователей одновременно, {args.workers} воркеров:", args.users)
+    if args.edit:
+        profile = make_profile(1, args.cooking_days)
+        plan = ai_tools.create_meal_and_coocking_plan(1, profile)
+        stats.reset()
+        calls, texts = embeddings.calls, embeddings.texts
+        start = time.perf_counter()
+        plan, changed_blocks = ai_tools.edit_meal_plan(1, profile, plan, args.edit,
+                                                       progress=NullProgress() if args.stream else None)
+        elapsed = time.perf_counter() - start
+        stats.report(f"Правка \"{args.edit}\":", embeddings.calls - calls, embeddings.texts - texts)
+        print(f"Время: {elapsed:.2f} с, перестроено блоков: {len(changed_blocks)} из {len(plan['blocks'])}")
+    if args.metrics:
+        print()
+        print(registry.render(), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Bot startup time: import of main.py and time to the first answered update.
+
+The bot runs in a child process in webhook mode inside a temporary working
+directory, talking to a stub Bot API server started by this script
+(TELEGRAM_API_URL), so no network access or real token is needed. A
+synthetic /help update is posted as soon as /health answers; the clock
+stops when the stub receives the reply:
+
+    python -m benchmarks.startup_time --rounds 3 --json
+
+--warmup keeps the background AI warm-up enabled, so its effect on the
+first answer is included.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientSession, ClientError, web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "123456:STARTUP-BENCHMARK"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bot_env(api_url, port, warmup):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "bot_token": TOKEN,
+        "TELEGRAM_API_URL": api_url,
+        "RUN_MODE": "webhook",
+        "WEBHOOK_HOST": "",
+        "WEBAPP_HOST": "127.0.0.1",
+        "WEBAPP_PORT": str(port),
+        "AI_WARMUP": "1" if warmup else "0",
+    })
+    return env
+
+
+class StubBotAPI:
+    """Answers Bot API methods and remembers when the first sendMessage came in."""
+
+    def __init__(self):
+        self.first_reply = None
+        self.replied = asyncio.Event()
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method == "sendMessage":
+            if self.first_reply is None:
+                self.first_reply = time.perf_counter()
+                self.replied.set()
+            result = {"message_id": 1, "date": int(time.time()), "text": params.get("text", ""),
+                      "chat": {"id": int(params.get("chat_id", 0)), "type": "private"}}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        self.port = free_port()
+        await web.TCPSite(self.runner, "127.0.0.1", self.port).start()
+        return f"http://127.0.0.1:{self.port}"
+
+
+def measure_import(warmup, workdir):
+    code = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=bot_env("http://127.0.0.1:9", free_port(), warmup),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def synthetic_update(update_id):
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": "/help",
+        "chat": {"id": 1000, "type": "private"},
+        "from": {"id": 1000, "is_bot": False, "first_name": "Benchmark"},
+        "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+    }}
+
+
+async def measure_first_update(warmup, workdir, timeout):
+    stub = StubBotAPI()
+    api_url = await stub.start()
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], cwd=workdir,
+                               env=bot_env(api_url, port, warmup),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening = None
+    try:
+        async with ClientSession() as session:
+            while listening is None:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Бот завершился с кодом {process.returncode}")
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError("Бот не начал принимать апдейты")
+                try:
+                    async with session.get(f"http://127.0.0.1:{port}/health") as response:
+                        if response.status == 200:
+                            listening = time.perf_counter()
+                except ClientError:
+                    await asyncio.sleep(0.01)
+            async with session.post(f"http://127.0.0.1:{port}/webhook", json=synthetic_update(1)):
+                pass
+            await asyncio.wait_for(stub.replied.wait(), timeout)
+    finally:
+        process.terminate()
+        process.wait()
+        await stub.runner.cleanup()
+    return listening - start, stub.first_reply - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3, help="сколько раз повторить замер (берем медиану)")
+    parser.add_argument("--warmup", action="store_true", help="не отключать фоновую загрузку AI-модуля")
+    parser.add_argument("--timeout", type=float, default=120, help="сколько секунд ждать ответа бота")
+    parser.add_argument("--json", action="store_true", help="вывести результат одной JSON-строкой (для CI)")
+    args = parser.parse_args()
+
+    imports, listening, first_reply = [], [], []
+    for _ in range(args.rounds):
+        with tempfile.TemporaryDirectory(prefix="startup_bench_") as workdir:
+            imports.append(measure_import(args.warmup, workdir))
+        with tempfile.TemporaryDirectory(prefix="startup_bench_") as workdir:
+            to_listen, to_reply = asyncio.run(measure_first_update(args.warmup, workdir, args.timeout))
+        listening.append(to_listen)
+        first_reply.append(to_reply)
+
+    result = {
+        "import_seconds": statistics.median(imports),
+        "time_to_listen_seconds": statistics.median(listening),
+        "time_to_first_reply_seconds": statistics.median(first_reply),
+        "rounds": args.rounds,
+        "ai_warmup": args.warmup,
+    }
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"Импорт main.py:                     {result['import_seconds']:.2f} с")
+    print(f"До приема апдейтов (процесс + старт): {result['time_to_listen_seconds']:.2f} с")
+    print(f"До первого ответа пользователю:     {result['time_to_first_reply_seconds']:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,97 @@
+import asyncio
 import csv
-import pandas as pd
 import os
-import json
 import pytz
 import logging
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher, types
 from aiogram.utils import executor
+from aiogram.utils.exceptions import TelegramAPIError
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 from aiogram.dispatcher.middlewares import BaseMiddleware
 from aiogram.dispatcher.handler import CancelHandler
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from utils.config import bot_token, PROFILE_DIR, STORAGE_DIR
+from utils.config import (bot_token, RUN_MODE, WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT,
+                          TELEGRAM_API_URL, AI_WARMUP, METRICS_ENABLED, PLAN_DRAIN_TIMEOUT, OUTBOX_DRAIN_TIMEOUT, PROFILE_DIR, PROFILE_CACHE_SIZE, STORAGE_DIR, PLAN_WORKERS, PLAN_QUEUE_SIZE, BACKGROUND_WORKERS, USERS_DB, LEGACY_USERS_CSV,
+                          STREAM_EDIT_INTERVAL, PLAN_FORMAT, REMINDERS_DB, OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST)
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
-from utils.ai_tools import create_meal_and_coocking_plan
+from utils.ai_runtime import AILayer
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
+from utils.profiles import cooking_preferences_hash, is_cooking_analysis_fresh, ProfileRepository, atomic_write_json
+from utils.user_registry import UserRegistry
+from utils.fsm_storage import create_fsm_storage
+from utils.reminders import ReminderScheduler
+from utils.outbox import Outbox
+from utils.instrumentation import add_stage_listener
+from utils.metrics import TelegramMetricsMiddleware, metrics_handler, observe_stage
+from utils.plan_service import PlanGenerationService, QueueFullError, JobAlreadyRunningError
+from utils.plan_progress import PlanProgress
+from utils.plan_model import load_plan, save_plan, render_plan, render_shopping, render_shopping_schedule, preview_block_json
 
 logging.basicConfig(level=logging.INFO)
 
-bot = Bot(token=bot_token)
-storage = MemoryStorage()
+bot = Bot(token=bot_token,
+          server=TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else TELEGRAM_PRODUCTION)
+storage = create_fsm_storage()
 dp = Dispatcher(bot, storage=storage)
-scheduler = AsyncIOScheduler()
+# Все исходящие сообщения идут через общую очередь с лимитами Telegram
+outbox = Outbox(bot, global_rate=OUTBOX_GLOBAL_RATE, chat_rate=OUTBOX_CHAT_RATE, chat_burst=OUTBOX_CHAT_BURST)
+reminders_scheduler = ReminderScheduler(REMINDERS_DB, timezone=pytz.timezone("Europe/Moscow"))
+plan_service = PlanGenerationService(PLAN_WORKERS, PLAN_QUEUE_SIZE, background_workers=BACKGROUND_WORKERS)
+# LLM, индекс рецептов и память диалогов загружаются в фоне после старта, а не при импорте
+ai_layer = AILayer()
 
 if not os.path.exists(STORAGE_DIR):
     os.makedirs(STORAGE_DIR)
     os.makedirs(os.path.join(STORAGE_DIR, "feedback"))
-CSV_FILE = os.path.join(STORAGE_DIR, 'user_data.csv')
-if not os.path.exists(CSV_FILE):
-    columns = ["user_id", "meal_plan_link", "user_info_file", "cook_file_path"]
-    df = pd.DataFrame(columns=columns)
+user_registry = UserRegistry(USERS_DB)
+profile_repository = ProfileRepository(PROFILE_DIR, max_items=PROFILE_CACHE_SIZE)
+if os.path.exists(LEGACY_USERS_CSV):
+    user_registry.migrate_from_csv(LEGACY_USERS_CSV)
 
-    df.to_csv(CSV_FILE, index=False)
 
-
-# Функция для загрузки данных из CSV
+# Функция для загрузки зарегистрированных пользователей
 def load_registered_users():
-    users = set()
-    if os.path.exists(CSV_FILE):
-        users_info = pd.read_csv(CSV_FILE)
-        for _, row in users_info.iterrows():
-                users.add(int(row['user_id']))
-    return users
-
-
-# Функция для загрузки профиля пользователя из JSON
-def load_user_profile(user_id):
-    profile_file_path = os.path.join(PROFILE_DIR, f'user_{user_id}.json')
-    if os.path.exists(profile_file_path):
-        with open(profile_file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+    return user_registry.user_ids()
 
 
-# Функция для добавления нового пользователя в CSV
-def add_user_to_csv(user_id, profile_file_path, meal_plan_link='', shopping_schedule_link=''):
-    user_found = False
+# Сохраняем разбор предпочтений в готовке, если он соответствует текущему тексту профиля
+def store_cooking_analysis(user_id, analysis):
+    profile = profile_repository.get(user_id)
+    if not profile or not analysis:
+        return
+    if analysis['source_hash'] != cooking_preferences_hash(profile.get('cooking_preferences')):
+        return  # Пока работала LLM, пользователь успел изменить предпочтения
+    if profile.get('cooking_analysis') == analysis:
+        return
+    profile['cooking_analysis'] = analysis
+    profile_repository.save(user_id, profile)
 
-    users_info = pd.read_csv(CSV_FILE)
-    for _, row in users_info.iterrows():
-        if int(row['user_id']) == user_id:
-            # Обновляем значения в строке
-            row['plan_file_path'] = meal_plan_link
-            row['cook_file_path'] = shopping_schedule_link
-            user_found = True
 
-    # Если пользователь не найден в CSV, добавляем новую строку
-    if not user_found:
-        new_user = pd.DataFrame({"user_id": [user_id], "meal_plan_link": [meal_plan_link],
-                                "user_info_file": [profile_file_path], "cook_file_path": [shopping_schedule_link]})
-        users_info = pd.concat([users_info, new_user], ignore_index=True)
-        
-    users_info.to_csv(CSV_FILE)
+# Фоновый разбор предпочтений в готовке сразу после их сохранения
+async def refresh_cooking_analysis(user_id):
+    profile = profile_repository.get(user_id)
+    if not profile or is_cooking_analysis_fresh(profile):
+        return
+    try:
+        analysis = await plan_service.run_in_thread(ai_layer.call, "analyze_cooking_preferences",
+                                                    profile['cooking_preferences'])
+    except Exception:
+        logging.exception(f"Cooking preferences analysis failed for user: {user_id}")
+        return
+    store_cooking_analysis(user_id, analysis)
+
+
+# Функция для добавления или обновления пользователя в реестре
+def add_user_to_registry(user_id, profile_file_path=None, meal_plan_link=None, shopping_schedule_link=None):
+    user_registry.upsert(user_id, user_info_file=profile_file_path, meal_plan_file=meal_plan_link,
+                         cook_file_path=shopping_schedule_link)
 
-    logging.info(f"Данные пользователя (user_id: {user_id}) успешно обновлены в CSV.")
+    logging.info(f"Данные пользователя (user_id: {user_id}) успешно обновлены в реестре.")
 
 
 registered_users = load_registered_users()
@@ -134,13 +148,16 @@ class RegistrationMiddleware(BaseMiddleware):
             register_button = InlineKeyboardButton("Register", callback_data="register")
             keyboard.add(register_button)
 
-            await message.answer("Вы не зарегистрированы. Пожалуйста, зарегистрируйтесь, чтобы продолжить:",
+            await outbox.send(message.chat.id, "Вы не зарегистрированы. Пожалуйста, зарегистрируйтесь, чтобы продолжить:",
                                  reply_markup=keyboard)
 
             raise CancelHandler()
 
 
+# Счетчики апдейтов и обработчиков для /metrics; подключаем первыми, чтобы видеть все апдейты
+dp.middleware.setup(TelegramMetricsMiddleware())
 dp.middleware.setup(RegistrationMiddleware())
+add_stage_listener(observe_stage)
 
 
 # Обработчик команды /start
@@ -148,10 +165,10 @@ dp.middleware.setup(RegistrationMiddleware())
 async def cmd_start(message: types.Message):
     user_id = message.from_user.id
 
-    await message.answer("👋 Привет! Этот бот поможет тебе составить план питания 🥗")
+    await outbox.send(message.chat.id, "👋 Привет! Этот бот поможет тебе составить план питания 🥗")
 
     if user_id in registered_users:
-        profile = load_user_profile(user_id)
+        profile = profile_repository.get(user_id)
         if profile:
             profile_text = (
                 f"📋 Вы зарегистрированы в системе.\n\n"
@@ -160,18 +177,18 @@ async def cmd_start(message: types.Message):
                 f"🍲 Любимая еда: {profile.get('favorite_products', 'не указано')}\n"
                 f"⏲️ Время на готовку и способы приготовления: {profile.get('cooking_preferences', 'не указано')}"
             )
-            await message.answer(profile_text, reply_markup=user_keyboard)
+            await outbox.send(message.chat.id, profile_text, reply_markup=user_keyboard)
         else:
             keyboard = InlineKeyboardMarkup()
             register_button = InlineKeyboardButton("Register", callback_data="register")
             keyboard.add(register_button)
-            await message.answer("Ваш профиль не найден.", reply_markup=keyboard)
+            await outbox.send(message.chat.id, "Ваш профиль не найден.", reply_markup=keyboard)
     else:
         # Если пользователь не зарегистрирован, предлагаем регистрацию
         keyboard = InlineKeyboardMarkup()
         register_button = InlineKeyboardButton("Register", callback_data="register")
         keyboard.add(register_button)
-        await message.answer("Вы не зарегистрированы. Пожалуйста, зарегистрируйтесь, чтобы продолжить:",
+        await outbox.send(message.chat.id, "Вы не зарегистрированы. Пожалуйста, зарегистрируйтесь, чтобы продолжить:",
                              reply_markup=keyboard)
 
 
@@ -187,12 +204,12 @@ async def process_register(callback_query: types.CallbackQuery):
     user_id = callback_query.from_user.id
 
     if user_id not in registered_users:
-        await bot.send_message(user_id,
+        await outbox.send(user_id,
                                "Давайте начнем регистрацию. Введите ваш пол, возраст и цель плана питания (например: "
                                "Мужчина, 25, Набор массы):")
         await RegistrationForm.about_user.set()  # Переходим к первому состоянию FSM
     else:
-        await bot.send_message(user_id, "Вы уже зарегистрированы.")
+        await outbox.send(user_id, "Вы уже зарегистрированы.")
 
     await bot.answer_callback_query(callback_query.id)
 
@@ -201,21 +218,21 @@ async def process_register(callback_query: types.CallbackQuery):
 @dp.message_handler(state=RegistrationForm.about_user)
 async def process_about_user(message: types.Message, state: FSMContext):
     await state.update_data(about_user=message.text)
-    await message.answer("Теперь укажите, есть ли у вас аллергии или нелюбимые продукты (через запятую):")
+    await outbox.send(message.chat.id, "Теперь укажите, есть ли у вас аллергии или нелюбимые продукты (через запятую):")
     await RegistrationForm.forbidden_products.set()
 
 
 @dp.message_handler(state=RegistrationForm.forbidden_products)
 async def process_forbidden_products(message: types.Message, state: FSMContext):
     await state.update_data(forbidden_products=message.text)
-    await message.answer("Какая у вас любимая еда?")
+    await outbox.send(message.chat.id, "Какая у вас любимая еда?")
     await RegistrationForm.favorite_products.set()
 
 
 @dp.message_handler(state=RegistrationForm.favorite_products)
 async def process_favorite_products(message: types.Message, state: FSMContext):
     await state.update_data(favorite_products=message.text)
-    await message.answer("Сколько времени вы можете уделять готовке и какие способы приготовления у вас имеются?")
+    await outbox.send(message.chat.id, "Сколько времени вы можете уделять готовке и какие способы приготовления у вас имеются?")
     await RegistrationForm.cooking_preferences.set()
 
 
@@ -232,20 +249,16 @@ async def process_cooking_preferences(message: types.Message, state: FSMContext)
         'cooking_preferences': user_data['cooking_preferences']
     }
 
-    if not os.path.exists(PROFILE_DIR):
-        os.makedirs(PROFILE_DIR)
-
     # Сохраняем профиль пользователя в JSON
-    profile_file_path = os.path.join(PROFILE_DIR, f'user_{user_id}.json')
-    with open(profile_file_path, 'w', encoding='utf-8') as f:
-        json.dump(profile_data, f, ensure_ascii=False, indent=4)
+    profile_file_path = profile_repository.save(user_id, profile_data)
 
-    add_user_to_csv(user_id, profile_file_path)
+    add_user_to_registry(user_id, profile_file_path)
     registered_users.add(user_id)
+    plan_service.spawn(refresh_cooking_analysis(user_id))
 
     await state.finish()
 
-    await message.answer(
+    await outbox.send(message.chat.id, 
         "Регистрация завершена! Ваш профиль сохранен. Теперь вам доступен весь список команд.",
         reply_markup=user_keyboard
     )
@@ -256,7 +269,7 @@ async def process_cooking_preferences(message: types.Message, state: FSMContext)
 async def cmd_edit_profile(message: types.Message):
     user_id = message.from_user.id
     if user_id not in registered_users:
-        await message.answer("Вы не зарегистрированы. Используйте команду /start для начала.")
+        await outbox.send(message.chat.id, "Вы не зарегистрированы. Используйте команду /start для начала.")
         return
     keyboard = InlineKeyboardMarkup(row_width=1)
     keyboard.add(
@@ -265,7 +278,7 @@ async def cmd_edit_profile(message: types.Message):
         InlineKeyboardButton("Любимая еда", callback_data="edit_favorite_products"),
         InlineKeyboardButton("Время на готовку и способы приготовления", callback_data="edit_cooking_preferences")
     )
-    await message.answer("Что вы хотите изменить?", reply_markup=keyboard)
+    await outbox.send(message.chat.id, "Что вы хотите изменить?", reply_markup=keyboard)
     await EditProfileForm.choose_field.set()
 
 
@@ -282,11 +295,11 @@ async def process_edit_field_choice(callback_query: types.CallbackQuery, state:
     chosen_field = callback_query.data
     if chosen_field in field_map:
         await state.update_data(field_to_edit=field_map[chosen_field])
-        await bot.send_message(callback_query.from_user.id,
+        await outbox.send(callback_query.from_user.id,
                                f"Введите новое значение для поля \"{field_map[chosen_field]}\":")
         await EditProfileForm.new_value.set()
     else:
-        await bot.send_message(callback_query.from_user.id, "Ошибка: неизвестное поле для редактирования.")
+        await outbox.send(callback_query.from_user.id, "Ошибка: неизвестное поле для редактирования.")
         await state.finish()
 
     await bot.answer_callback_query(callback_query.id)
@@ -301,14 +314,14 @@ async def process_new_value(message: types.Message, state: FSMContext):
 
     field_to_edit = user_data.get("field_to_edit")
     if not field_to_edit:
-        await message.answer("Произошла ошибка. Попробуйте снова.")
+        await outbox.send(message.chat.id, "Произошла ошибка. Попробуйте снова.")
         await state.finish()
         return
 
     # Загрузить текущий профиль пользователя
-    profile = load_user_profile(user_id)
+    profile = profile_repository.get(user_id)
     if not profile:
-        await message.answer("Ваш профиль не найден. Пожалуйста, зарегистрируйтесь снова.")
+        await outbox.send(message.chat.id, "Ваш профиль не найден. Пожалуйста, зарегистрируйтесь снова.")
         await state.finish()
         return
 
@@ -316,11 +329,11 @@ async def process_new_value(message: types.Message, state: FSMContext):
     profile[field_to_edit] = new_value
 
     # Сохранить обновленный профиль
-    profile_file_path = os.path.join(PROFILE_DIR, f'user_{user_id}.json')
-    with open(profile_file_path, 'w', encoding='utf-8') as f:
-        json.dump(profile, f, ensure_ascii=False, indent=4)
+    profile_repository.save(user_id, profile)
+    if field_to_edit == 'cooking_preferences':
+        plan_service.spawn(refresh_cooking_analysis(user_id))
 
-    await message.answer(f"Поле \"{field_to_edit}\" успешно обновлено на \"{new_value}\".")
+    await outbox.send(message.chat.id, f"Поле \"{field_to_edit}\" успешно обновлено на \"{new_value}\".")
     await state.finish()
 
 
@@ -334,7 +347,7 @@ async def cmd_help(message: types.Message):
         "/generate_plan - Создать план питания и график покупок\n"
         "/delete_plan - Удалить текущий план и расписание\n"
     )
-    await message.answer(help_text)
+    await outbox.send(message.chat.id, help_text)
     
     
 week_days = {
@@ -347,38 +360,19 @@ week_days = {
     'Воскресенье': 6
 }
 
-# Функция для генерации блоков дней
-def generate_blocks_from_schedule(shopping_schedule):
-    blocks = []
-    total_days = len(shopping_schedule)
-    days_per_block = 7 // total_days  # сколько дней в каждом блоке
-    start_day = 0
-
-    for i in range(total_days):
-        # Определяем, сколько дней будет в текущем блоке
-        end_day = start_day + days_per_block - 1
-        if i == total_days - 1:  # последний блок может быть меньше
-            end_day = 6  # до воскресенья включительно
-
-        # Определяем дни недели для блока
-        block_days = list(week_days.keys())[start_day:end_day+1]
-        blocks.append(f"{block_days[0]}-{block_days[-1]}")
-
-        start_day = end_day + 1  # следующий блок начинается на следующем дне
-
-    return blocks
-
-# Функция для создания напоминаний на основе этих блоков
-def create_reminders_for_shopping_schedule(user_id, shopping_schedule):
+# Функция для создания напоминаний по блокам плана: дни блока хранятся в самом плане
+def create_reminders_for_plan(user_id, plan, block_indices=None):
     reminders = []
     today = datetime.now(pytz.timezone("Europe/Moscow"))
 
-    blocks = generate_blocks_from_schedule(shopping_schedule)
-
-    for i in range(len(blocks)):
-        block = blocks[i]
-        days = block.split('-')
-        start_day = days[0]
+    if block_indices is None:
+        block_indices = range(len(plan["blocks"]))
+    for plan_block in (plan["blocks"][i] for i in block_indices):
+        shopping = render_shopping(plan_block)
+        if not plan_block["days"] or not shopping:
+            continue
+        block = f"{plan_block['days'][0]}-{plan_block['days'][-1]}"
+        start_day = plan_block["days"][0]
 
         # Находим ближайший start_day в будущем
         start_day_week = week_days[start_day]
@@ -389,55 +383,35 @@ def create_reminders_for_shopping_schedule(user_id, shopping_schedule):
         # Создаем напоминание
         reminder = {
             "date": first_day_of_block,
-            "message": f"Напоминаем о покупках для блока {block}:\n{shopping_schedule[i]}",
-            "user_id": user_id  # добавляем идентификатор пользователя
+            "message": f"Напоминаем о покупках для блока {block}:\n{shopping}",
+            "user_id": user_id,  # добавляем идентификатор пользователя
+            "job_id": f"reminder_{user_id}_{block}"  # уникальный идентификатор задачи
         }
 
-        # Добавляем задачу в планировщик с меткой user_id
-        scheduler.add_job(
-            send_reminder,
-            CronTrigger(year='*', month='*', day='*', hour='23', minute='0', second='0', day_of_week=str(first_day_of_block.weekday())),
-            args=[reminder["message"]],
-            id=f"reminder_{user_id}_{block}",  # используем уникальный идентификатор задачи
-            replace_existing=True  # если задача с таким ID уже существует, она будет заменена
-        )
-
         reminders.append(reminder)
 
     return reminders
 
-# Перезапуск планировщика
-def restart_scheduler():
-    if scheduler.running:
-        scheduler.shutdown(wait=False)  # Остановка с возможностью завершения задач
-    scheduler.start()  # Новый запуск
 
-# Функция для создания и отправки напоминаний
 async def schedule_reminders(reminders):
-    
     for reminder in reminders:
-        scheduler.add_job(
-            send_reminder, 
-            CronTrigger(year='*', month='*', day='*', hour='22', minute='30', second='0', day_of_week=str(reminder['date'].weekday())),
-            args=[reminder["message"]]
+        reminders_scheduler.add(
+            reminder["user_id"],
+            reminder["job_id"],
+            CronTrigger(hour='23', minute='0', second='0', day_of_week=str(reminder['date'].weekday())),
+            chat_id=reminder["user_id"],
+            text=reminder["message"],
         )
-    
-    restart_scheduler()
 
-# Отправка напоминания
-async def send_reminder(message: str):
-    await bot.send_message(chat_id=message.chat.id, text=message)
-    
-    
+
 # Функция для получения списка всех напоминаний для пользователя
 def get_all_reminders_for_user(user_id):
     reminders = []
 
-    for job in scheduler.get_jobs():
-        if f"reminder_{user_id}_" in job.id:  # Проверяем, если job.id содержит user_id
-            reminder_time = job.next_run_time
-            reminder_message = job.args[0]  # Сообщение задачи
-            reminders.append(f"Напоминание: {reminder_message} | Время: {reminder_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    for job in reminders_scheduler.jobs_for_user(user_id):
+        reminder_time = job.next_run_time
+        reminder_message = job.args[1]  # Сообщение задачи
+        reminders.append(f"Напоминание: {reminder_message} | Время: {reminder_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
     return reminders
 
@@ -452,17 +426,54 @@ async def cmd_list_reminders(message: types.Message):
 
     if reminders:
         # Выводим все напоминания
-        await message.answer("\n".join(reminders))
+        await outbox.send(message.chat.id, "\n".join(reminders))
     else:
-        await message.answer("У вас нет активных напоминаний.")
+        await outbox.send(message.chat.id, "У вас нет активных напоминаний.")
     
     
 # Функция для удаления всех напоминаний для пользователя
 def remove_all_reminders_for_user(user_id):
-    # Получаем все задачи с идентификатором, содержащим user_id
-    for job in scheduler.get_jobs():
-        if f"reminder_{user_id}_" in job.id:
-            job.remove()
+    reminders_scheduler.remove_for_user(user_id)
+
+LOADING_TEXT = "Создаем Ваш план ... 🛒"
+
+
+# Генерация плана в пуле воркеров, чтобы не блокировать обработку остальных апдейтов.
+# Пока план строится, текст стримится в сообщение о загрузке, готовые блоки отправляются сразу.
+# Если передан текущий план, правится только его часть: результат — (план, номера измененных блоков)
+async def run_plan_generation(message, user_id, profile, prompt="", plan=None):
+    # Сообщение о загрузке редактируется по ходу генерации, поэтому его не склеиваем с соседними
+    loading_message = await outbox.send(message.chat.id, LOADING_TEXT, coalesce=False)
+    progress = PlanProgress(outbox, message.chat.id, loading_message.message_id, LOADING_TEXT,
+                            "Ваш план питания на неделю:" if plan is None else "Измененные дни плана:",
+                            interval=STREAM_EDIT_INTERVAL,
+                            # Недописанный JSON пользователю не показываем: в превью только блюда и описания
+                            preview=preview_block_json if PLAN_FORMAT == "json" else None)
+    progress.start()
+    if not ai_layer.ready:
+        await outbox.send(message.chat.id, "Бот еще загружает базу рецептов, план начнет создаваться сразу после загрузки.")
+    try:
+        if plan is not None:
+            return await plan_service.submit(user_id, ai_layer.call, "edit_meal_plan", user_id,
+                                             user_info=profile, plan=plan, prompt=prompt, progress=progress)
+        return await plan_service.submit(user_id, ai_layer.call, "create_meal_and_coocking_plan", user_id,
+                                         user_info=profile, prompt=prompt, progress=progress)
+    except JobAlreadyRunningError:
+        await outbox.send(message.chat.id, "Ваш план уже создается, дождитесь завершения.")
+    except QueueFullError:
+        await outbox.send(message.chat.id, "Сейчас бот перегружен запросами. Попробуйте создать план через несколько минут.")
+    except Exception:
+        logging.exception(f"Plan generation failed for user: {user_id}")
+        await outbox.send(message.chat.id, "Не удалось создать план. Попробуйте еще раз позже.")
+    finally:
+        await progress.close()
+        # Ошибка удаления не должна подменять результат генерации или исходное исключение
+        try:
+            await bot.delete_message(chat_id=message.chat.id, message_id=loading_message.message_id)
+        except TelegramAPIError as e:
+            logging.warning(f"Не удалось удалить сообщение о загрузке для пользователя {user_id}: {e!r}")
+    return None
+
 
 @dp.message_handler(commands=['generate_plan'])
 async def cmd_generate_plan(message: types.Message):
@@ -470,7 +481,7 @@ async def cmd_generate_plan(message: types.Message):
     logging.info(f"Handling /generate_plan command from user: {user_id}")
 
     if user_id not in registered_users:
-        await message.answer("Вы не зарегистрированы. Пожалуйста, используйте команду /start для начала.")
+        await outbox.send(message.chat.id, "Вы не зарегистрированы. Пожалуйста, используйте команду /start для начала.")
         return
 
     # Проверяем, есть ли уже сгенерированный план
@@ -479,54 +490,50 @@ async def cmd_generate_plan(message: types.Message):
     
 
     if os.path.exists(meal_plan_file_path) or os.path.exists(shopping_schedule_file_path):
-        await message.answer(
+        await outbox.send(message.chat.id, 
             "У вас уже есть сгенерированный план. Перед созданием нового плана удалите старый с помощью команды /delete_plan."
         )
         return
     
-    with open(meal_plan_file_path, 'w', encoding='utf-8') as f:
-        json.dump([], f)
-
-    with open(shopping_schedule_file_path, 'w', encoding='utf-8') as f:
-         json.dump([], f)
+    atomic_write_json(meal_plan_file_path, [])
 
     # Загружаем профиль пользователя
-    profile = load_user_profile(user_id)
+    profile = profile_repository.get(user_id)
     if not profile:
-        await message.answer("Ваш профиль не найден. Пожалуйста, зарегистрируйтесь снова.")
+        await outbox.send(message.chat.id, "Ваш профиль не найден. Пожалуйста, зарегистрируйтесь снова.")
         return
 
-    loading_message = await message.answer("Создаем Ваш план ... 🛒")
-
-    meal_plan, shopping_schedule = create_meal_and_coocking_plan(user_id, user_info=profile)
+    # Остановка бота ждет, пока план не будет сохранен и отправлен целиком
+    async with plan_service.inflight():
+        result = await run_plan_generation(message, user_id, profile)
+        if result is None:
+            # Убираем заготовки файлов, чтобы пользователь мог повторить попытку
+            for file_path in (meal_plan_file_path, shopping_schedule_file_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            return
+        plan = result
+        store_cooking_analysis(user_id, profile.get('cooking_analysis'))
     
-    logging.info("Generated meal plan and shopping schedule.")
-
-    with open(meal_plan_file_path, 'w', encoding='utf-8') as f:
-        json.dump(meal_plan, f)
+        logging.info("Generated meal plan and shopping schedule.")
+        logging.info(f"Conversation memory stats: {ai_layer.module.memory_manager.stats()}")
 
-    with open(shopping_schedule_file_path, 'w', encoding='utf-8') as f:
-         json.dump(shopping_schedule, f)
+        # План хранится структурой, график закупок из него выводится при отправке
+        save_plan(meal_plan_file_path, plan)
          
-    # Создаем напоминания на основе расписания покупок
-    reminders = create_reminders_for_shopping_schedule(user_id, shopping_schedule)
+        # Создаем напоминания на основе расписания покупок
+        reminders = create_reminders_for_plan(user_id, plan)
     
-    # Запускаем планирование напоминаний
-    await schedule_reminders(reminders)
-    await message.answer(f"Созданы напоминания по датам покупок продуктов")
+        # Запускаем планирование напоминаний
+        await schedule_reminders(reminders)
+        await outbox.send(message.chat.id, f"Созданы напоминания по датам покупок продуктов")
 
-    # Обновляем данные пользователя в CSV
-    add_user_to_csv(user_id, load_user_profile(user_id), meal_plan_file_path, shopping_schedule_file_path)
+        # Обновляем данные пользователя в реестре
+        add_user_to_registry(user_id, meal_plan_link=meal_plan_file_path, shopping_schedule_link=meal_plan_file_path)
 
-    await bot.delete_message(chat_id=message.chat.id, message_id=loading_message.message_id)
-
-    await message.answer(f"Ваш план питания на неделю:")
-    for i in range(len(meal_plan)): 
-        await message.answer(meal_plan[i], parse_mode="Markdown")
-        
-    await message.answer(f"Ваш график закупок на неделю:")
-    for i in range(len(meal_plan)): 
-        await message.answer(shopping_schedule[i], parse_mode="Markdown")
+        # Блоки плана уже отправлены по мере готовности
+        await outbox.send_many(message.chat.id, ["Ваш график закупок на неделю:", *render_shopping_schedule(plan)],
+                               parse_mode="Markdown")
         
         
 @dp.message_handler(commands=['view_plan'])
@@ -537,28 +544,23 @@ async def cmd_view_plan(message: types.Message):
     meal_plan_file_path = os.path.join(STORAGE_DIR, f'meal_plan_{user_id}.json')
     shopping_schedule_file_path = os.path.join(STORAGE_DIR, f'shopping_schedule_{user_id}.json')
     
-    if not os.path.exists(meal_plan_file_path) or not os.path.exists(shopping_schedule_file_path):
-        await message.answer("Ваш план питания ещё не создан, используйте команду /generate_plan для создания вашего файла")
+    if not os.path.exists(meal_plan_file_path):
+        await outbox.send(message.chat.id, "Ваш план питания ещё не создан, используйте команду /generate_plan для создания вашего файла")
         return
     
-    with open(meal_plan_file_path, "r", encoding="utf-8") as f:
-        meal_plan = json.load(f)
-        
-    with open(shopping_schedule_file_path, "r", encoding="utf-8") as f:
-        shopping_schedule = json.load(f)
+    # Старые планы лежат списками Markdown-блоков в двух файлах, load_plan приводит их к структуре
+    plan = load_plan(meal_plan_file_path, shopping_schedule_file_path)
         
-    await message.answer(f"# Ваш план питания на неделю:", parse_mode="Markdown")
-    for i in range(len(meal_plan)): 
-        await message.answer(meal_plan[i], parse_mode="Markdown")
-        
-    await message.answer(f"# Ваш график закупок на неделю:", parse_mode="Markdown")
-    for i in range(len(meal_plan)): 
-        await message.answer(shopping_schedule[i], parse_mode="Markdown")
+    # Заголовки и блоки ставим в очередь разом: короткие соседние сообщения уйдут одним
+    await outbox.send_many(message.chat.id, [
+        "# Ваш план питания на неделю:", *render_plan(plan),
+        "# Ваш график закупок на неделю:", *render_shopping_schedule(plan),
+    ], parse_mode="Markdown")
     
 
 @dp.message_handler(commands=['edit_plan'])
 async def process_edit_plan(message: types.Message):
-    await message.answer("Введите текст, описывающий, что вы хотите изменить в плане:")
+    await outbox.send(message.chat.id, "Введите текст, описывающий, что вы хотите изменить в плане:")
     await PlanEditForm.new_prompt.set()
 
 
@@ -568,48 +570,60 @@ async def process_new_prompt(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     new_prompt = message.text
     await state.update_data(user_prompt=new_prompt)
-    await message.answer(
+    await outbox.send(message.chat.id, 
         "Промт для изменения плана сохранен. Создаем новый план")
     
     meal_plan_file_path = os.path.join(STORAGE_DIR, f'meal_plan_{user_id}.json')
     shopping_schedule_file_path = os.path.join(STORAGE_DIR, f'shopping_schedule_{user_id}.json')
     
-    profile = load_user_profile(user_id)
+    profile = profile_repository.get(user_id)
     if not profile:
-        await message.answer("Ваш профиль не найден. Пожалуйста, зарегистрируйтесь снова.")
+        await outbox.send(message.chat.id, "Ваш профиль не найден. Пожалуйста, зарегистрируйтесь снова.")
         return
 
-    remove_all_reminders_for_user(user_id)
-    loading_message = await message.answer("Создаем Ваш план ... 🛒")
+    # Если план уже есть, перестраиваются только затронутые правкой блоки
+    plan = None
+    if os.path.exists(meal_plan_file_path):
+        plan = load_plan(meal_plan_file_path, shopping_schedule_file_path)
+        if not plan["blocks"]:
+            plan = None
+
+    # Остановка бота ждет, пока план не будет сохранен и отправлен целиком
+    async with plan_service.inflight():
+        result = await run_plan_generation(message, user_id, profile, prompt=new_prompt, plan=plan)
+        if result is None:
+            await state.finish()
+            return
+        if plan is None:
+            plan, changed_blocks = result, list(range(len(result["blocks"])))
+        else:
+            plan, changed_blocks = result
+        store_cooking_analysis(user_id, profile.get('cooking_analysis'))
 
-    meal_plan, shopping_schedule = create_meal_and_coocking_plan(user_id, user_info=profile, prompt=new_prompt)
+        # Напоминания неизмененных блоков остаются; при полной перестройке дни блоков могли сдвинуться
+        if len(changed_blocks) == len(plan["blocks"]):
+            remove_all_reminders_for_user(user_id)
     
-    reminders = create_reminders_for_shopping_schedule(user_id, shopping_schedule)
+        reminders = create_reminders_for_plan(user_id, plan, changed_blocks)
     
-    await schedule_reminders(reminders)
-    await message.answer(f"Созданы напоминания по датам покупок продуктов")
+        await schedule_reminders(reminders)
+        await outbox.send(message.chat.id, f"Напоминания о покупках обновлены")
     
-    logging.info("Generated meal plan and shopping schedule.")
-
-    with open(meal_plan_file_path, 'w', encoding='utf-8') as f:
-        json.dump(meal_plan, f)
-
-    with open(shopping_schedule_file_path, 'w', encoding='utf-8') as f:
-         json.dump(shopping_schedule, f)
+        logging.info(f"Edited meal plan blocks {changed_blocks} for user: {user_id}")
 
-    # Обновляем данные пользователя в CSV
-    add_user_to_csv(user_id, load_user_profile(user_id), meal_plan_file_path, shopping_schedule_file_path)
+        save_plan(meal_plan_file_path, plan)
+        # График закупок старого формата больше не нужен: он выводится из плана
+        if os.path.exists(shopping_schedule_file_path):
+            os.remove(shopping_schedule_file_path)
 
-    await bot.delete_message(chat_id=message.chat.id, message_id=loading_message.message_id)
+        # Обновляем данные пользователя в реестре
+        add_user_to_registry(user_id, meal_plan_link=meal_plan_file_path, shopping_schedule_link=meal_plan_file_path)
 
-    await message.answer(f"Ваш план питания на неделю:")
-    for i in range(len(meal_plan)): 
-        await message.answer(meal_plan[i], parse_mode="Markdown")
-        
-    await message.answer(f"Ваш график закупок на неделю:")
-    for i in range(len(meal_plan)): 
-        await message.answer(shopping_schedule[i], parse_mode="Markdown")
-    await state.finish()
+        # Измененные блоки плана уже отправлены по мере готовности
+        shopping = [render_shopping(plan["blocks"][i]) for i in changed_blocks]
+        await outbox.send_many(message.chat.id, ["Ваш обновленный график закупок:", *filter(None, shopping)],
+                               parse_mode="Markdown")
+        await state.finish()
 
 
 @dp.message_handler(commands=['delete_plan'])
@@ -617,7 +631,7 @@ async def cmd_delete_plan(message: types.Message):
     user_id = message.from_user.id
 
     if user_id not in registered_users:
-        await message.answer("Вы не зарегистрированы. Пожалуйста, используйте команду /start для начала.")
+        await outbox.send(message.chat.id, "Вы не зарегистрированы. Пожалуйста, используйте команду /start для начала.")
         return
 
     # Путь к файлам плана питания и графика покупок
@@ -631,35 +645,28 @@ async def cmd_delete_plan(message: types.Message):
     if os.path.exists(shopping_schedule_file_path):
         os.remove(shopping_schedule_file_path)
 
-    # Обновляем CSV, очищая пути к файлам для пользователя
-    file_updated = False
-
-    users_info = pd.read_csv(CSV_FILE)
-    for _, row in users_info.iterrows():
-        if int(row['user_id']) == user_id:
-            row['meal_plan_file_path'] = ''
-            row['cook_file_path'] = ''
-            file_updated = True
+    # Обновляем реестр, очищая пути к файлам для пользователя
+    file_updated = user_registry.clear_plan(user_id)
 
     if file_updated:
         remove_all_reminders_for_user(user_id)
-        await message.answer(
+        await outbox.send(message.chat.id, 
             "Ваш текущий план и график покупок были успешно удалены. Теперь вы можете создать новый план с помощью команды /generate_plan.")
 
         feedback_button = InlineKeyboardMarkup().add(
             InlineKeyboardButton("Пройти анкету", callback_data="feedback_survey")
         )
-        await message.answer(
+        await outbox.send(message.chat.id, 
             "Мы будем благодарны, если вы оцените наш сервис, пройдя небольшую анкету. Нажмите на кнопку ниже.",
             reply_markup=feedback_button
         )
     else:
-        await message.answer("У вас не найдено сохраненных данных для удаления.")
+        await outbox.send(message.chat.id, "У вас не найдено сохраненных данных для удаления.")
 
 
 @dp.callback_query_handler(lambda c: c.data == "feedback_survey")
 async def start_feedback_survey(callback_query: types.CallbackQuery):
-    await callback_query.message.answer(
+    await outbox.send(callback_query.message.chat.id, 
         "Спасибо, что решили оценить наш сервис! Давайте начнем.\n\n"
         "Оцените качество составления плана (от 1 до 5):",
         reply_markup=ReplyKeyboardMarkup(
@@ -676,14 +683,14 @@ async def start_feedback_survey(callback_query: types.CallbackQuery):
 async def feedback_quality(message: types.Message, state: FSMContext):
     # Проверяем корректность ввода
     if message.text not in ['1', '2', '3', '4', '5']:
-        await message.answer("Пожалуйста, введите число от 1 до 5.")
+        await outbox.send(message.chat.id, "Пожалуйста, введите число от 1 до 5.")
         return
 
     # Сохраняем ответ
     await state.update_data(quality=int(message.text))
 
     # Переходим к следующему вопросу
-    await message.answer(
+    await outbox.send(message.chat.id, 
         "Оцените удобство использования бота (от 1 до 5):",
         reply_markup=ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton(str(i)) for i in range(1, 6)]],
@@ -698,14 +705,14 @@ async def feedback_quality(message: types.Message, state: FSMContext):
 async def feedback_usability(message: types.Message, state: FSMContext):
     # Проверяем корректность ввода
     if message.text not in ['1', '2', '3', '4', '5']:
-        await message.answer("Пожалуйста, введите число от 1 до 5.")
+        await outbox.send(message.chat.id, "Пожалуйста, введите число от 1 до 5.")
         return
 
     # Сохраняем ответ
     await state.update_data(usability=int(message.text))
 
     # Переходим к последнему вопросу
-    await message.answer(
+    await outbox.send(message.chat.id, 
         "Соответствовал ли план вашим требованиям? (да/нет):",
         reply_markup=ReplyKeyboardMarkup(
             keyboard=[[KeyboardButton("Да"), KeyboardButton("Нет")]],
@@ -720,7 +727,7 @@ async def feedback_usability(message: types.Message, state: FSMContext):
 async def feedback_compliance(message: types.Message, state: FSMContext):
     # Проверяем корректность ввода
     if message.text.lower() not in ['да', 'нет']:
-        await message.answer("Пожалуйста, ответьте 'да' или 'нет'.")
+        await outbox.send(message.chat.id, "Пожалуйста, ответьте 'да' или 'нет'.")
         return
 
     await state.update_data(compliance=message.text.lower())
@@ -738,7 +745,7 @@ async def feedback_compliance(message: types.Message, state: FSMContext):
         f.write(feedback_summary) 
 
     # Отправляем итоги
-    await message.answer(feedback_summary, reply_markup=user_keyboard)
+    await outbox.send(message.chat.id, feedback_summary, reply_markup=user_keyboard)
 
     await state.finish()
 
@@ -750,7 +757,7 @@ async def echo_message(message: types.Message):
     keyboard.add(
         InlineKeyboardButton("❓ Помощь (/help)", callback_data="cmd_help"),
     )
-    await message.answer("Я вас не понял. Выберите команду:", reply_markup=keyboard)
+    await outbox.send(message.chat.id, "Я вас не понял. Выберите команду:", reply_markup=keyboard)
 
 
 # Обработчик нажатия на кнопку "Помощь"
@@ -760,5 +767,74 @@ async def process_help_callback(callback_query: types.CallbackQuery):
     await bot.answer_callback_query(callback_query.id)
 
 
+async def on_startup(dispatcher):
+    await plan_service.start()
+    # Планировщик запускается один раз, сохраненные напоминания подгружаются из базы
+    reminders_scheduler.start(outbox)
+    if AI_WARMUP:
+        plan_service.spawn(ai_layer.warm_up())
+    if RUN_MODE == "webhook" and WEBHOOK_HOST:
+        await bot.set_webhook(WEBHOOK_HOST + WEBHOOK_PATH, drop_pending_updates=True, secret_token=WEBHOOK_SECRET)
+        logging.info(f"Вебхук зарегистрирован: {WEBHOOK_HOST + WEBHOOK_PATH}")
+    if RUN_MODE != "webhook" and METRICS_ENABLED:
+        dispatcher["http_runner"] = await start_http_server()
+
+
+async def on_shutdown(dispatcher):
+    # Дожидаемся начатых генераций, чтобы пользователи получили свои планы
+    await plan_service.drain(PLAN_DRAIN_TIMEOUT)
+    await plan_service.shutdown()
+    # Хранилища закрываем только после того, как ушли все сообщения из очереди
+    await outbox.drain(OUTBOX_DRAIN_TIMEOUT)
+    reminders_scheduler.shutdown()
+    if dispatcher.get("http_runner"):
+        await dispatcher["http_runner"].cleanup()
+    if ai_layer.ready:
+        ai_layer.module.memory_manager.flush()
+        logging.info(f"История диалогов сохранена на диск: {ai_layer.module.memory_manager.stats()}")
+
+
+async def health(request):
+    return web.json_response({
+        "status": "ok",
+        "ai_ready": ai_layer.ready,
+        "plans_active": plan_service.active,
+        "plans_queued": plan_service.pending,
+    })
+
+
+# Апдейты без секрета, указанного при регистрации вебхука, не принимаем
+@web.middleware
+async def check_webhook_secret(request, handler):
+    if (WEBHOOK_SECRET and request.path == WEBHOOK_PATH
+            and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET):
+        raise web.HTTPForbidden()
+    return await handler(request)
+
+
+def create_web_app():
+    app = web.Application(middlewares=[check_webhook_secret])
+    app.router.add_get("/health", health)
+    if METRICS_ENABLED:
+        app.router.add_get("/metrics", metrics_handler)
+    return app
+
+
+# В режиме polling /health и /metrics обслуживает отдельный HTTP-сервер
+async def start_http_server():
+    runner = web.AppRunner(create_web_app())
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+    logging.info(f"HTTP-сервер метрик запущен на {WEBAPP_HOST}:{WEBAPP_PORT}")
+    return runner
+
+
 if __name__ == '__main__':
-    executor.start_polling(dp, skip_updates=True)
+    # Новые версии uvloop не создают цикл событий неявно, а executor aiogram берет текущий
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    if RUN_MODE == "webhook":
+        # Пропущенные апдейты сбрасываются при регистрации вебхука (drop_pending_updates)
+        executor.set_webhook(dp, WEBHOOK_PATH, on_startup=on_startup, on_shutdown=on_shutdown,
+                             web_app=create_web_app()).run_app(host=WEBAPP_HOST, port=WEBAPP_PORT)
+    else:
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
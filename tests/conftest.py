@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+# utils.config читает окружение при импорте, поэтому пути задаем до импорта модулей бота:
+# тесты не должны трогать индексы, кэши и базы в рабочем каталоге
+_workdir = tempfile.mkdtemp(prefix="eatme_tests_")
+for name, value in {
+    "bot_token": "123456789:AAEtestTokenForLocalTestsOnly_000000",
+    "AI_WARMUP": "0",
+    "CHROMA_DIR": os.path.join(_workdir, "chroma"),
+    "QUERY_CACHE_PATH": os.path.join(_workdir, "query_cache.sqlite"),
+    "MEMORY_DIR": os.path.join(_workdir, "memory"),
+    "RECIPES_STORE": os.path.join(_workdir, "recipes.jsonl"),
+    "USERS_DB": os.path.join(_workdir, "users.sqlite"),
+    "FSM_SQLITE_PATH": os.path.join(_workdir, "fsm.sqlite"),
+    "REMINDERS_DB": os.path.join(_workdir, "reminders.sqlite"),
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,29 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+from utils.ai_runtime import AILayer
+
+
+@pytest.mark.parametrize("attempt", range(5))
+def test_warm_up_reports_failed_import(attempt):
+    layer = AILayer("utils.no_such_ai_module")
+
+    asyncio.run(asyncio.wait_for(layer.warm_up(), timeout=5))
+
+    assert not layer.ready
+    assert isinstance(layer.error, ImportError)
+
+
+def test_warm_up_loads_module(monkeypatch):
+    module = types.ModuleType("fake_ai_tools")
+    module.answer = lambda value: value * 2
+    monkeypatch.setitem(sys.modules, "fake_ai_tools", module)
+    layer = AILayer("fake_ai_tools")
+
+    asyncio.run(asyncio.wait_for(layer.warm_up(), timeout=5))
+
+    assert layer.ready and layer.error is None
+    assert layer.call("answer", 21) == 42
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+from collections import Counter
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, unused_port
+
+from utils import async_scraper
+from utils.async_scraper import RecipeScraper, ScrapeCheckpoint
+from utils.recipe_store import RecipeStore
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "eda")
+CATEGORY = "/recepty/zavtraki"
+
+
+class FakeEda:
+    """Local stand-in for eda.ru that serves the fixture pages.
+
+    `failures` maps a path to a list of statuses returned before the page
+    itself, e.g. `[429]`. Every request is counted and timed.
+    """
+
+    def __init__(self, failures=None, retry_after="1"):
+        self.failures = {path: list(statuses) for path, statuses in (failures or {}).items()}
+        self.retry_after = retry_after
+        self.requests = Counter()
+        self.times = {}
+        self.app = web.Application()
+        self.app.router.add_get(CATEGORY, self.category)
+        self.app.router.add_get(CATEGORY + "/{slug}", self.recipe)
+
+    def _failure(self, request):
+        key = request.path_qs
+        self.requests[key] += 1
+        self.times.setdefault(key, []).append(time.monotonic())
+        statuses = self.failures.get(key)
+        if statuses:
+            status = statuses.pop(0)
+            headers = {"Retry-After": self.retry_after} if status == 429 else None
+            return web.Response(status=status, headers=headers)
+        return None
+
+    def _page(self, *parts):
+        path = os.path.join(FIXTURES, *parts)
+        if not os.path.exists(path):
+            raise web.HTTPNotFound()
+        with open(path, "r", encoding="utf-8") as f:
+            return web.Response(text=f.read(), content_type="text/html")
+
+    async def category(self, request):
+        failure = self._failure(request)
+        if failure is not None:
+            return failure
+        return self._page("categories", f"page_{request.query.get('page', '1')}.html")
+
+    async def recipe(self, request):
+        failure = self._failure(request)
+        if failure is not None:
+            return failure
+        return self._page("recipes", f"{request.match_info['slug']}.html")
+
+
+async def scrape(site, checkpoint_path, port=None, **kwargs):
+    server = TestServer(site.app, port=port)
+    await server.start_server()
+    try:
+        scraper = RecipeScraper(base_url=str(server.make_url("")), category_paths=[CATEGORY], concurrency=4,
+                                rate=100, checkpoint_path=checkpoint_path, max_retries=2, **kwargs)
+        return await scraper.run()
+    finally:
+        await server.close()
+
+
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(async_scraper.random, "uniform", lambda a, b: 0)
+
+
+def test_scrapes_fixture_site_and_clears_checkpoint(tmp_path, monkeypatch):
+    no_backoff(monkeypatch)
+    site = FakeEda()
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+
+    recipes = asyncio.run(scrape(site, checkpoint_path))
+
+    assert sorted(recipe["title"] for recipe in recipes) == [
+        "Гречка с грибами", "Куриный суп с лапшой", "Омлет с помидорами", "Салат с тунцом", "Сырники из творога"]
+    # 404 — окончательный ответ: страницу не повторяем и не считаем загрузку незавершенной
+    assert site.requests[CATEGORY + "/udalennyj-recept"] == 1
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_rerun_after_complete_run_fetches_again(tmp_path, monkeypatch):
+    no_backoff(monkeypatch)
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+    asyncio.run(scrape(FakeEda(), checkpoint_path))
+
+    site = FakeEda()
+    recipes = asyncio.run(scrape(site, checkpoint_path))
+
+    assert len(recipes) == 5
+    assert site.requests[CATEGORY + "?page=1"] == 1
+
+
+def test_retry_after_is_respected(tmp_path, monkeypatch):
+    no_backoff(monkeypatch)
+    path = CATEGORY + "/syrniki-iz-tvoroga"
+    site = FakeEda(failures={path: [429]}, retry_after="1")
+
+    recipes = asyncio.run(scrape(site, str(tmp_path / "checkpoint.jsonl")))
+
+    assert "Сырники из творога" in [recipe["title"] for recipe in recipes]
+    assert site.requests[path] == 2
+    first, second = site.times[path]
+    assert second - first >= 0.9
+
+
+def test_resumes_from_checkpoint(tmp_path, monkeypatch):
+    no_backoff(monkeypatch)
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+    failing = CATEGORY + "/grechka-s-gribami"
+    store = RecipeStore(str(tmp_path / "recipes.jsonl"))
+    # Ссылки в контрольной точке абсолютные, поэтому сайт поднимаем на том же порту
+    port = unused_port()
+
+    # Первый запуск: страница отвечает 500 на все попытки, рецепт остается незагруженным
+    first = asyncio.run(scrape(FakeEda(failures={failing: [500, 500]}), checkpoint_path, port=port, store=store))
+    assert len(first) == 4
+    assert os.path.exists(checkpoint_path)
+    assert not any(url.endswith(failing) for url in ScrapeCheckpoint(checkpoint_path).recipes)
+
+    # Второй запуск берет категории и готовые рецепты из контрольной точки и догружает только упавший
+    site = FakeEda()
+    second = asyncio.run(scrape(site, checkpoint_path, port=port, store=store))
+    assert len(second) == 5
+    assert set(site.requests) == {failing}
+    assert len(store) == 5
+    assert not os.path.exists(checkpoint_path)
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from utils import fsm_storage
+from utils.fsm_storage import SQLiteStorage, create_fsm_storage
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fsm_storage, "time", clock)
+    return clock
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_state_data_and_bucket_round_trip(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite"))
+    run(storage.set_state(chat=1, user=2, state="Form:name"))
+    run(storage.set_data(chat=1, user=2, data={"name": "Аня"}))
+    run(storage.update_data(chat=1, user=2, data={"age": 30}, city="Москва"))
+    run(storage.set_bucket(chat=1, user=2, bucket={"calls": 1}))
+    run(storage.update_bucket(chat=1, user=2, calls=2))
+
+    assert run(storage.get_state(chat=1, user=2)) == "Form:name"
+    assert run(storage.get_data(chat=1, user=2)) == {"name": "Аня", "age": 30, "city": "Москва"}
+    assert run(storage.get_bucket(chat=1, user=2)) == {"calls": 2}
+    # Другой пользователь в том же чате ничего не видит
+    assert run(storage.get_state(chat=1, user=3)) is None
+    assert run(storage.get_data(chat=1, user=3, default={"x": 1})) == {"x": 1}
+
+
+def test_records_expire_after_ttl(tmp_path, clock):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite"), ttl=60)
+    run(storage.set_state(chat=1, user=1, state="Form:name"))
+    run(storage.set_data(chat=1, user=1, data={"name": "Аня"}))
+
+    clock.now += 59
+    assert run(storage.get_state(chat=1, user=1)) == "Form:name"
+    # Запись продлевает срок жизни
+    run(storage.update_data(chat=1, user=1, step=2))
+    clock.now += 59
+    assert run(storage.get_data(chat=1, user=1)) == {"name": "Аня", "step": 2}
+
+    clock.now += 61
+    assert run(storage.get_state(chat=1, user=1)) is None
+    assert run(storage.get_data(chat=1, user=1)) == {}
+
+
+def test_expired_records_are_purged(tmp_path, clock):
+    path = str(tmp_path / "fsm.sqlite")
+    storage = SQLiteStorage(path, ttl=1)
+    run(storage.set_state(chat=1, user=1, state="Form:name"))
+    clock.now += 2
+    for user in range(100, 199):
+        run(storage.set_state(chat=2, user=user, state="Form:name"))
+
+    rows = storage._db.execute("SELECT COUNT(*) FROM fsm WHERE chat = '1'").fetchone()[0]
+    assert rows == 0
+
+
+def test_reset_state_keeps_or_drops_data(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite"))
+    run(storage.set_state(chat=1, user=1, state="Form:name"))
+    run(storage.set_data(chat=1, user=1, data={"name": "Аня"}))
+
+    run(storage.reset_state(chat=1, user=1, with_data=False))
+    assert run(storage.get_state(chat=1, user=1)) is None
+    assert run(storage.get_data(chat=1, user=1)) == {"name": "Аня"}
+
+    run(storage.set_state(chat=1, user=1, state="Form:age"))
+    run(storage.reset_state(chat=1, user=1, with_data=True))
+    assert run(storage.get_state(chat=1, user=1)) is None
+    assert run(storage.get_data(chat=1, user=1)) == {}
+    # Пустая запись удаляется целиком
+    assert storage._db.execute("SELECT COUNT(*) FROM fsm").fetchone()[0] == 0
+
+
+def test_state_survives_reopen(tmp_path):
+    path = str(tmp_path / "fsm.sqlite")
+    storage = SQLiteStorage(path, ttl=3600)
+    run(storage.set_state(chat=1, user=1, state="PlanEditForm:new_prompt"))
+    run(storage.update_data(chat=1, user=1, user_prompt="Без рыбы"))
+    run(storage.close())
+
+    reopened = SQLiteStorage(path, ttl=3600)
+    assert run(reopened.get_state(chat=1, user=1)) == "PlanEditForm:new_prompt"
+    assert run(reopened.get_data(chat=1, user=1)) == {"user_prompt": "Без рыбы"}
+
+
+def test_create_sqlite_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(fsm_storage, "FSM_STORAGE", "sqlite")
+    monkeypatch.setattr(fsm_storage, "FSM_SQLITE_PATH", str(tmp_path / "state" / "fsm.sqlite"))
+    monkeypatch.setattr(fsm_storage, "FSM_STATE_TTL", 120)
+    storage = create_fsm_storage()
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.ttl == 120
+    assert (tmp_path / "state" / "fsm.sqlite").exists()
+
+
+def test_create_memory_storage(monkeypatch):
+    monkeypatch.setattr(fsm_storage, "FSM_STORAGE", "memory")
+    assert isinstance(create_fsm_storage(), MemoryStorage)
+
+
+def test_create_redis_storage(monkeypatch):
+    pytest.importorskip("aioredis")
+    from aiogram.contrib.fsm_storage.redis import RedisStorage2
+
+    monkeypatch.setattr(fsm_storage, "FSM_STORAGE", "redis")
+    monkeypatch.setattr(fsm_storage, "FSM_STATE_TTL", 120)
+    storage = create_fsm_storage()
+    assert isinstance(storage, RedisStorage2)
+    assert storage._state_ttl == 120
@@ -0,0 +1,55 @@
+import pytest
+
+from utils.ingredient_index import IngredientIndex, parse_forbidden_products, product_stems
+
+RECIPES = [
+    {"url": "satay", "ingredients": ["Куриное филе: 300 г", "Арахисовая паста: 2 ст. ложки", "Соевый соус: 1 ст. ложка"]},
+    {"url": "salad", "ingredients": ["Салат: 1 пучок", "Арахис жареный: 30 г"]},
+    {"url": "omelet", "ingredients": ["Яйца куриные: 3 шт", "Молоко: 50 мл"]},
+    {"url": "pasta", "ingredients": ["Паста (спагетти): 200 г", "Томаты: 2 шт"]},
+    {"url": "mushrooms", "ingredients": ["Грибы шампиньоны: 300 г", "Лук репчатый: 1 шт"]},
+    {"url": "soup", "ingredients": ["Грибной бульон: 1 л", "Картофель: 3 шт"]},
+    {"url": "oatmeal", "ingredients": ["Овсяные хлопья: 80 г", "Банан: 1 шт"]},
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return IngredientIndex.from_recipes(RECIPES + [None])
+
+
+@pytest.mark.parametrize("forbidden, excluded", [
+    # Основа запрета находит и прилагательные от нее
+    ("арахис", {"satay", "salad"}),
+    ("Аллергия на грибы", {"mushrooms", "soup"}),
+    # Многословный продукт исключается, только если все слова в одном ингредиенте
+    ("арахисовая паста", {"satay"}),
+    ("паста", {"satay", "pasta"}),
+    ("куриные яйца", {"omelet"}),
+    # Несколько продуктов через запятую и "и"
+    ("яйца, молоко и бананы", {"omelet", "oatmeal"}),
+    ("", set()),
+    ("ничего", set()),
+])
+def test_excluded_recipes(index, forbidden, excluded):
+    assert index.excluded_recipes(forbidden) == excluded
+
+
+def test_unrelated_recipes_stay(index):
+    excluded = index.excluded_recipes("арахис, грибы")
+
+    assert {"omelet", "pasta", "oatmeal"}.isdisjoint(excluded)
+
+
+def test_index_picks_up_added_recipes(index):
+    index = IngredientIndex.from_recipes(RECIPES)
+    assert index.excluded_recipes("креветки") == set()
+
+    index.add("shrimps", ["Креветки королевские: 200 г"])
+
+    assert index.excluded_recipes("креветки") == {"shrimps"}
+
+
+def test_forbidden_products_parsing():
+    assert parse_forbidden_products("Аллергия на орехи; не люблю рыбу или грибы") == [
+        product_stems("орехи"), product_stems("рыбу"), product_stems("грибы")]
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, types
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.plan_pipeline import make_profile
+from utils import metrics
+from utils.instrumentation import add_stage_listener, remove_stage_listener, stage
+from utils.llm_backends import set_backends
+from utils.metrics import TelegramMetricsMiddleware, metrics_handler, observe_stage, registry
+
+UPDATE = {
+    "update_id": 1,
+    "message": {"message_id": 1, "date": 0, "text": "привет",
+                "chat": {"id": 42, "type": "private"}, "from": {"id": 42, "is_bot": False, "first_name": "Тест"}},
+}
+
+
+@pytest.fixture(scope="module")
+def ai_tools():
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings
+
+    # Модели подменяем до первого импорта utils.ai_tools
+    set_backends(llm=FakeChatModel(tokens=50), embeddings=FakeEmbeddings())
+    from utils import ai_tools
+
+    return ai_tools
+
+
+@pytest.fixture
+def stage_metrics():
+    add_stage_listener(observe_stage)
+    yield
+    remove_stage_listener(observe_stage)
+
+
+async def get_metrics():
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    async with TestClient(TestServer(app)) as client:
+        response = await client.get("/metrics")
+        return response.status, response.headers["Content-Type"], await response.text()
+
+
+def test_plan_pipeline_fills_stage_and_llm_metrics(ai_tools, stage_metrics):
+    plans = metrics.stage_calls.value(stage="block_plan")
+    llm_calls = metrics.llm_calls.value(stage="block_plan")
+
+    plan = ai_tools.create_meal_and_coocking_plan(1, make_profile(1, cooking_days=2))
+
+    assert plan["blocks"]
+    assert metrics.stage_calls.value(stage="block_plan") - plans == len(plan["blocks"])
+    assert metrics.llm_calls.value(stage="block_plan") - llm_calls == len(plan["blocks"])
+    assert metrics.llm_prompt_tokens.value(stage="block_plan") > 0
+
+    text = registry.render()
+    assert "# TYPE eatme_stage_duration_seconds histogram" in text
+    assert 'eatme_stage_duration_seconds_bucket{stage="block_plan",le="+Inf"}' in text
+    assert 'eatme_stage_duration_seconds_count{stage="llm"}' in text
+    assert 'eatme_llm_calls_total{stage="block_plan"}' in text
+
+    status, content_type, body = asyncio.run(get_metrics())
+    assert status == 200
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert 'eatme_stage_calls_total{stage="block_plan"}' in body
+    assert 'eatme_llm_completion_tokens_total{stage="block_plan"}' in body
+
+
+def test_listener_is_registered_once(stage_metrics):
+    calls = metrics.stage_calls.value(stage="test_once")
+    add_stage_listener(observe_stage)
+
+    with stage("test_once"):
+        pass
+
+    assert metrics.stage_calls.value(stage="test_once") - calls == 1
+
+
+def test_failed_stage_is_counted(stage_metrics):
+    errors = metrics.stage_errors.value(stage="test_failing")
+
+    with pytest.raises(ValueError):
+        with stage("test_failing"):
+            raise ValueError()
+
+    assert metrics.stage_errors.value(stage="test_failing") - errors == 1
+    assert metrics.stage_calls.value(stage="test_failing") >= 1
+
+
+def test_telegram_middleware_counts_updates_and_handlers():
+    async def main():
+        dp = Dispatcher(Bot(token="123456789:AAEtestTokenForLocalTestsOnly_000000"))
+        dp.middleware.setup(TelegramMetricsMiddleware())
+
+        async def echo_for_metrics(message: types.Message):
+            return message.text
+
+        async def broken_for_metrics(message: types.Message):
+            raise RuntimeError()
+
+        async def ignore_error(update, error):
+            return True
+
+        dp.register_message_handler(echo_for_metrics, text="привет")
+        dp.register_message_handler(broken_for_metrics, text="сломай")
+        dp.register_errors_handler(ignore_error)
+
+        # Как при polling и вебхуке: через updates_handler, чтобы сработали все хуки middleware
+        await dp.updates_handler.notify(types.Update(**UPDATE))
+        broken = dict(UPDATE, message=dict(UPDATE["message"], text="сломай"))
+        await dp.updates_handler.notify(types.Update(**broken))
+
+    updates = metrics.telegram_updates.value(type="message")
+    calls = metrics.telegram_handler_calls.value(handler="echo_for_metrics")
+    errors = metrics.telegram_errors.value(type="RuntimeError")
+
+    asyncio.run(main())
+
+    assert metrics.telegram_updates.value(type="message") - updates == 2
+    assert metrics.telegram_handler_calls.value(handler="echo_for_metrics") - calls == 1
+    assert metrics.telegram_errors.value(type="RuntimeError") - errors == 1
+    assert 'eatme_telegram_handler_duration_seconds_count{handler="echo_for_metrics"} 1' in registry.render()
@@ -0,0 +1,89 @@
+import asyncio
+
+from utils.outbox import MESSAGE_LIMIT, Outbox
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        self.sent.append((chat_id, text, parse_mode, kwargs))
+        return len(self.sent)
+
+
+def run_outbox(send, **kwargs):
+    bot = FakeBot()
+
+    async def main():
+        outbox = Outbox(bot, global_rate=1000, chat_rate=1000, chat_burst=1000, **kwargs)
+        return await send(outbox)
+
+    return bot, asyncio.run(main())
+
+
+def test_queued_short_messages_are_merged():
+    bot, results = run_outbox(lambda outbox: outbox.send_many(1, ["Заголовок", "Блок плана"], parse_mode="Markdown"))
+
+    assert bot.sent == [(1, "Заголовок\n\nБлок плана", "Markdown", {})]
+    # Оба сообщения доставлены одним и тем же сообщением Telegram
+    assert results == [1, 1]
+
+
+def test_enqueue_keeps_order_and_does_not_merge_across_chats_or_parse_modes():
+    async def send(outbox):
+        futures = [
+            outbox.enqueue(1, "первое"),
+            outbox.enqueue(2, "другой чат"),
+            outbox.enqueue(1, "*второе*", parse_mode="Markdown"),
+            outbox.enqueue(1, "третье", parse_mode="Markdown"),
+        ]
+        return await asyncio.gather(*futures)
+
+    bot, _ = run_outbox(send)
+
+    assert [(chat, text, mode) for chat, text, mode, _ in bot.sent if chat == 1] == [
+        (1, "первое", None),
+        (1, "*второе*\n\nтретье", "Markdown"),
+    ]
+    assert [text for chat, text, _, _ in bot.sent if chat == 2] == ["другой чат"]
+
+
+def test_long_messages_and_keyboards_are_not_merged():
+    long_text = "слово " * 300
+
+    async def send(outbox):
+        futures = [
+            outbox.enqueue(1, "коротко"),
+            outbox.enqueue(1, long_text),
+            outbox.enqueue(1, "с кнопкой", reply_markup="keyboard"),
+            outbox.enqueue(1, "после кнопки"),
+        ]
+        return await asyncio.gather(*futures)
+
+    bot, _ = run_outbox(send, coalesce_length=1000)
+
+    assert [text for _, text, _, _ in bot.sent] == ["коротко", long_text, "с кнопкой", "после кнопки"]
+    assert bot.sent[2][3] == {"reply_markup": "keyboard"}
+
+
+def test_message_over_limit_is_split():
+    text = "\n".join(f"строка {i}" for i in range(1000))
+    bot, result = run_outbox(lambda outbox: outbox.send(1, text))
+
+    assert len(bot.sent) > 1
+    assert all(len(sent_text) <= MESSAGE_LIMIT for _, sent_text, _, _ in bot.sent)
+    assert "\n".join(sent_text for _, sent_text, _, _ in bot.sent) == text
+    # Возвращается последнее отправленное сообщение
+    assert result == len(bot.sent)
+
+
+def test_drain_waits_for_queued_messages():
+    async def send(outbox):
+        for chat_id in range(3):
+            outbox.enqueue(chat_id, f"сообщение {chat_id}")
+        await outbox.drain(timeout=5)
+
+    bot, _ = run_outbox(send)
+
+    assert sorted(text for _, text, _, _ in bot.sent) == ["сообщение 0", "сообщение 1", "сообщение 2"]
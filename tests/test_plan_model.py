@@ -0,0 +1,112 @@
+import pytest
+
+from utils.plan_model import (find_edit_target, make_meal, merge_edited_block, new_plan, parse_block_json,
+                              plan_from_legacy, preview_block_json, render_block)
+
+BLOCK = ('{"meals": [{"meal": "Завтрак", "dish": "Омлет с \\"помидорами\\"", "description": "Взбить яйца.\\nЖарить 5 минут.", '
+         '"ingredients": [{"name": "Яйца", "amount": 2, "unit": "шт"}], "calories": 300}, '
+         '{"meal": "Обед", "dish": "Гречка с грибами", "description": "Отварить гречку, обжарить грибы."}]}')
+
+
+def test_preview_shows_meals_of_partial_json():
+    partial = BLOCK[:BLOCK.index("Отварить") + 4]
+
+    assert preview_block_json(partial) == (
+        'Завтрак:\nОмлет с "помидорами"\nВзбить яйца. Жарить 5 минут.\n\nОбед:\nГречка с грибами\nОтва')
+    assert preview_block_json('{"meals": [{"me') == ""
+
+
+def test_preview_of_full_block_matches_parsed_dishes():
+    preview = preview_block_json(BLOCK)
+    block = parse_block_json(BLOCK, ["Понедельник"])
+
+    for meal in block["meals"]:
+        assert meal["dish"] in preview
+
+
+def make_block(days, *meals):
+    return {"days": days, "meals": [make_meal(meal, dish) for meal, dish in meals]}
+
+
+PLAN = new_plan([
+    make_block(["Понедельник", "Вторник"], ("Завтрак", "Сырники со сметаной"), ("Обед", "Борщ"),
+               ("Ужин", "Курица с рисом")),
+    make_block(["Среда", "Четверг"], ("Завтрак", "Овсянка с ягодами"), ("Обед", "Гречка с грибами"),
+               ("Ужин", "Рыба с картофелем")),
+    make_block(["Пятница", "Суббота", "Воскресенье"], ("Завтрак", "Омлет с овощами"), ("Обед", "Плов"),
+               ("Ужин", "Салат с тунцом")),
+])
+
+
+@pytest.mark.parametrize("request_text, expected", [
+    # День и прием пищи
+    ("Замени ужин в среду на рыбу", ([1], {"ужин"})),
+    ("Поменяй обед во вторник и в пятницу", ([0, 2], {"обед"})),
+    ("Добавь перекус в четверг", ([1], {"перекус"})),
+    # Только день: блок целиком
+    ("Понедельник без мяса", ([0], None)),
+    ("В выходные хочу что-то полегче", ([2], None)),
+    # Только прием пищи: во всех блоках
+    ("Хочу другие завтраки", ([0, 1, 2], {"завтрак"})),
+    # Блюдо по основам слов
+    ("Замени сырники на что-нибудь другое", ([0], {"завтрак"})),
+    ("Убери грибы", ([1], {"обед"})),
+    # Ничего не найдено или правка всего плана: перестраиваем целиком
+    ("Сделай вкуснее", None),
+    ("Переделай весь план с нуля", None),
+])
+def test_find_edit_target(request_text, expected):
+    assert find_edit_target(PLAN, request_text) == expected
+
+
+def test_find_edit_target_on_empty_plan():
+    assert find_edit_target(new_plan([]), "Замени ужин в среду") is None
+
+
+def test_merge_replaces_only_edited_meals():
+    old_block = PLAN["blocks"][1]
+    new_block = make_block(["Среда", "Четверг"], ("Завтрак", "Блины"), ("Ужин", "Лосось с брокколи"))
+
+    merged = merge_edited_block(old_block, new_block, {"ужин"})
+
+    assert merged["days"] == ["Среда", "Четверг"]
+    assert [meal["dish"] for meal in merged["meals"]] == ["Овсянка с ягодами", "Гречка с грибами", "Лосось с брокколи"]
+
+
+def test_merge_appends_new_meals():
+    new_block = make_block(["Среда", "Четверг"], ("Перекус", "Творог с ягодами"))
+
+    merged = merge_edited_block(PLAN["blocks"][1], new_block, {"перекус"})
+
+    assert [meal["meal"] for meal in merged["meals"]] == ["Завтрак", "Обед", "Ужин", "Перекус"]
+
+
+@pytest.mark.parametrize("old_block, meals", [
+    # Блок целиком
+    (PLAN["blocks"][1], None),
+    # Старый текстовый блок, который не удалось разобрать: заменить отдельный прием пищи нельзя
+    ({"days": ["Среда", "Четверг"], "meals": [], "text": "Среда и четверг: рыба с картофелем"}, {"ужин"}),
+])
+def test_merge_takes_new_block(old_block, meals):
+    new_block = make_block(["Среда", "Четверг"], ("Ужин", "Лосось с брокколи"))
+
+    assert merge_edited_block(old_block, new_block, meals) is new_block
+
+
+def test_merge_into_legacy_block_drops_its_text():
+    legacy_text = "Среда, Четверг:\n\n**Завтрак:**\nОвсянка с ягодами\n\n**Ужин:**\nРыба с картофелем"
+    old_block = plan_from_legacy([legacy_text])["blocks"][0]
+    new_block = make_block(["Среда", "Четверг"], ("Ужин", "Лосось с брокколи"))
+
+    merged = merge_edited_block(old_block, new_block, {"ужин"})
+
+    # Исходный Markdown больше не соответствует блоку, поэтому блок рендерится из структуры
+    assert "text" not in merged
+    assert [meal["dish"] for meal in merged["meals"]] == ["Овсянка с ягодами", "Лосось с брокколи"]
+    assert "Лосось с брокколи" in render_block(merged)
+
+
+def test_merge_keeps_new_block_when_model_renamed_meals():
+    new_block = make_block(["Среда", "Четверг"], ("Вечер", "Лосось с брокколи"))
+
+    assert merge_edited_block(PLAN["blocks"][1], new_block, {"ужин"}) is new_block
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from utils.plan_service import PlanGenerationService
+
+
+def test_drain_waits_for_inflight_handlers():
+    events = []
+
+    async def handler(service):
+        async with service.inflight():
+            events.append(await service.submit(1, lambda: "plan"))
+            # После генерации обработчик еще сохраняет план и отправляет сообщения
+            await asyncio.sleep(0.7)
+            events.append("sent")
+
+    async def main():
+        service = PlanGenerationService(workers=1, queue_size=1)
+        await service.start()
+        task = asyncio.create_task(handler(service))
+        await asyncio.sleep(0.1)
+        await service.drain(timeout=5)
+        events.append("drained")
+        await service.shutdown()
+        await task
+
+    asyncio.run(main())
+    assert events == ["plan", "sent", "drained"]
+
+
+def test_drain_gives_up_after_timeout():
+    async def main():
+        service = PlanGenerationService(workers=1, queue_size=1)
+        await service.start()
+        release = asyncio.Event()
+
+        async def handler():
+            async with service.inflight():
+                await release.wait()
+
+        task = asyncio.create_task(handler())
+        await asyncio.sleep(0)
+        await service.drain(timeout=0.1)
+        stuck = service._busy()
+        release.set()
+        await task
+        await service.shutdown()
+        return stuck, service._busy()
+
+    assert asyncio.run(main()) == (True, False)
+
+
+def test_submit_before_start_raises():
+    service = PlanGenerationService(workers=1, queue_size=1)
+
+    with pytest.raises(RuntimeError, match="service not started"):
+        asyncio.run(service.submit(1, lambda: "plan"))
+    assert not service.is_running_for(1)
@@ -0,0 +1,42 @@
+import json
+import os
+
+from utils.profiles import ProfileRepository
+
+
+def test_cached_profile_is_a_copy(tmp_path):
+    repository = ProfileRepository(str(tmp_path))
+    repository.save(1, {"name": "Анна", "allergies": []})
+
+    profile = repository.get(1)
+    profile["allergies"].append("арахис")
+
+    assert repository.get(1) == {"name": "Анна", "allergies": []}
+    assert repository.stats() == {"cached": 1, "hits": 2, "misses": 0}
+
+
+def test_profile_is_reloaded_after_external_edit(tmp_path):
+    repository = ProfileRepository(str(tmp_path))
+    path = repository.save(1, {"name": "Анна"})
+    assert repository.get(1) == {"name": "Анна"}
+
+    # Размер файла тот же, поменялись только содержимое и mtime
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"name": "Инна"}, f, ensure_ascii=False, indent=4)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert repository.get(1) == {"name": "Инна"}
+    assert repository.misses == 1
+    assert repository.get(1) == {"name": "Инна"}
+    assert repository.misses == 1
+
+
+def test_deleted_profile_is_forgotten(tmp_path):
+    repository = ProfileRepository(str(tmp_path))
+    path = repository.save(1, {"name": "Анна"})
+
+    os.remove(path)
+
+    assert repository.get(1) is None
+    assert repository.stats()["cached"] == 0
@@ -0,0 +1,50 @@
+import numpy as np
+
+from utils.query_cache import QueryCache
+
+
+def test_hit_keeps_recipes_for_same_index_version(tmp_path):
+    cache = QueryCache(str(tmp_path / "cache.sqlite"))
+    cache.put("Суп  с Грибами", [0.5, 1.5], ["1", "2"], "v1")
+
+    vector, recipe_ids = cache.get("суп с грибами", "v1")
+
+    assert vector.tolist() == [0.5, 1.5]
+    assert recipe_ids == ["1", "2"]
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_recipes_are_dropped_when_index_version_changes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    QueryCache(path).put("борщ", [1.0, 2.0], ["7"], "v1")
+
+    # Новый экземпляр читает запись с диска, второй запрос попадает в память
+    cache = QueryCache(path)
+    for _ in range(2):
+        vector, recipe_ids = cache.get("борщ", "v2")
+        assert vector.tolist() == [1.0, 2.0]
+        assert recipe_ids is None
+    assert (cache.disk_hits, cache.memory_hits) == (1, 1)
+
+    assert cache.get("борщ", "v1")[1] == ["7"]
+
+
+def test_invalidate_results_keeps_embeddings(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = QueryCache(path)
+    cache.put("плов", np.ones(3), ["3"], "v1")
+
+    cache.invalidate_results("v2")
+
+    for fresh in (cache, QueryCache(path)):
+        vector, recipe_ids = fresh.get("плов", "v1")
+        assert vector.tolist() == [1.0, 1.0, 1.0]
+        assert recipe_ids is None
+        assert fresh.get("плов", "v2")[1] is None
+
+
+def test_miss(tmp_path):
+    cache = QueryCache(str(tmp_path / "cache.sqlite"))
+
+    assert cache.get("окрошка", "v1") == (None, None)
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,45 @@
+import glob
+import os
+
+import pytest
+
+from utils.recipe_extractors import available_backends, get_extractor
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "eda")
+
+
+def read_fixture(*parts):
+    with open(os.path.join(FIXTURES, *parts), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_bs4_extracts_recipe():
+    recipe = get_extractor("bs4").extract_recipe(read_fixture("recipes", "omlet-s-pomidorami.html"), "https://eda.ru/r")
+    assert recipe == {
+        "title": "Омлет с помидорами",
+        "url": "https://eda.ru/r",
+        "portions": "2",
+        "cooking_time": "15 минут",
+        "ingredients": ["Куриное яйцо: 4 штуки", "Молоко: 100 мл", "Помидоры: 2 штуки",
+                        "Сливочное масло: 1 столовая ложка", "Соль: по вкусу"],
+        "nutrition": {"calories": "210", "proteins": "14", "fats": "15", "carbs": "5"},
+    }
+
+
+def test_missing_nutrition_is_not_specified():
+    recipe = get_extractor("bs4").extract_recipe(read_fixture("recipes", "salat-s-tuncom.html"), "u")
+    assert set(recipe["nutrition"].values()) == {"Не указано"}
+
+
+def test_page_without_recipe_gives_none():
+    assert get_extractor("bs4").extract_recipe(read_fixture("categories", "page_1.html"), "u") is None
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_match_bs4(backend):
+    extractor, reference = get_extractor(backend), get_extractor("bs4")
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "recipes", "*.html"))):
+        html = read_fixture("recipes", os.path.basename(path))
+        assert extractor.extract_recipe(html, path) == reference.extract_recipe(html, path)
+    html = read_fixture("categories", "page_1.html")
+    assert extractor.extract_links(html, "https://eda.ru") == reference.extract_links(html, "https://eda.ru")
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from utils.recipe_index import RecipeMatrix
+
+
+class FakeVectorstore:
+    def __init__(self, data):
+        self.data = data
+
+    def get(self, include=None):
+        return self.data
+
+
+def make_matrix():
+    return RecipeMatrix(["a", "b", "c"], ["Суп", "Плов", "Салат"],
+                        [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], ["url-a", "url-b", None])
+
+
+def test_rank_orders_by_cosine_similarity():
+    matrix = make_matrix()
+
+    assert matrix.rank([[1.0, 0.1], [0.0, 2.0]], 2) == [[0, 2], [1, 2]]
+    assert matrix.rank([[1.0, 0.1]], 5) == [[0, 2, 1]]
+    assert matrix.rank([[1.0, 0.1]], 2, mask=np.array([False, True, True])) == [[2, 1]]
+
+
+def test_pick_gives_each_recipe_to_one_query():
+    assert RecipeMatrix.pick([[0, 2], [0, 1]]) == [[0], [1]]
+    assert RecipeMatrix.pick([[0, 2], [0, 1]], dedupe=False) == [[0], [0]]
+
+
+@pytest.mark.parametrize("embeddings", [[], None, np.empty((0,))])
+def test_empty_collection(embeddings):
+    matrix = RecipeMatrix.from_vectorstore(
+        FakeVectorstore({"ids": [], "documents": [], "metadatas": [], "embeddings": embeddings}))
+
+    assert len(matrix) == 0
+    assert matrix.vectors.shape[0] == 0
+    assert matrix.rank([[1.0, 0.0], [0.0, 1.0]], 3) == [[], []]
+    assert matrix.version == RecipeMatrix([], [], []).version
+    assert matrix.version != make_matrix().version
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from utils.recipe_store import RecipeStore
+
+
+def recipe(i, **fields):
+    return dict({"url": f"https://eda.ru/recepty/{i}", "title": f"Рецепт {i}", "ingredients": ["Яйца: 2 шт"]}, **fields)
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = str(tmp_path / "recipes.jsonl")
+    store = RecipeStore(path)
+    for i in range(3):
+        store.append(recipe(i))
+    # Повторная запись того же URL заменяет прежнюю
+    store.append(recipe(1, title="Рецепт 1, исправленный"))
+    store.close()
+    return path
+
+
+def check_store(path, extra=()):
+    store = RecipeStore(path)
+    urls = [recipe(i)["url"] for i in (0, 2, 1, *extra)]
+    assert len(store) == len(urls)
+    assert store.get(recipe(1)["url"])["title"] == "Рецепт 1, исправленный"
+    # Полный проход идет в порядке файла и отдает только последнюю версию рецепта
+    assert [item["url"] for item in store] == urls
+    return store
+
+
+def test_reopen_uses_index(store_path):
+    check_store(store_path)
+
+
+def test_rebuilds_deleted_index(store_path):
+    os.remove(store_path + ".idx")
+
+    check_store(store_path)
+    # Восстановленный индекс записан на диск
+    with open(store_path + ".idx", encoding="utf-8") as f:
+        assert len(f.readlines()) == 4
+
+
+def test_indexes_lines_written_after_index(store_path):
+    with open(store_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(recipe(3), ensure_ascii=False) + "\n")
+
+    store = RecipeStore(store_path)
+    assert store.get(recipe(3)["url"])["title"] == "Рецепт 3"
+
+
+def test_drops_truncated_recipe_and_appends_after_it(store_path):
+    # Сбой посреди записи: рецепт дописан наполовину, в индекс не попал
+    with open(store_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(recipe(3), ensure_ascii=False)[:20])
+
+    store = check_store(store_path)
+    store.append(recipe(4))
+    store.close()
+
+    # Новая запись не склеилась с оборванной: читается и по индексу, и при полном проходе
+    for path in (store_path, store_path + ".idx"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                json.loads(line)
+    reopened = RecipeStore(store_path)
+    assert recipe(3)["url"] not in reopened
+    assert reopened.get(recipe(4)["url"])["title"] == "Рецепт 4"
+    assert [item["url"] for item in reopened][-1] == recipe(4)["url"]
+
+
+def test_drops_truncated_index_line(store_path):
+    with open(store_path + ".idx", "rb+") as f:
+        f.truncate(os.path.getsize(store_path + ".idx") - 5)
+
+    store = check_store(store_path)
+    store.append(recipe(4))
+    store.close()
+
+    with open(store_path + ".idx", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    # Оборванная запись индекса восстановлена по файлу рецептов, дубликатов нет
+    assert len(entries) == 5
+    assert check_store(store_path, extra=(4,)).get(recipe(4)["url"])["title"] == "Рецепт 4"
+
+
+def test_rebuilds_index_pointing_past_the_end(store_path):
+    # Файл рецептов откатился (например, восстановлен из копии), а индекс остался прежним
+    with open(store_path, "rb") as f:
+        lines = f.readlines()
+    with open(store_path, "wb") as f:
+        f.writelines(lines[:2])
+
+    store = RecipeStore(store_path)
+    assert store.urls() == [recipe(0)["url"], recipe(1)["url"]]
+    assert store.get(recipe(1)["url"])["title"] == "Рецепт 1"
@@ -0,0 +1,104 @@
+import pytest
+
+from utils.plan_model import block_shopping_list, make_meal
+from utils.shopping import (Ingredient, ShoppingList, format_amount, parse_ingredient, parse_number, parse_quantity,
+                            parse_unit)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("3", 3.0),
+    ("0,3", 0.3),
+    ("1/2", 0.5),
+    ("½", 0.5),
+    ("1⅕", 1.2),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("кг", ("г", 1000)),
+    ("ст.л.", ("ч.л.", 3)),
+    ("столовые", ("ч.л.", 3)),
+    ("стакана", ("мл", 250)),
+    ("зубчика", ("зубч.", 1)),
+    ("горсть", None),
+])
+def test_parse_unit(text, expected):
+    assert parse_unit(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2 ст. ложки", (6.0, "ч.л.")),
+    ("2 столовые ложки", (6.0, "ч.л.")),
+    # Для диапазона берем верхнюю границу
+    ("1-2 шт", (2.0, "шт")),
+    ("1–2 зубчика", (2.0, "зубч.")),
+    ("1⅕ кг", (1200.0, "г")),
+    ("0,3 л", (300.0, "мл")),
+    ("1/2 стакана", (125.0, "мл")),
+    ("3", (3.0, "шт")),
+    ("по вкусу", (None, None)),
+    ("щепотка", (None, None)),
+    ("немного", (None, None)),
+    ("", (None, None)),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == expected
+
+
+@pytest.mark.parametrize("amount, unit, expected", [
+    (6, "ч.л.", "2 ст.л."),
+    (2, "ч.л.", "2 ч.л."),
+    (1.2, "ч.л.", "1,5 ч.л."),
+    (1200, "г", "1,2 кг"),
+    (300, "мл", "300 мл"),
+    (150.2, "г", "151 г"),
+    (1.5, "шт", "2 шт"),
+])
+def test_format_amount(amount, unit, expected):
+    assert format_amount(amount, unit) == expected
+
+
+def test_parse_ingredient():
+    assert parse_ingredient("- Куриное яйцо — 2 шт") == Ingredient("Куриное яйцо", 2.0, "шт")
+    assert parse_ingredient("Соль: по вкусу") == Ingredient("Соль", None, None)
+    assert parse_ingredient("Сливочное масло: 2 ст. ложки") == Ingredient("Сливочное масло", 6.0, "ч.л.")
+
+
+def test_spoons_round_trip_to_tablespoons():
+    shopping = ShoppingList()
+    shopping.add(parse_ingredient("Оливковое масло: 2 ст. ложки"))
+
+    assert list(shopping.items()) == [("Оливковое масло", "2 ст.л.")]
+
+
+def test_shopping_list_merges_products_by_stems():
+    shopping = ShoppingList()
+    shopping.add(parse_ingredient("Куриное яйцо: 2 шт"))
+    shopping.add(parse_ingredient("яйца куриные: 1-2 шт"))
+    shopping.add(parse_ingredient("Соль: по вкусу"))
+    shopping.add(parse_ingredient("Соль: щепотка"))
+    shopping.add(parse_ingredient("Молоко: 0,3 л"))
+    shopping.add(parse_ingredient("Молоко: 200 мл"))
+    shopping.add(parse_ingredient("Молоко: 1 шт"))
+
+    assert len(shopping) == 3
+    assert list(shopping.items()) == [
+        ("Куриное яйцо", "4 шт"),
+        ("Соль", "по вкусу"),
+        # Разные семейства единиц не пересчитываются друг в друга
+        ("Молоко", "500 мл + 1 шт"),
+    ]
+
+
+def test_block_shopping_multiplies_by_days_and_servings():
+    block = {"days": ["Понедельник", "Вторник", "Среда"], "meals": [
+        make_meal("Завтрак", "Омлет",
+                  ingredients=[("Куриные яйца", 2, "шт"), ("Молоко", 100, "мл"), ("Соль", None, None)]),
+        make_meal("Ужин", "Блины", ingredients=[("Яйца куриные", 1, "шт"), ("Мука", 500, "г")]),
+    ]}
+
+    assert list(block_shopping_list(block).items()) == [
+        ("Куриные яйца", "9 шт"), ("Молоко", "300 мл"), ("Соль", "по вкусу"), ("Мука", "1,5 кг")]
+    assert dict(block_shopping_list(block, servings=2).items())["Куриные яйца"] == "18 шт"
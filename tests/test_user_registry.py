@@ -0,0 +1,46 @@
+import os
+import shutil
+
+from utils.user_registry import UserRegistry
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "user_data.csv")
+
+
+def test_migrate_from_pandas_csv(tmp_path):
+    csv_path = str(tmp_path / "user_data.csv")
+    shutil.copy(FIXTURE, csv_path)
+    registry = UserRegistry(str(tmp_path / "users.sqlite"))
+
+    # Строка без user_id пропускается, индексные столбцы "Unnamed: 0" не мешают
+    assert registry.migrate_from_csv(csv_path) == 3
+
+    assert registry.user_ids() == {675894187, 1172350813, 1560204149}
+    assert registry.exists(1560204149) and not registry.exists(0)
+    assert registry.get(675894187)["user_info_file"] == "profiles/user_675894187.json"
+    assert registry.get(675894187)["meal_plan_file"] == ""
+    user = registry.get(1172350813)
+    assert (user["meal_plan_file"], user["cook_file_path"]) == (
+        "storage/meal_plan_1172350813.json", "storage/shopping_schedule_1172350813.json")
+    # Старый столбец meal_plan_link используется, если plan_file_path пуст
+    assert registry.get(1560204149)["meal_plan_file"] == "storage/meal_plan_1560204149.json"
+
+    # Файл переименован, повторный запуск его не увидит
+    assert not os.path.exists(csv_path)
+    assert os.path.exists(csv_path + ".migrated")
+
+
+def test_registry_survives_reopen_and_clears_plan(tmp_path):
+    path = str(tmp_path / "users.sqlite")
+    registry = UserRegistry(path)
+    registry.upsert(1, user_info_file="profiles/user_1.json", meal_plan_file="storage/meal_plan_1.json")
+    # None оставляет текущее значение
+    registry.upsert(1, cook_file_path="storage/meal_plan_1.json")
+
+    reopened = UserRegistry(path)
+    assert reopened.get(1)["user_info_file"] == "profiles/user_1.json"
+    assert reopened.get(1)["cook_file_path"] == "storage/meal_plan_1.json"
+
+    assert reopened.clear_plan(1)
+    assert (reopened.get(1)["meal_plan_file"], reopened.get(1)["cook_file_path"]) == ("", "")
+    assert reopened.get(1)["user_info_file"] == "profiles/user_1.json"
+    assert not reopened.clear_plan(2)
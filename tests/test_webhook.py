@@ -0,0 +1,89 @@
+import asyncio
+import os
+
+import pytest
+from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY, WebhookRequestHandler
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils.outbox import Outbox
+
+SECRET = "local-test-secret"
+UPDATE = {
+    "update_id": 1,
+    "message": {"message_id": 1, "date": 0, "text": "/help",
+                "chat": {"id": 42, "type": "private"}, "from": {"id": 42, "is_bot": False, "first_name": "Тест"}},
+}
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture(scope="module")
+def bot_main(tmp_path_factory):
+    # main.py создает storage/ и profiles/ относительно текущего каталога, поэтому импортируем его во временном
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("bot"))
+    try:
+        import main
+
+        yield main
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def app(bot_main, monkeypatch):
+    monkeypatch.setattr(bot_main, "WEBHOOK_SECRET", SECRET)
+    bot = FakeBot()
+    monkeypatch.setattr(bot_main, "outbox", Outbox(bot, global_rate=100, chat_rate=100, chat_burst=100))
+    app = bot_main.create_web_app()
+    # Маршрут вебхука подключаем так же, как executor.set_webhook
+    app.router.add_route("*", bot_main.WEBHOOK_PATH, WebhookRequestHandler)
+    app[BOT_DISPATCHER_KEY] = bot_main.dp
+    app["fake_bot"] = bot
+    return app
+
+
+def requests(app, *calls):
+    # Приложение aiohttp привязывается к одному циклу событий, поэтому все запросы теста идут через один клиент
+    async def main():
+        results = []
+        async with TestClient(TestServer(app)) as client:
+            for method, path, kwargs in calls:
+                response = await client.request(method, path, **kwargs)
+                results.append((response.status, await response.text()))
+        return results
+
+    return asyncio.run(main())
+
+
+def test_health(app):
+    [(status, body)] = requests(app, ("GET", "/health", {}))
+
+    assert status == 200
+    assert '"status": "ok"' in body
+
+
+def test_webhook_rejects_wrong_secret(app, bot_main):
+    results = requests(app, *[("POST", bot_main.WEBHOOK_PATH, {"json": UPDATE, "headers": headers})
+                              for headers in ({}, {"X-Telegram-Bot-Api-Secret-Token": "wrong"})])
+
+    assert [status for status, _ in results] == [403, 403]
+    assert app["fake_bot"].sent == []
+
+
+def test_webhook_dispatches_synthetic_update(app, bot_main):
+    [(status, body)] = requests(app, ("POST", bot_main.WEBHOOK_PATH,
+                                      {"json": UPDATE, "headers": {"X-Telegram-Bot-Api-Secret-Token": SECRET}}))
+
+    assert (status, body) == (200, "ok")
+    # Пользователь не зарегистрирован: ответ отправляет RegistrationMiddleware
+    assert len(app["fake_bot"].sent) == 1
+    chat_id, text = app["fake_bot"].sent[0]
+    assert chat_id == 42
+    assert "не зарегистрированы" in text
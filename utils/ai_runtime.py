@@ -0,0 +1,67 @@
+import asyncio
+import importlib
+import logging
+import threading
+import time
+
+
+class AILayer:
+    """Lazily imported `utils.ai_tools`.
+
+    Importing the AI module loads langchain and Chroma and syncs the recipe
+    index, which takes a long time. The bot starts without it: `warm_up()`
+    imports it in a background thread after startup and `ready` tells
+    handlers whether it is available yet. `call()` loads it on demand,
+    blocking the calling thread until the import is finished.
+    """
+
+    def __init__(self, module_name="utils.ai_tools"):
+        self.module_name = module_name
+        self.module = None
+        self.load_seconds = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.module is not None
+
+    def load(self):
+        if self.module is not None:
+            return self.module
+        with self._lock:
+            if self.module is None:
+                start = time.perf_counter()
+                try:
+                    module = importlib.import_module(self.module_name)
+                except Exception as e:
+                    self.error = e
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self.error = None
+                self.module = module
+                logging.info(f"AI-модуль загружен за {self.load_seconds:.1f} с")
+        return self.module
+
+    def call(self, name, *args, **kwargs):
+        return getattr(self.load(), name)(*args, **kwargs)
+
+    async def warm_up(self):
+        # Отдельный daemon-поток: долгая загрузка не должна задерживать остановку бота
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                # Исключение передаем аргументом: после блока except имя e уже удалено
+                loop.call_soon_threadsafe(lambda error=e: done.done() or done.set_exception(error))
+            else:
+                loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+        threading.Thread(target=run, name="ai-warmup", daemon=True).start()
+        try:
+            await done
+        except Exception:
+            logging.exception("Не удалось загрузить AI-модуль, повторим при первом запросе плана")
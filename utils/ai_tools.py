@@ -1,23 +1,35 @@
-import os
+import logging
 import re
 
-from langchain_community.chat_models.gigachat import GigaChat
+import numpy as np
+
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from langchain.memory import ConversationBufferMemory
 from langchain_core.documents import Document
-from langchain_chroma import Chroma
-from langchain_gigachat.embeddings import GigaChatEmbeddings
 
 from utils.parse_recipies import load_recipes
+from utils.recipe_index import load_vectorstore, RecipeMatrix
+from utils.plan_blocks import split_days_into_blocks, generate_blocks_sequential, generate_blocks_parallel
+from utils.query_cache import QueryCache
+from utils.recipe_table import RecipeTable
+from utils.ingredient_index import IngredientIndex
+from utils.memory_manager import ConversationMemoryManager, estimate_tokens
+from utils.profiles import cooking_preferences_hash, is_cooking_analysis_fresh
+from utils.plan_model import (new_plan, parse_block, has_ingredients, render_block, render_shopping, summarize_blocks,
+                               find_edit_target, merge_edited_block)
+from utils.llm_backends import get_llm, get_embeddings
+from utils.instrumentation import stage
+from utils.config import (PLAN_BLOCK_MODE, PLAN_FORMAT, SHOPPING_MODE, QUERY_CACHE_PATH, QUERY_CACHE_MEMORY_SIZE, QUERY_CACHE_DISK_SIZE,
+                          RETRIEVAL_CANDIDATES, MEMORY_DIR, MEMORY_MAX_USERS, MEMORY_MAX_TOKENS, MEMORY_IDLE_SECONDS)
 
 def get_docs_for_db():
     documents = []
     
-    recipes = load_recipes()
-    valid_recipes = [r for r in recipes if r is not None]
-    for recipe in valid_recipes:
-        
+    # Рецепты читаются из хранилища потоково
+    for recipe in load_recipes():
+        if recipe is None:
+            continue
+
         document = f"{recipe['title']}\n\n" \
                       f"Ингредиенты:\n" + "\n".join(recipe['ingredients']) + "\n\n"\
                       f"Порции: {recipe['portions']}\n" \
@@ -34,29 +46,55 @@ def get_docs_for_db():
 
     return documents
 
-vectorstore = Chroma.from_documents(
-    get_docs_for_db(),
-    embedding = GigaChatEmbeddings(
-    credentials=os.getenv("GIGACHAT_KEY"), scope="GIGACHAT_API_PERS", verify_ssl_certs=False
-    ),
-)
+# Модели берутся из utils.llm_backends: по умолчанию GigaChat, в бенчмарках — фейки
+embeddings = get_embeddings()
 
-# Инициализация GigaChat
-llm = GigaChat(
-    credentials=os.getenv("GIGACHAT_KEY"),
-    model='GigaChat:latest',
-    verify_ssl_certs=False,
-    temperature=0.3,
-    top_p=0.1,
-)
+# Индекс хранится на диске, при старте эмбеддим только новые и изменённые рецепты
+vectorstore = load_vectorstore(get_docs_for_db(), embedding=embeddings)
+
+# Матрица эмбеддингов рецептов для поиска сразу по всем запросам
+recipe_matrix = RecipeMatrix.from_vectorstore(vectorstore)
+
+# Числовые характеристики рецептов для фильтрации до поиска
+recipe_table = RecipeTable.from_recipes(load_recipes())
+
+# Обратный индекс ингредиентов: запрещенные продукты исключаем до поиска
+ingredient_index = IngredientIndex.from_recipes(load_recipes())
+
+# Кэш эмбеддингов запросов и найденных рецептов, результаты старой версии индекса сбрасываем
+query_cache = QueryCache(QUERY_CACHE_PATH, memory_size=QUERY_CACHE_MEMORY_SIZE, disk_size=QUERY_CACHE_DISK_SIZE)
+query_cache.invalidate_results(recipe_matrix.version)
+
+llm = get_llm()
 
 # Работа с памятью для каждого пользователя отдельно
-user_memories = {}
+memory_manager = ConversationMemoryManager(
+    MEMORY_DIR,
+    max_users=MEMORY_MAX_USERS,
+    max_history_tokens=MEMORY_MAX_TOKENS,
+    idle_seconds=MEMORY_IDLE_SECONDS,
+)
 
-def get_user_memory(user_id):
-    if user_id not in user_memories:
-        user_memories[user_id] = ConversationBufferMemory(memory_key="history")
-    return user_memories[user_id]
+# Вызов LLM по шаблону; при on_token ответ стримится по кусочкам
+def run_chain(prompt, inputs, on_token=None, model=None):
+    model = model or llm
+    prompt_text = prompt.format(**inputs)
+    with stage("llm", prompt_chars=len(prompt_text), prompt_tokens=estimate_tokens(prompt_text),
+               streaming=on_token is not None) as info:
+        if on_token is None:
+            chain = LLMChain(llm=model, prompt=prompt)
+            response = chain.run(inputs)
+        else:
+            parts = []
+            for chunk in (prompt | model).stream(inputs):
+                text = getattr(chunk, "content", chunk)
+                if text:
+                    parts.append(text)
+                    on_token(text)
+            response = "".join(parts)
+        info["output_chars"] = len(response)
+        info["completion_tokens"] = estimate_tokens(response)
+    return response
 
 # Шаг 1: Генерация описаний приемов пищи
 def generate_meal_descriptions(user_info, new_prompt=""):
@@ -80,41 +118,89 @@ def generate_meal_descriptions(user_info, new_prompt=""):
     prompt = PromptTemplate(template=template, input_variables=[
         "history", "about_user", "forbidden_products", "favorite_products", "cooking_preferences",
         "new_prompt", "curr_plan_state", "day"])
-    memory = get_user_memory(user_info['user_id'])
-    chain = LLMChain(llm=llm, prompt=prompt)
+    user_id = user_info['user_id']
     
-    response = chain.run({
+    response = run_chain(prompt, {
         "about_user": user_info['about_user'],
         "forbidden_products": user_info['forbidden_products'],
         "favorite_products": user_info['favorite_products'],
         "cooking_preferences": user_info['cooking_preferences'],
         "new_prompt": new_prompt,
-        "history": memory.load_memory_variables({})["history"],
+        "history": memory_manager.get_history(user_id),
     })
     if new_prompt:
-        memory.save_context({"input": new_prompt}, {"output": response})
+        memory_manager.save_context(user_id, new_prompt, response)
     else:
-        memory.save_context({"input":
-        f"{user_info['about_user']}, {user_info['forbidden_products']}, {user_info['favorite_products']}, {user_info['cooking_preferences']}"},
-                            {"output": response})
+        memory_manager.save_context(user_id,
+        f"{user_info['about_user']}, {user_info['forbidden_products']}, {user_info['favorite_products']}, {user_info['cooking_preferences']}",
+                                    response)
     
     return response
 
 # Шаг 2: Поиск рецептов
-def find_recipes(query):
-    query = query[:512]
-    results = vectorstore.similarity_search_with_score(query)
-
-    top_results = results[:1]
-
-    top_texts = [doc.page_content for doc, score in top_results]
-
-    result_string = "; ".join(top_texts)
-    return result_string
+def find_recipes_batch(queries, k=1, mask=None):
+    # Все запросы эмбеддим одним вызовом и ищем одним матричным проходом; mask отсекает неподходящие рецепты
+    queries = [query[:512] for query in queries]
+    if not queries:
+        return []
+
+    cached = [query_cache.get(query, recipe_matrix.version) for query in queries]
+    vectors = [vector for vector, _ in cached]
+    candidates = [None if recipe_ids is None else
+                  [recipe_matrix.positions[recipe_id] for recipe_id in recipe_ids
+                   if recipe_id in recipe_matrix.positions]
+                  for _, recipe_ids in cached]
+
+    # Эмбеддим только те запросы, которых нет в кэше
+    to_embed = [i for i, vector in enumerate(vectors) if vector is None]
+    if to_embed:
+        with stage("embed", texts=len(to_embed)):
+            embedded = embeddings.embed_documents([queries[i] for i in to_embed])
+        for i, vector in zip(to_embed, embedded):
+            vectors[i] = vector
+
+    to_rank = [i for i, ranked in enumerate(candidates) if ranked is None]
+    if to_rank:
+        ranked = recipe_matrix.rank([vectors[i] for i in to_rank], max(RETRIEVAL_CANDIDATES, k))
+        for i, indices in zip(to_rank, ranked):
+            candidates[i] = indices
+
+    for i in set(to_embed) | set(to_rank):
+        query_cache.put(queries[i], vectors[i], [recipe_matrix.ids[index] for index in candidates[i]],
+                        recipe_matrix.version)
+
+    # Кандидаты в кэше не зависят от фильтров, поэтому фильтруем их здесь,
+    # а если подходящих не осталось — ищем заново только среди разрешенных рецептов
+    if mask is not None:
+        candidates = [[index for index in indices if mask[index]] for indices in candidates]
+        to_rerank = [i for i, indices in enumerate(candidates) if len(indices) < k]
+        if to_rerank:
+            reranked = recipe_matrix.rank([vectors[i] for i in to_rerank], max(RETRIEVAL_CANDIDATES, k), mask=mask)
+            for i, indices in zip(to_rerank, reranked):
+                candidates[i] = indices
+
+    results = recipe_matrix.pick(candidates, k=k)
+
+    return ["; ".join(recipe_matrix.documents[index] for index in indices) for indices in results]
+
+
+# Маска по строкам индекса: числовые фильтры (время готовки, калории) и исключенные рецепты.
+# Числовые фильтры — мягкие и снимаются, если под них ничего не подходит; исключение запрещенных
+# продуктов — жесткое: лучше предложить меньше рецептов, чем рецепт с запрещенным продуктом
+def recipe_filter_mask(exclude_urls=None, **filters):
+    allowed = np.ones(len(recipe_matrix.urls), dtype=bool)
+    if exclude_urls:
+        allowed = np.array([url not in exclude_urls for url in recipe_matrix.urls], dtype=bool)
+    mask = recipe_table.align(recipe_table.filter(**filters), recipe_matrix.urls) & allowed
+    if mask.any():
+        return mask
+    logging.warning(f"Фильтры {filters} отсекают все разрешенные рецепты, ищем без них.")
+    if not allowed.any():
+        logging.warning("Запрещенные продукты исключают все рецепты, план составим без готовых рецептов.")
+    return allowed if exclude_urls else None
 
 # Шаг 3: Генерация итогового плана
-def generate_final_plan(recipes, user_info, days, current_state=""):
-    template = """
+PLAN_CONDITIONS = """
     Ты — профессиональный помощник по планированию питания. Составь итоговый план питания на дни {days}, строго соответствуя следующим условиям.
     ### Условия:
     1. **Используй только новые блюда:** *Не используй блюда, которые уже были включены в предыдущие дни*:  
@@ -126,15 +212,28 @@ def generate_final_plan(recipes, user_info, days, current_state=""):
     - Используй предложенные готовые рецепты, если они подходят:  
     {recipes}  
     - Если готовые рецепты не подходят, предложи свои варианты.  
+    {changes}
+"""
 
-    4. **Формат ответа:**  
+# Дописывается к условиям, когда правим уже составленный блок, а не строим его заново
+PLAN_EDIT_CHANGES = """
+    ### Правка плана:
+    Это изменение уже составленного плана на эти дни:  
+    {current_plan}  
+
+    Измени его по запросу пользователя: {request}  
+    {scope}  
+    В ответе приведи весь план на эти дни целиком.  
+"""
+
+PLAN_MARKDOWN_FORMAT = """    4. **Формат ответа:**  
     - Весь план на указанные дни описывается одним блоком (без разделения на отдельные дни).  
     - Список дней оформляется как заголовок.  
     - Каждый прием пищи оформляется как подзаголовок.  
     - Для каждого блюда укажи:  
         - Название блюда.  
         - Краткое описание рецепта (2-3 предложения).  
-        - Ингредиенты с указанием количества.  
+        - Ингредиенты с количеством на одну порцию одной строкой, как в примере: Ингредиенты: ["Продукт - количество", ...]  
         - Калорийность и разбивку по БЖУ (белки, жиры, углеводы).  
 
     ### Пример ответа:
@@ -158,18 +257,50 @@ def generate_final_plan(recipes, user_info, days, current_state=""):
     Калории: 320, Белки: 30 г, Жиры: 18 г, Углеводы: 5 г  
 
     План на {days} готов.
-    """
+"""
 
-    prompt = PromptTemplate(template=template, input_variables=["recipes", "cooking_preferences", "current_state", "days"])
-    chain = LLMChain(llm=llm, prompt=prompt)
+PLAN_JSON_FORMAT = """
+    4. **Формат ответа:**  
+    - Ответ — только JSON без пояснений и без Markdown.  
+    - Весь план на указанные дни описывается одним блоком (без разделения на отдельные дни): каждый прием пищи — один элемент списка "meals".  
+    - Для каждого блюда укажи название, краткое описание рецепта (2-3 предложения), ингредиенты с количеством на одну порцию, калорийность и БЖУ в граммах.  
+
+    ### Пример ответа:
+    {{"meals": [
+      {{"meal": "Завтрак", "dish": "Овсянка с бананом и орехами",
+       "description": "Смешать овсянку с молоком, нарезать банан, добавить мед и орехи. Разогреть в микроволновке 2 минуты.",
+       "ingredients": [{{"name": "Овсянка", "amount": 100, "unit": "г"}}, {{"name": "Молоко", "amount": 200, "unit": "мл"}},
+                       {{"name": "Банан", "amount": 1, "unit": "шт"}}, {{"name": "Мед", "amount": 1, "unit": "ч.л."}}],
+       "calories": 370, "proteins": 12, "fats": 9, "carbs": 60}},
+      {{"meal": "Обед", "dish": "Куриное филе с киноа и овощами",
+       "description": "Отварить киноа, обжарить куриное филе, приготовить овощи на пару. Смешать все в тарелке.",
+       "ingredients": [{{"name": "Куриное филе", "amount": 200, "unit": "г"}}, {{"name": "Киноа", "amount": 100, "unit": "г"}},
+                       {{"name": "Брокколи", "amount": 150, "unit": "г"}}],
+       "calories": 450, "proteins": 35, "fats": 10, "carbs": 50}},
+      {{"meal": "Ужин", "dish": "Салат с тунцом и яйцом",
+       "description": "Смешать салатные листья, тунец, вареные яйца, заправить оливковым маслом и лимонным соком.",
+       "ingredients": [{{"name": "Тунец консервированный", "amount": 150, "unit": "г"}}, {{"name": "Яйца", "amount": 2, "unit": "шт"}},
+                       {{"name": "Оливковое масло", "amount": 1, "unit": "ст.л."}}],
+       "calories": 320, "proteins": 30, "fats": 18, "carbs": 5}}
+    ]}}
+"""
+
+
+def generate_final_plan(recipes, user_info, days, current_state="", on_token=None, output_format="markdown", changes=""):
+    # Ответ в "json" надежнее разбирается в структуру плана; в превью он показывается через preview_block_json
+    template = PLAN_CONDITIONS + (PLAN_JSON_FORMAT if output_format == "json" else PLAN_MARKDOWN_FORMAT)
+
+    prompt = PromptTemplate(template=template, input_variables=["recipes", "cooking_preferences", "current_state", "days",
+                                                                "changes"])
     
-    response = chain.run({"recipes": recipes, "cooking_preferences": user_info['cooking_preferences'],
-                          "current_state": current_state, "days": ", ".join(days)})
+    response = run_chain(prompt, {"recipes": recipes, "cooking_preferences": user_info['cooking_preferences'],
+                                  "current_state": current_state, "days": ", ".join(days), "changes": changes},
+                         on_token=on_token)
     
     return response
 
 # Шаг 4: Генерация графика закупок и готовки
-def generate_shopping_schedule(user_info, meal_plan, days, current_state=""):
+def generate_shopping_schedule(user_info, meal_plan, days, current_state="", on_token=None):
     template = """
     Ты — профессиональный помощник по планированию питания. Составь график закупок и готовки на дни {days}, строго следуя этим условиям.
 
@@ -207,10 +338,9 @@ def generate_shopping_schedule(user_info, meal_plan, days, current_state=""):
     
     prompt = PromptTemplate(template=template, input_variables=["meal_plan", "cooking_preferences", "coocking_plan_format",
                                                                 "days", "current_state"])
-    chain = LLMChain(llm=llm, prompt=prompt)
     
-    response = chain.run({"meal_plan": meal_plan, "cooking_preferences": user_info['cooking_preferences'],
-                      "current_state": current_state, "days": ", ".join(days)})
+    response = run_chain(prompt, {"meal_plan": meal_plan, "cooking_preferences": user_info['cooking_preferences'],
+                                  "current_state": current_state, "days": ", ".join(days)}, on_token=on_token)
 
     
     return response
@@ -230,8 +360,7 @@ def analyze_cooking_preferences_with_llm(cooking_preferences, llm):
     """
     
     prompt = PromptTemplate(template=template, input_variables=["cooking_preferences"])
-    chain = LLMChain(llm=llm, prompt=prompt)
-    response = chain.run({"cooking_preferences": cooking_preferences})
+    response = run_chain(prompt, {"cooking_preferences": cooking_preferences}, model=llm)
 
     # Парсим ответ LLM
     match = re.search(r"Дни готовки: (\d+); Время готовки: (\d+) минут", response)
@@ -239,37 +368,158 @@ def analyze_cooking_preferences_with_llm(cooking_preferences, llm):
     max_cooking_time = int(match.group(2)) if match else 120  # Значение по умолчанию
     return cooking_days, max_cooking_time
 
-def create_meal_and_coocking_plan(id, user_info, prompt=""):
-    days = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+
+# Разбор предпочтений в готовке в том виде, в котором он хранится в профиле
+def analyze_cooking_preferences(cooking_preferences):
+    with stage("cooking_analysis"):
+        cooking_days, max_cooking_time = analyze_cooking_preferences_with_llm(cooking_preferences, llm)
+    return {
+        "source_hash": cooking_preferences_hash(cooking_preferences),
+        "cooking_days": cooking_days,
+        "max_cooking_time": max_cooking_time,
+    }
+
+
+def get_cooking_analysis(user_info):
+    # Если разбор в профиле актуален, LLM не вызываем
+    if not is_cooking_analysis_fresh(user_info):
+        user_info['cooking_analysis'] = analyze_cooking_preferences(user_info["cooking_preferences"])
+    analysis = user_info['cooking_analysis']
+    return analysis['cooking_days'], analysis['max_cooking_time']
+
+def generate_block_shopping(user_info, block, on_token=None):
+    with stage("block_shopping", days=len(block["days"])) as info:
+        # Список покупок считаем по ингредиентам плана; LLM — только если их не удалось разобрать
+        info["local"] = SHOPPING_MODE == "local" and has_ingredients(block)
+        if not info["local"]:
+            if SHOPPING_MODE == "local":
+                logging.warning(f"Не удалось разобрать ингредиенты блока {block['days']}, список покупок составит LLM.")
+            block["shopping_text"] = generate_shopping_schedule(user_info, render_block(block), days=block["days"],
+                                                                on_token=on_token)
+        return render_shopping(block)
+
+
+def create_meal_and_coocking_plan(id, user_info, prompt="", progress=None):
+    """Build the weekly meal plan in the structured form of `utils.plan_model`.
+
+    `progress`, if given, receives `on_token(block_index, text)` for every
+    streamed chunk and `on_block_done(block_index, block_plan, block_shopping)`
+    with the rendered Markdown when a block is ready. Both are called from
+    worker threads.
+    """
     user_info['user_id'] = id
 
     # Анализируем предпочтения пользователя
-    cooking_days, max_cooking_time = analyze_cooking_preferences_with_llm(user_info["cooking_preferences"], llm)
-    cooking_block_size = 7 // cooking_days  # Размер блока в днях
-
-    meals_description = generate_meal_descriptions(user_info=user_info, new_prompt=prompt)
-    recipes_descr = list(meals_description.split("\n"))
+    cooking_days, max_cooking_time = get_cooking_analysis(user_info)
 
-    recipes = "\n".join([find_recipes(descr + f"Готовить не более {max_cooking_time} минут") for descr in recipes_descr])
+    with stage("meal_descriptions"):
+        meals_description = generate_meal_descriptions(user_info=user_info, new_prompt=prompt)
+    recipes_descr = [descr.strip() for descr in meals_description.split("\n") if descr.strip()]
 
-    final_plan = []
-    shopping_schedule = []
+    # Ограничение по времени и запрещенные продукты применяем фильтром, а не только текстом запроса
+    with stage("recipe_search", queries=len(recipes_descr)):
+        forbidden_urls = ingredient_index.excluded_recipes(user_info['forbidden_products'])
+        recipe_mask = recipe_filter_mask(exclude_urls=forbidden_urls, max_minutes=max_cooking_time)
+        recipes = find_recipes_batch([f"{descr} Готовить не более {max_cooking_time} минут"
+                                      for descr in recipes_descr], mask=recipe_mask)
 
     # Разбиваем дни на блоки
-    for i in range(0, len(days) - (7 % cooking_days), cooking_block_size):
-        if i + cooking_block_size >= len(days) - (7 % cooking_days):
-            block_days = days[i:]
-        else:
-            block_days = days[i:i + cooking_block_size]
-            
-        block_plan = []
-        block_shopping = []
-
-        block_plan = generate_final_plan(recipes=recipes, user_info=user_info, days=block_days, current_state="\n".join(final_plan))
-
-        block_shopping = generate_shopping_schedule(user_info, block_plan, days=block_days, current_state="\n".join(shopping_schedule))
-
-        final_plan.append(block_plan)
-        shopping_schedule.append(block_shopping)
+    blocks = split_days_into_blocks(cooking_days)
+    block_indices = {tuple(block_days): i for i, block_days in enumerate(blocks)}
+
+    def token_callback(block_days):
+        if progress is None:
+            return None
+        block_index = block_indices[tuple(block_days)]
+        return lambda text: progress.on_token(block_index, text)
+
+    def generate_plan(block_recipes, block_days, previous_blocks):
+        with stage("block_plan", days=len(block_days)) as info:
+            text = generate_final_plan(recipes=block_recipes, user_info=user_info, days=block_days,
+                                       current_state=summarize_blocks(previous_blocks),
+                                       on_token=token_callback(block_days),
+                                       output_format=PLAN_FORMAT)
+            block = parse_block(text, block_days)
+            info["parsed"] = bool(block["meals"])
+            if not block["meals"]:
+                logging.warning(f"Не удалось разобрать план блока {block_days}, сохраняем его текстом.")
+            return block
+
+    def generate_shopping(block, block_days, previous_shopping):
+        return generate_block_shopping(user_info, block, on_token=token_callback(block_days))
+
+    def on_block_done(i, block, block_shopping):
+        progress.on_block_done(i, render_block(block), block_shopping)
+
+    with stage("blocks", blocks=len(blocks), mode=PLAN_BLOCK_MODE):
+        generate_blocks = generate_blocks_sequential if PLAN_BLOCK_MODE == "sequential" else generate_blocks_parallel
+        plan_blocks, _ = generate_blocks(blocks, recipes, generate_plan, generate_shopping,
+                                         on_block_done if progress is not None else None)
+    return new_plan(plan_blocks)
+
+
+def edit_meal_plan(id, user_info, plan, prompt, progress=None):
+    """Apply an edit request to a stored plan, regenerating only the blocks it touches.
+
+    Returns `(plan, changed_block_indices)`. Untouched blocks, their shopping
+    lists and their reminders stay as they are. Requests that cannot be
+    pinned to days, meals or dishes rebuild the plan with
+    `create_meal_and_coocking_plan`. `progress` gets the changed blocks
+    numbered from zero, in plan order.
+    """
+    user_info['user_id'] = id
 
-    return final_plan, shopping_schedule
+    target = find_edit_target(plan, prompt)
+    if target is None:
+        logging.info(f"Правку \"{prompt}\" не удалось отнести к дням или блюдам, план строится заново.")
+        plan = create_meal_and_coocking_plan(id, user_info, prompt=prompt, progress=progress)
+        return plan, list(range(len(plan["blocks"])))
+    block_indices, meals = target
+
+    # Разбор предпочтений берется из профиля, рецепты ищем одним запросом по тексту правки
+    _, max_cooking_time = get_cooking_analysis(user_info)
+    with stage("recipe_search", queries=1):
+        forbidden_urls = ingredient_index.excluded_recipes(user_info['forbidden_products'])
+        recipe_mask = recipe_filter_mask(exclude_urls=forbidden_urls, max_minutes=max_cooking_time)
+        recipes = find_recipes_batch([f"{prompt} Готовить не более {max_cooking_time} минут"], mask=recipe_mask)
+
+    blocks = [plan["blocks"][i]["days"] for i in block_indices]
+    positions = {tuple(plan["blocks"][i]["days"]): (position, i) for position, i in enumerate(block_indices)}
+    scope = (f"Измени только эти приемы пищи: {', '.join(sorted(meals))}. Остальные приемы пищи оставь без изменений."
+             if meals else "Блюда, которых запрос не касается, оставь без изменений.")
+
+    def token_callback(block_days):
+        if progress is None:
+            return None
+        position = positions[tuple(block_days)][0]
+        return lambda text: progress.on_token(position, text)
+
+    def generate_plan(block_recipes, block_days, previous_blocks):
+        old_block = plan["blocks"][positions[tuple(block_days)][1]]
+        # Чтобы не повторять блюда, показываем модели остальные блоки плана
+        other_blocks = [block for block in plan["blocks"] if block is not old_block]
+        changes = PLAN_EDIT_CHANGES.format(current_plan=render_block(old_block), request=prompt, scope=scope)
+        with stage("block_plan", days=len(block_days), edit=True) as info:
+            text = generate_final_plan(recipes=block_recipes, user_info=user_info, days=block_days,
+                                       current_state=summarize_blocks(other_blocks),
+                                       on_token=token_callback(block_days),
+                                       output_format=PLAN_FORMAT, changes=changes)
+            block = merge_edited_block(old_block, parse_block(text, block_days), meals)
+            info["parsed"] = bool(block["meals"])
+            return block
+
+    def generate_shopping(block, block_days, previous_shopping):
+        return generate_block_shopping(user_info, block, on_token=token_callback(block_days))
+
+    def on_block_done(position, block, block_shopping):
+        progress.on_block_done(position, render_block(block), block_shopping)
+
+    with stage("blocks", blocks=len(blocks), mode="edit"):
+        edited, _ = generate_blocks_parallel(blocks, recipes, generate_plan, generate_shopping,
+                                             on_block_done if progress is not None else None)
+
+    new_blocks = list(plan["blocks"])
+    for i, block in zip(block_indices, edited):
+        new_blocks[i] = block
+    memory_manager.save_context(id, prompt, summarize_blocks(edited))
+    return new_plan(new_blocks), block_indices
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from utils.config import SCRAPER_CONCURRENCY, SCRAPER_RATE, SCRAPER_CHECKPOINT
+from utils.parse_recipies import (EDA_BASE_URL, CATEGORY_PATHS, get_headers, extract_recipe_links,
+                                  extract_recipe_details)
+from utils.rate_limit import TokenBucket
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# fetch() возвращает это значение для страниц, которых нет на сайте (404): повторять запрос бессмысленно
+NOT_FOUND = object()
+
+
+class ScrapeCheckpoint:
+    """Append-only progress log of a scrape.
+
+    Every fetched category page and recipe page is written as one JSON line,
+    so after a crash the scraper replays the log and continues where it
+    stopped. A torn last line is ignored. The log is only for resuming: a
+    complete run clears it, so the next run fetches everything again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.category_pages = {}  # категория -> последняя обработанная страница
+        self.finished_categories = set()
+        self.links = []
+        self.recipes = {}  # url -> рецепт или None, если страницу не удалось разобрать
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        seen_links = set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event["type"] == "page":
+                    self.category_pages[event["category"]] = event["page"]
+                    for link in event["links"]:
+                        if link not in seen_links:
+                            seen_links.add(link)
+                            self.links.append(link)
+                elif event["type"] == "category_done":
+                    self.finished_categories.add(event["category"])
+                elif event["type"] == "recipe":
+                    self.recipes[event["url"]] = event["recipe"]
+
+    def _append(self, event):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save_page(self, category, page, links):
+        self.category_pages[category] = page
+        known = set(self.links)
+        self.links.extend(link for link in links if link not in known)
+        self._append({"type": "page", "category": category, "page": page, "links": links})
+
+    def finish_category(self, category):
+        self.finished_categories.add(category)
+        self._append({"type": "category_done", "category": category})
+
+    def save_recipe(self, url, recipe):
+        self.recipes[url] = recipe
+        self._append({"type": "recipe", "url": url, "recipe": recipe})
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.category_pages = {}
+        self.finished_categories = set()
+        self.links = []
+        self.recipes = {}
+
+
+class RecipeScraper:
+    """Concurrent eda.ru scraper.
+
+    All requests share one keep-alive session; each host has its own token
+    bucket limiting requests per second, and at most `concurrency` requests
+    are in flight. `base_url` can point to a local server with saved pages.
+    Parsed recipes are appended to `store` as soon as they arrive.
+    """
+
+    def __init__(self, base_url=EDA_BASE_URL, category_paths=CATEGORY_PATHS, concurrency=SCRAPER_CONCURRENCY,
+                 rate=SCRAPER_RATE, checkpoint_path=SCRAPER_CHECKPOINT, max_links=150, max_retries=3,
+                 timeout=10, store=None):
+        self.base_url = base_url.rstrip("/")
+        self.category_urls = [self.base_url + path for path in category_paths]
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_links = max_links
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.checkpoint = ScrapeCheckpoint(checkpoint_path)
+        self.store = store
+
+        self._buckets = {}
+        self._semaphore = None
+        self._session = None
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        async with aiohttp.ClientSession(connector=connector, headers=get_headers(),
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            self._session = session
+            links = await self.parse_recipe_links()
+            await self.parse_recipe_details(links)
+        self._session = None
+
+        recipes = [self.checkpoint.recipes[link] for link in links if self.checkpoint.recipes.get(link)]
+        if self.is_complete(links):
+            self.checkpoint.clear()
+        else:
+            logging.info(f"Загрузка не завершена, продолжим с контрольной точки {self.checkpoint.path}.")
+        return recipes
+
+    def is_complete(self, links):
+        # Все категории пройдены и по каждой ссылке есть ответ (рецепт, пустая страница или 404)
+        return (set(self.category_urls) <= self.checkpoint.finished_categories
+                and all(link in self.checkpoint.recipes or (self.store is not None and link in self.store)
+                        for link in links))
+
+    def _bucket(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, capacity=max(1, int(self.rate)))
+        return self._buckets[host]
+
+    async def fetch(self, url):
+        bucket = self._bucket(url)
+        for attempt in range(self.max_retries):
+            await bucket.acquire()
+            try:
+                async with self._semaphore:
+                    async with self._session.get(url) as response:
+                        if response.status == 404:
+                            return NOT_FOUND
+                        if response.status in RETRY_STATUSES:
+                            retry_after = response.headers.get("Retry-After")
+                            if retry_after and retry_after.isdigit():
+                                bucket.pause(int(retry_after))
+                            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                              status=response.status)
+                        response.raise_for_status()
+                        return await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries - 1:
+                    logging.warning(f"Не удалось загрузить {url}: {e!r}")
+                    return None
+                await asyncio.sleep(random.uniform(1, 2) * 2 ** attempt)
+        return None
+
+    async def parse_recipe_links(self):
+        await asyncio.gather(*(self._parse_category(category_url) for category_url in self.category_urls))
+        return list(self.checkpoint.links)
+
+    async def _parse_category(self, category_url):
+        if category_url in self.checkpoint.finished_categories:
+            return
+
+        page = self.checkpoint.category_pages.get(category_url, 0) + 1
+        while len(self.checkpoint.links) <= self.max_links:
+            html = await self.fetch(f"{category_url}?page={page}")
+            if html is None:
+                return  # Категорию не закрываем, при следующем запуске продолжим с этой страницы
+            if html is NOT_FOUND:
+                break
+            links = extract_recipe_links(html, self.base_url)
+            if not links:
+                break
+            self.checkpoint.save_page(category_url, page, links)
+            page += 1
+
+        self.checkpoint.finish_category(category_url)
+
+    async def parse_recipe_details(self, links):
+        pending = [link for link in links if link not in self.checkpoint.recipes
+                   and (self.store is None or link not in self.store)]
+        logging.info(f"Рецептов к загрузке: {len(pending)} из {len(links)}.")
+        await asyncio.gather(*(self._parse_recipe(link) for link in pending))
+
+    async def _parse_recipe(self, link):
+        html = await self.fetch(link)
+        if html is None:
+            return  # Не сохраняем: при следующем запуске попробуем еще раз
+        if html is NOT_FOUND:
+            self.checkpoint.save_recipe(link, None)
+            return
+        recipe = await asyncio.to_thread(extract_recipe_details, html, link)
+        if recipe and self.store is not None:
+            self.store.append(recipe)
+        self.checkpoint.save_recipe(link, recipe)
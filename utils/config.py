@@ -1,6 +1,93 @@
-import os
-
-bot_token = os.getenv("bot_token")
-CSV_FILE = 'users_data.csv'
-PROFILE_DIR = 'profiles'
-STORAGE_DIR = 'storage'
\ No newline at end of file
+import os
+
+bot_token = os.getenv("bot_token")
+# Режим работы: "polling" или "webhook". Для вебхука WEBHOOK_HOST — публичный адрес (https://...);
+# если он не задан, вебхук в Telegram не регистрируется и апдейты можно присылать на сервер вручную
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", 8080))
+# /metrics в формате Prometheus; в режиме polling /health и /metrics слушают WEBAPP_HOST:WEBAPP_PORT
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Свой сервер Bot API (например, локальный telegram-bot-api); по умолчанию api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+# Загружать AI-модуль (LLM, индекс рецептов) в фоне сразу после старта; иначе — при первом запросе плана
+AI_WARMUP = os.getenv("AI_WARMUP", "1") == "1"
+CSV_FILE = 'users_data.csv'
+PROFILE_DIR = 'profiles'
+STORAGE_DIR = 'storage'
+
+# Персистентный индекс рецептов (Chroma)
+CHROMA_DIR = os.getenv("CHROMA_DIR", os.path.join('data', 'chroma'))
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", 'recipes')
+
+# Генерация планов: сколько планов строим одновременно и сколько ждут в очереди
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", 2))
+PLAN_QUEUE_SIZE = int(os.getenv("PLAN_QUEUE_SIZE", 20))
+# Потоки для фоновых вызовов LLM (разбор предпочтений), отдельно от воркеров генерации планов
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 1))
+# Сколько секунд при остановке ждем уже начатые генерации
+PLAN_DRAIN_TIMEOUT = float(os.getenv("PLAN_DRAIN_TIMEOUT", 120))
+# Сколько секунд при остановке ждем отправки сообщений, оставшихся в очереди
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", 30))
+
+# Как генерировать блоки дней: "parallel" — одновременно, "sequential" — по очереди
+PLAN_BLOCK_MODE = os.getenv("PLAN_BLOCK_MODE", "parallel")
+# Список покупок: "local" — суммируем ингредиенты плана (LLM только если их не разобрать), "llm" — как раньше
+SHOPPING_MODE = os.getenv("SHOPPING_MODE", "local")
+# Формат ответа модели для блока плана: "json" — структура (блоки -> приемы пищи -> блюда, ингредиенты, БЖУ),
+# "markdown" — текст по образцу; оба стримятся в превью и разбираются в одну и ту же структуру
+PLAN_FORMAT = os.getenv("PLAN_FORMAT", "json")
+
+# Кэш эмбеддингов запросов и результатов поиска рецептов
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", os.path.join(STORAGE_DIR, 'query_cache.sqlite'))
+QUERY_CACHE_MEMORY_SIZE = int(os.getenv("QUERY_CACHE_MEMORY_SIZE", 1000))
+QUERY_CACHE_DISK_SIZE = int(os.getenv("QUERY_CACHE_DISK_SIZE", 50000))
+# Сколько ближайших рецептов запоминаем для каждого запроса
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 20))
+
+# История диалогов с LLM: сколько пользователей держим в памяти и размер истории в токенах
+MEMORY_DIR = os.getenv("MEMORY_DIR", os.path.join(STORAGE_DIR, 'memory'))
+MEMORY_MAX_USERS = int(os.getenv("MEMORY_MAX_USERS", 500))
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", 1500))
+MEMORY_IDLE_SECONDS = int(os.getenv("MEMORY_IDLE_SECONDS", 3600))
+
+# Реестр пользователей (SQLite) и старый CSV, из которого он переносится при первом запуске
+USERS_DB = os.getenv("USERS_DB", os.path.join(STORAGE_DIR, 'users.sqlite'))
+LEGACY_USERS_CSV = os.path.join(STORAGE_DIR, 'user_data.csv')
+
+# Парсер рецептов: одновременные запросы, запросов в секунду на хост и файл с прогрессом
+SCRAPER_CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", 8))
+SCRAPER_RATE = float(os.getenv("SCRAPER_RATE", 2))
+SCRAPER_CHECKPOINT = os.getenv("SCRAPER_CHECKPOINT", os.path.join('data', 'scrape_checkpoint.jsonl'))
+# Бэкенд разбора HTML: "auto", "bs4", "lxml" или "selectolax"
+HTML_BACKEND = os.getenv("HTML_BACKEND", "auto")
+
+# Хранилище рецептов (JSONL + индекс смещений) и старый файл, из которого оно заполняется
+RECIPES_STORE = os.getenv("RECIPES_STORE", os.path.join('data', 'recipes.jsonl'))
+LEGACY_RECIPES_JSON = os.path.join('data', 'recipes_data.json')
+
+# Как часто (в секундах) обновлять сообщение с прогрессом генерации
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.5))
+
+# Хранилище состояний FSM: "memory", "sqlite" или "redis"; незавершенные формы живут FSM_STATE_TTL секунд
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", os.path.join(STORAGE_DIR, 'fsm.sqlite'))
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", 24 * 60 * 60))
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+
+# Хранилище задач напоминаний (переживает перезапуск бота)
+REMINDERS_DB = os.getenv("REMINDERS_DB", os.path.join(STORAGE_DIR, 'reminders.sqlite'))
+
+# Лимиты исходящих сообщений (сообщений в секунду): общий на бота и на один чат
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", 25))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", 1))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", 3))
+
+# Сколько профилей пользователей держим в памяти
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 1024))
@@ -0,0 +1,165 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.storage import BaseStorage
+
+from utils.config import (FSM_STORAGE, FSM_SQLITE_PATH, FSM_STATE_TTL, REDIS_HOST, REDIS_PORT, REDIS_DB,
+                          REDIS_PASSWORD)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage in an SQLite file shared by all bot processes.
+
+    Every write extends the record's lifetime by `ttl` seconds; expired
+    records (abandoned registrations, edits, surveys) read as empty and are
+    purged periodically.
+    """
+
+    def __init__(self, path, ttl=None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS fsm (
+                    chat TEXT NOT NULL,
+                    user TEXT NOT NULL,
+                    state TEXT,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    bucket TEXT NOT NULL DEFAULT '{}',
+                    expires_at REAL,
+                    PRIMARY KEY (chat, user)
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS fsm_expires_at ON fsm (expires_at)")
+
+    async def close(self):
+        with self._lock:
+            self._db.close()
+
+    async def wait_closed(self):
+        pass
+
+    def _read(self, chat, user):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, data, bucket FROM fsm WHERE chat = ? AND user = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (chat, user, time.time()),
+            ).fetchone()
+        if row is None:
+            return {"state": None, "data": {}, "bucket": {}}
+        return {"state": row[0], "data": json.loads(row[1]), "bucket": json.loads(row[2])}
+
+    def _write(self, chat, user, record):
+        chat, user = map(str, self.check_address(chat=chat, user=user))
+        with self._lock, self._db:
+            if record == {"state": None, "data": {}, "bucket": {}}:
+                self._db.execute("DELETE FROM fsm WHERE chat = ? AND user = ?", (chat, user))
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO fsm (chat, user, state, data, bucket, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (chat, user, record["state"], json.dumps(record["data"], ensure_ascii=False),
+                     json.dumps(record["bucket"], ensure_ascii=False),
+                     time.time() + self.ttl if self.ttl else None),
+                )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._db.execute("DELETE FROM fsm WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        state = self._read(chat, user)["state"]
+        return state if state is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        data = self._read(chat, user)["data"]
+        return data if data or default is None else copy.deepcopy(default)
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        record = self._read(chat, user)
+        record["state"] = self.resolve_state(state)
+        self._write(chat, user, record)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        record = self._read(chat, user)
+        record["data"] = copy.deepcopy(data) if data else {}
+        self._write(chat, user, record)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        record = self._read(chat, user)
+        record["data"].update(data or {}, **kwargs)
+        self._write(chat, user, record)
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        record = self._read(chat, user)
+        record["state"] = None
+        if with_data:
+            record["data"] = {}
+        self._write(chat, user, record)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        bucket = self._read(chat, user)["bucket"]
+        return bucket if bucket or default is None else copy.deepcopy(default)
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        record = self._read(chat, user)
+        record["bucket"] = copy.deepcopy(bucket) if bucket else {}
+        self._write(chat, user, record)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        record = self._read(chat, user)
+        record["bucket"].update(bucket or {}, **kwargs)
+        self._write(chat, user, record)
+
+
+def create_fsm_storage():
+    # "memory" — как раньше, "sqlite" — общий файл для процессов на одной машине, "redis" — для нескольких машин
+    if FSM_STORAGE == "sqlite":
+        return SQLiteStorage(FSM_SQLITE_PATH, ttl=FSM_STATE_TTL)
+    if FSM_STORAGE == "redis":
+        from aiogram.contrib.fsm_storage.redis import RedisStorage2
+
+        return RedisStorage2(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, password=REDIS_PASSWORD,
+                             state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL, bucket_ttl=FSM_STATE_TTL)
+    return MemoryStorage()
@@ -0,0 +1,98 @@
+import bisect
+import re
+from collections import defaultdict
+
+# Окончания, которые отрезаем, чтобы "яйца", "яйцо" и "яиц" сводились к одной основе
+ENDINGS = sorted([
+    "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ой", "ей", "ий", "ый", "ом", "ем", "ам", "ям", "ах", "ях", "ов", "ев",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+
+# Слова, которые встречаются в описании запретов, но сами продуктами не являются
+STOP_WORDS = {
+    "аллергия", "аллергии", "на", "не", "нет", "люблю", "ем", "без", "и", "или", "а", "также", "с", "в",
+    "продукты", "продукция", "продукции", "любые", "любой", "все", "нелюбимые", "кроме",
+}
+
+
+def stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def product_stems(name):
+    # "Куриное яйцо" -> {"курин", "яйц"}; скобки, проценты и кавычки отбрасываем
+    name = re.sub(r"\(.*?\)", " ", name.lower().replace("ё", "е"))
+    words = re.findall(r"[а-яa-z]+", name)
+    return {stem(word) for word in words if word not in STOP_WORDS and len(word) > 1}
+
+
+def parse_forbidden_products(text):
+    # Свободный текст профиля -> список наборов основ, по одному на продукт
+    items = re.split(r"[,;\n]|\s+и\s+|\s+или\s+", (text or "").lower())
+    return [stems for stems in (product_stems(item) for item in items) if stems]
+
+
+class IngredientIndex:
+    """Inverted index from normalized ingredient stems to recipe URLs.
+
+    Built from the `"Название: количество"` strings of `recipe['ingredients']`.
+    A multi-word product matches a recipe only if one ingredient contains all
+    of its stems. A stem also matches longer stems that start with it, so
+    "арахис" excludes "Арахисовая паста".
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(set)  # основа -> URL рецептов
+        self._ingredients = {}  # URL -> список наборов основ ингредиентов
+        self._sorted_stems = None
+
+    @classmethod
+    def from_recipes(cls, recipes):
+        index = cls()
+        for recipe in recipes:
+            if recipe is not None:
+                index.add(recipe['url'], recipe['ingredients'])
+        return index
+
+    def add(self, url, ingredients):
+        stems_list = []
+        for ingredient in ingredients:
+            stems = product_stems(ingredient.split(":", 1)[0])
+            stems_list.append(stems)
+            for item in stems:
+                self._postings[item].add(url)
+        self._ingredients[url] = stems_list
+        self._sorted_stems = None
+
+    def __len__(self):
+        return len(self._ingredients)
+
+    def _expand(self, item):
+        # Основа запрета и все более длинные основы с тем же началом: "арахис" -> "арахисов".
+        # Для фильтра запретов лишнее исключение безопаснее пропущенного; короткие основы сравниваем точно
+        if len(item) < 3:
+            return {item}
+        if self._sorted_stems is None:
+            self._sorted_stems = sorted(self._postings)
+        start = bisect.bisect_left(self._sorted_stems, item)
+        end = bisect.bisect_left(self._sorted_stems, item + "\uffff")
+        return set(self._sorted_stems[start:end])
+
+    def recipes_with(self, product_stems_set):
+        expanded = [self._expand(item) for item in product_stems_set]
+        candidates = set.intersection(*(set().union(*(self._postings.get(stem, set()) for stem in forms))
+                                        for forms in expanded))
+        if len(product_stems_set) == 1:
+            return candidates
+        return {url for url in candidates
+                if any(all(forms & stems for forms in expanded) for stems in self._ingredients[url])}
+
+    def excluded_recipes(self, forbidden_products):
+        excluded = set()
+        for product in parse_forbidden_products(forbidden_products):
+            excluded |= self.recipes_with(product)
+        return excluded
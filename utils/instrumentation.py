@@ -0,0 +1,54 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+_listeners = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def add_stage_listener(listener):
+    """Register `listener(name, seconds, info)` to be called after every stage.
+
+    `info` is the dict of fields passed to `stage()` plus whatever the stage
+    added while running. `info["parent"]` is the enclosing stage in the same
+    thread (or None) and `info["error"]` is set when the stage raised.
+    Registering the same listener again has no effect.
+    """
+    with _lock:
+        # Повторная регистрация (например, при импорте main и в бенчмарке) удвоила бы все замеры
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def remove_stage_listener(listener):
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+@contextmanager
+def stage(name, **fields):
+    # Замер этапа пайплайна; внутри блока в info можно дописать, например, размер ответа
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    info = dict(fields, parent=stack[-1] if stack else None)
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield info
+    except BaseException:
+        info["error"] = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        with _lock:
+            listeners = list(_listeners)
+        for listener in listeners:
+            try:
+                listener(name, elapsed, info)
+            except Exception:
+                logging.exception(f"Ошибка в обработчике замера этапа {name}")
@@ -0,0 +1,45 @@
+import os
+import threading
+
+_lock = threading.Lock()
+_llm = None
+_embeddings = None
+
+
+# Подмена моделей (например, фейками в бенчмарках); вызывать до первого обращения к utils.ai_tools
+def set_backends(llm=None, embeddings=None):
+    global _llm, _embeddings
+    with _lock:
+        if llm is not None:
+            _llm = llm
+        if embeddings is not None:
+            _embeddings = embeddings
+
+
+# GigaChat создаем при первом обращении, а не при импорте
+def get_llm():
+    global _llm
+    with _lock:
+        if _llm is None:
+            from langchain_community.chat_models.gigachat import GigaChat
+
+            _llm = GigaChat(
+                credentials=os.getenv("GIGACHAT_KEY"),
+                model='GigaChat:latest',
+                verify_ssl_certs=False,
+                temperature=0.3,
+                top_p=0.1,
+            )
+        return _llm
+
+
+def get_embeddings():
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            from langchain_gigachat.embeddings import GigaChatEmbeddings
+
+            _embeddings = GigaChatEmbeddings(
+                credentials=os.getenv("GIGACHAT_KEY"), scope="GIGACHAT_API_PERS", verify_ssl_certs=False
+            )
+        return _embeddings
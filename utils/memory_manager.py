@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_tokens(text):
+    # Грубая оценка: слово или знак препинания — один токен
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+class ConversationMemoryManager:
+    """Per-user conversation history with bounded size.
+
+    Each user's history is a list of `(input, output)` turns trimmed to a token
+    budget. Only `max_users` histories are kept in memory (LRU); histories of
+    users evicted from memory or idle for longer than `idle_seconds` are
+    written to `storage_dir` and loaded back on the next access.
+    """
+
+    def __init__(self, storage_dir, max_users=500, max_history_tokens=1500, idle_seconds=3600,
+                 count_tokens=estimate_tokens):
+        self.storage_dir = storage_dir
+        self.max_users = max_users
+        self.max_history_tokens = max_history_tokens
+        self.idle_seconds = idle_seconds
+        self.count_tokens = count_tokens
+        self.evicted = 0
+
+        self._users = OrderedDict()  # user_id -> {"turns": [...], "tokens": int, "last_used": float}
+        self._lock = threading.Lock()
+        os.makedirs(storage_dir, exist_ok=True)
+
+    def get_history(self, user_id):
+        with self._lock:
+            entry = self._touch(user_id)
+            return "\n".join(f"Human: {user_input}\nAI: {output}" for user_input, output in entry["turns"])
+
+    def save_context(self, user_id, user_input, output):
+        with self._lock:
+            entry = self._touch(user_id)
+            entry["turns"].append((user_input, output))
+            entry["tokens"] += self._turn_tokens(user_input, output)
+
+            # Оставляем последние ходы, которые помещаются в бюджет токенов
+            while len(entry["turns"]) > 1 and entry["tokens"] > self.max_history_tokens:
+                old_input, old_output = entry["turns"].pop(0)
+                entry["tokens"] -= self._turn_tokens(old_input, old_output)
+
+    def clear(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+            path = self._path(user_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle(time.time())
+
+    def flush(self):
+        # Сбрасываем все истории на диск (например, при остановке бота)
+        with self._lock:
+            for user_id in list(self._users):
+                self._evict(user_id)
+
+    def stats(self):
+        with self._lock:
+            tokens = [entry["tokens"] for entry in self._users.values()]
+            return {
+                "users_in_memory": len(self._users),
+                "users_on_disk": len([name for name in os.listdir(self.storage_dir) if name.endswith(".json")]),
+                "history_tokens_total": sum(tokens),
+                "history_tokens_max": max(tokens, default=0),
+                "history_chars_total": sum(len(user_input) + len(output) for entry in self._users.values()
+                                           for user_input, output in entry["turns"]),
+                "evicted": self.evicted,
+            }
+
+    def _touch(self, user_id):
+        now = time.time()
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._load(user_id)
+            self._users[user_id] = entry
+        entry["last_used"] = now
+        self._users.move_to_end(user_id)
+
+        self._evict_idle(now)
+        while len(self._users) > self.max_users:
+            self._evict(next(iter(self._users)))
+        return entry
+
+    def _evict_idle(self, now):
+        # Пользователи упорядочены по последнему обращению, поэтому смотрим только начало
+        while self._users:
+            user_id, entry = next(iter(self._users.items()))
+            if now - entry["last_used"] < self.idle_seconds:
+                break
+            self._evict(user_id)
+
+    def _evict(self, user_id):
+        entry = self._users.pop(user_id)
+        if entry["turns"]:
+            with open(self._path(user_id), 'w', encoding='utf-8') as f:
+                json.dump(entry["turns"], f, ensure_ascii=False)
+        self.evicted += 1
+
+    def _load(self, user_id):
+        turns = []
+        path = self._path(user_id)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    turns = [tuple(turn) for turn in json.load(f)]
+            except (OSError, ValueError):
+                logging.warning(f"Не удалось прочитать историю пользователя {user_id}, начинаем заново.")
+        return {
+            "turns": turns,
+            "tokens": sum(self._turn_tokens(user_input, output) for user_input, output in turns),
+            "last_used": time.time(),
+        }
+
+    def _turn_tokens(self, user_input, output):
+        return self.count_tokens(user_input) + self.count_tokens(output)
+
+    def _path(self, user_id):
+        return os.path.join(self.storage_dir, f"{user_id}.json")
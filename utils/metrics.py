@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels (`_bucket`, `_sum`, `_count`)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "eatme_stage_duration_seconds", "Wall time of plan pipeline stages.", ["stage"]))
+stage_calls = registry.register(Counter(
+    "eatme_stage_calls_total", "Plan pipeline stage runs.", ["stage"]))
+stage_errors = registry.register(Counter(
+    "eatme_stage_errors_total", "Plan pipeline stage runs that raised.", ["stage"]))
+llm_calls = registry.register(Counter(
+    "eatme_llm_calls_total", "LLM calls by the pipeline stage that made them.", ["stage"]))
+llm_prompt_tokens = registry.register(Counter(
+    "eatme_llm_prompt_tokens_total", "Estimated prompt tokens sent to the LLM.", ["stage"]))
+llm_completion_tokens = registry.register(Counter(
+    "eatme_llm_completion_tokens_total", "Estimated completion tokens received from the LLM.", ["stage"]))
+embedding_texts = registry.register(Counter(
+    "eatme_embedding_texts_total", "Texts sent to the embedding model.", ["stage"]))
+telegram_updates = registry.register(Counter(
+    "eatme_telegram_updates_total", "Telegram updates received.", ["type"]))
+telegram_handler_calls = registry.register(Counter(
+    "eatme_telegram_handler_calls_total", "Telegram handler invocations.", ["handler"]))
+telegram_handler_seconds = registry.register(Histogram(
+    "eatme_telegram_handler_duration_seconds", "Telegram handler wall time.", ["handler"]))
+telegram_errors = registry.register(Counter(
+    "eatme_telegram_errors_total", "Exceptions raised while processing updates.", ["type"]))
+
+
+# Обработчик для utils.instrumentation.add_stage_listener
+def observe_stage(name, seconds, info):
+    stage_seconds.observe(seconds, stage=name)
+    stage_calls.inc(stage=name)
+    if info.get("error"):
+        stage_errors.inc(stage=name)
+    parent = info.get("parent") or "none"
+    if name == "llm":
+        llm_calls.inc(stage=parent)
+        llm_prompt_tokens.inc(info.get("prompt_tokens", 0), stage=parent)
+        llm_completion_tokens.inc(info.get("completion_tokens", 0), stage=parent)
+    elif name == "embed":
+        embedding_texts.inc(info.get("texts", 0), stage=parent)
+
+
+async def metrics_handler(request):
+    return web.Response(body=registry.render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+class TelegramMetricsMiddleware(BaseMiddleware):
+    """Counts updates, handler calls, handler latency and processing errors."""
+
+    async def on_pre_process_update(self, update, data: dict):
+        kind = next((field for field in ("message", "callback_query", "edited_message", "inline_query")
+                     if getattr(update, field, None)), "other")
+        telegram_updates.inc(type=kind)
+
+    def _start(self, data):
+        # Вызывается после фильтров, поэтому известен обработчик, который будет выполнен
+        from aiogram.dispatcher.handler import current_handler
+
+        handler = current_handler.get(None)
+        data["_metrics_handler"] = getattr(handler, "__name__", "unknown")
+        data["_metrics_start"] = time.perf_counter()
+
+    def _finish(self, data):
+        if "_metrics_handler" in data:
+            handler = data.pop("_metrics_handler")
+            telegram_handler_calls.inc(handler=handler)
+            telegram_handler_seconds.observe(time.perf_counter() - data.pop("_metrics_start"), handler=handler)
+
+    async def on_process_message(self, message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message, results, data: dict):
+        self._finish(data)
+
+    async def on_process_callback_query(self, callback_query, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, callback_query, results, data: dict):
+        self._finish(data)
+
+    async def on_pre_process_error(self, update, error, data: dict):
+        telegram_errors.inc(type=type(error).__name__)
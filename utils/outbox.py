@@ -0,0 +1,221 @@
+import asyncio
+import logging
+from collections import deque
+
+from aiogram.utils.exceptions import CantParseEntities, RetryAfter
+
+from utils.rate_limit import TokenBucket
+
+# Ограничение Telegram на длину текста одного сообщения
+MESSAGE_LIMIT = 4096
+MAX_RETRIES = 5
+
+
+def _safe_cuts(text):
+    # Позиции разрывов строк и пробелов, где все Markdown-сущности закрыты.
+    # Первыми идут пустые строки, затем переносы, затем пробелы — от более удачных к менее
+    paragraphs, lines, spaces = [], [], []
+    code_block = inline_code = bold = italic = False
+    i = 0
+    while i < len(text):
+        if text.startswith("```", i):
+            code_block = not code_block
+            i += 3
+            continue
+        char = text[i]
+        if code_block:
+            pass
+        elif char == "`":
+            inline_code = not inline_code
+        elif not inline_code and char == "*":
+            bold = not bold
+        elif not inline_code and char == "_":
+            italic = not italic
+        elif char in "\n " and not (code_block or inline_code or bold or italic):
+            if char == " ":
+                spaces.append(i)
+            elif text.startswith("\n\n", i):
+                paragraphs.append(i)
+            else:
+                lines.append(i)
+        i += 1
+    return paragraphs, lines, spaces
+
+
+def split_text(text, limit=MESSAGE_LIMIT):
+    """Split `text` into chunks of at most `limit` characters.
+
+    Chunks end on paragraph, line or word boundaries outside of Markdown
+    entities, so every chunk still parses on its own. A code block with no
+    such boundary is split by lines and re-opened in the next chunk.
+    """
+    chunks = []
+    while len(text) > limit:
+        cut = None
+        for candidates in _safe_cuts(text[:limit + 1]):
+            candidates = [i for i in candidates if i > 0]
+            if candidates:
+                cut = candidates[-1]
+                break
+        if cut is None:
+            # Внутри длинного блока кода режем по строке, закрываем блок и открываем его заново
+            cut = text.rfind("\n", 0, limit - 4)
+            if cut <= 0:
+                cut = limit - 4
+            head, text = text[:cut].rstrip(), text[cut:].lstrip()
+            if head.count("```") % 2:
+                head, text = head + "\n```", "```\n" + text
+            chunks.append(head)
+            continue
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+class _Outgoing:
+    def __init__(self, text, parse_mode, kwargs, coalesce):
+        self.text = text
+        self.parse_mode = parse_mode
+        self.kwargs = kwargs
+        self.coalesce = coalesce
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class Outbox:
+    """Single exit point for outgoing messages.
+
+    Every chat has its own queue drained by one task, so messages keep their
+    order. Sends wait for a per-chat and a global token bucket, texts longer
+    than `MESSAGE_LIMIT` are split, short messages that are already waiting
+    for the same chat are merged into one, and `RetryAfter` pauses the chat
+    for the time Telegram asked for before retrying.
+    """
+
+    def __init__(self, bot, global_rate=25, chat_rate=1, chat_burst=3, coalesce_length=1000):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.coalesce_length = coalesce_length
+        self._buckets = {}
+        self._queues = {}
+        self._workers = {}
+
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                # Корзины чатов без активной отправки давно наполнились, их можно забыть
+                self._buckets = {chat: b for chat, b in self._buckets.items() if chat in self._workers}
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, capacity=self.chat_burst)
+        return bucket
+
+    def enqueue(self, chat_id, text, parse_mode=None, coalesce=True, **kwargs):
+        """Queue a message without waiting for it.
+
+        Returns a future with the `Message` it was delivered in. Messages
+        queued one after another for the same chat keep their order, and
+        short ones can be merged into one send.
+        """
+        item = _Outgoing(text, parse_mode, kwargs, coalesce)
+        self._queues.setdefault(chat_id, deque()).append(item)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._drain(chat_id))
+        return item.future
+
+    async def send(self, chat_id, text, parse_mode=None, coalesce=True, **kwargs):
+        """Queue a message and return the last `Message` it was delivered in."""
+        return await self.enqueue(chat_id, text, parse_mode=parse_mode, coalesce=coalesce, **kwargs)
+
+    async def send_many(self, chat_id, texts, parse_mode=None):
+        """Queue several messages at once and return their `Message` objects."""
+        # Все сообщения ставим в очередь сразу, чтобы короткие соседние ушли одним сообщением
+        futures = [self.enqueue(chat_id, text, parse_mode=parse_mode) for text in texts]
+        return await asyncio.gather(*futures)
+
+    async def edit(self, chat_id, message_id, text, **kwargs):
+        # Редактирование тоже расходует лимиты; RetryAfter пробрасывается — вызывающий сам решает, повторять ли
+        await self._acquire(chat_id)
+        try:
+            return await self.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+        except RetryAfter as e:
+            self._bucket(chat_id).pause(e.timeout)
+            raise
+
+    async def drain(self, timeout):
+        """Wait until every queued message is sent, at most `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Пока ждем, могут появиться новые чаты, поэтому проверяем очереди заново
+        while self._workers:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logging.warning(f"Не успели отправить сообщения в {len(self._workers)} чатов за {timeout} с.")
+                return
+            await asyncio.wait(list(self._workers.values()), timeout=remaining)
+
+    async def _acquire(self, chat_id):
+        await self._bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    def _next_batch(self, queue):
+        batch = [queue.popleft()]
+        # Склеиваем только то, что уже ждет в очереди: отправку ради склейки не задерживаем
+        while queue and not batch[-1].kwargs and batch[-1].coalesce:
+            item = queue[0]
+            length = sum(len(i.text) + 2 for i in batch) + len(item.text)
+            if (not item.coalesce or item.parse_mode != batch[0].parse_mode
+                    or len(item.text) > self.coalesce_length or length > MESSAGE_LIMIT
+                    or any(len(i.text) > self.coalesce_length for i in batch)):
+                break
+            batch.append(queue.popleft())
+        return batch
+
+    async def _drain(self, chat_id):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                batch = self._next_batch(queue)
+                text = "\n\n".join(item.text for item in batch)
+                last = batch[-1]
+                try:
+                    result = await self._deliver(chat_id, text, last.parse_mode, last.kwargs)
+                except Exception as e:
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                    continue
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_result(result)
+        finally:
+            del self._workers[chat_id]
+            if not queue:
+                del self._queues[chat_id]
+
+    async def _deliver(self, chat_id, text, parse_mode, kwargs):
+        chunks = split_text(text)
+        message = None
+        for i, chunk in enumerate(chunks):
+            # Клавиатура и прочие параметры относятся к последней части
+            extra = kwargs if i == len(chunks) - 1 else {}
+            message = await self._send_chunk(chat_id, chunk, parse_mode, extra)
+        return message
+
+    async def _send_chunk(self, chat_id, text, parse_mode, kwargs):
+        for attempt in range(MAX_RETRIES):
+            await self._acquire(chat_id)
+            try:
+                return await self.bot.send_message(chat_id, text, parse_mode=parse_mode, **kwargs)
+            except RetryAfter as e:
+                logging.warning(f"Telegram просит подождать {e.timeout} с перед отправкой в чат {chat_id}")
+                self._bucket(chat_id).pause(e.timeout)
+            except CantParseEntities:
+                if parse_mode is None:
+                    raise
+                logging.warning(f"Не удалось разобрать разметку сообщения для чата {chat_id}, отправляем как текст")
+                parse_mode = None
+        await self._acquire(chat_id)
+        return await self.bot.send_message(chat_id, text, parse_mode=parse_mode, **kwargs)
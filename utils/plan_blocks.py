@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+WEEK_DAYS = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+
+
+# Разбиваем неделю на блоки: один блок — один день готовки и закупки
+def split_days_into_blocks(cooking_days, days=WEEK_DAYS):
+    cooking_days = min(max(cooking_days, 1), len(days))
+    cooking_block_size = len(days) // cooking_days  # Размер блока в днях
+    last_block_start = len(days) - (len(days) % cooking_days)
+
+    blocks = []
+    for i in range(0, last_block_start, cooking_block_size):
+        if i + cooking_block_size >= last_block_start:
+            blocks.append(days[i:])
+            break
+        blocks.append(days[i:i + cooking_block_size])
+    return blocks
+
+
+# Раскладываем рецепты по блокам по кругу, чтобы блоки не повторяли блюда друг друга
+def distribute_recipes(recipes, blocks_count):
+    parts = [[] for _ in range(blocks_count)]
+    for i, recipe in enumerate(recipes):
+        parts[i % blocks_count].append(recipe)
+    # Если рецептов меньше, чем блоков, пустым блокам отдаем весь список
+    return [part if part else list(recipes) for part in parts]
+
+
+def generate_blocks_sequential(blocks, recipes, generate_plan, generate_shopping, on_block_done=None):
+    """Generate blocks one after another, passing the earlier block results along.
+
+    `generate_plan` and `generate_shopping` get the lists of previous plan and
+    shopping results, so they can turn them into a short `current_state`.
+    """
+    final_plan = []
+    shopping_schedule = []
+    recipes_text = "\n".join(recipes)
+
+    for i, block_days in enumerate(blocks):
+        block_plan = generate_plan(recipes_text, block_days, list(final_plan))
+        block_shopping = generate_shopping(block_plan, block_days, list(shopping_schedule))
+        if on_block_done:
+            on_block_done(i, block_plan, block_shopping)
+
+        final_plan.append(block_plan)
+        shopping_schedule.append(block_shopping)
+
+    return final_plan, shopping_schedule
+
+
+def generate_blocks_parallel(blocks, recipes, generate_plan, generate_shopping, on_block_done=None,
+                             max_workers=None):
+    """Generate all blocks concurrently.
+
+    Retrieved recipes are split between blocks up front, so a block does not
+    need the previous blocks to avoid repeating dishes.
+    """
+    recipe_parts = distribute_recipes(recipes, len(blocks))
+
+    def generate_block(i, block_days, block_recipes):
+        block_plan = generate_plan("\n".join(block_recipes), block_days, [])
+        block_shopping = generate_shopping(block_plan, block_days, [])
+        if on_block_done:
+            on_block_done(i, block_plan, block_shopping)
+        return block_plan, block_shopping
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(blocks), thread_name_prefix="plan-block") as pool:
+        results = list(pool.map(generate_block, range(len(blocks)), blocks, recipe_parts))
+
+    final_plan = [block_plan for block_plan, _ in results]
+    shopping_schedule = [block_shopping for _, block_shopping in results]
+    return final_plan, shopping_schedule
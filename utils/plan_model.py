@@ -0,0 +1,379 @@
+import json
+import os
+import re
+
+from utils.ingredient_index import product_stems
+from utils.plan_blocks import WEEK_DAYS, split_days_into_blocks
+from utils.profiles import atomic_write_json
+from utils.shopping import Ingredient, ShoppingList, format_amount, parse_ingredient, parse_quantity
+
+# Структура плана:
+# {"version": 1, "blocks": [{"days": [...], "meals": [{"meal", "dish", "description",
+#   "ingredients": [[название, количество, единица], ...], "macros": {...}}], "shopping_text"?, "text"?}]}
+# "text" и "shopping_text" — исходный Markdown, если блок не удалось разобрать (или он из старого формата).
+# Список покупок хранить не нужно: он пересчитывается из ингредиентов при отправке.
+PLAN_VERSION = 1
+
+MACROS = [("calories", "Калории", ""), ("proteins", "Белки", " г"), ("fats", "Жиры", " г"), ("carbs", "Углеводы", " г")]
+_MACRO_NAMES = {title.lower(): key for key, title, _ in MACROS}
+
+
+def new_plan(blocks):
+    return {"version": PLAN_VERSION, "blocks": list(blocks)}
+
+
+def make_meal(meal, dish, description="", ingredients=(), macros=None):
+    meal_data = {"meal": meal, "dish": dish}
+    if description:
+        meal_data["description"] = description
+    # Целые количества храним без ".0": план пишется компактно
+    meal_data["ingredients"] = [[name, int(amount) if isinstance(amount, float) and amount.is_integer() else amount, unit]
+                                for name, amount, unit in ingredients]
+    if macros:
+        meal_data["macros"] = macros
+    return meal_data
+
+
+def meal_ingredients(meal):
+    return [Ingredient(*ingredient) for ingredient in meal.get("ingredients", [])]
+
+
+# --- Разбор ответа LLM ---
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return value
+    match = re.search(r"\d+(?:[.,]\d+)?", str(value or ""))
+    if not match:
+        return None
+    number = float(match.group(0).replace(",", "."))
+    return int(number) if number.is_integer() else number
+
+
+def _json_ingredient(item):
+    if isinstance(item, str):
+        return parse_ingredient(item)
+    if isinstance(item, (list, tuple)) and item:
+        item = {"name": item[0], "amount": " ".join(str(part) for part in item[1:] if part is not None)}
+    if not isinstance(item, dict) or not item.get("name"):
+        return None
+    # Количество нормализуем так же, как в текстовом формате: граммы, миллилитры, чайные ложки
+    quantity = " ".join(str(item[key]) for key in ("amount", "unit") if item.get(key) not in (None, ""))
+    ingredient = parse_ingredient(f"{item['name']}: {quantity}")
+    if ingredient is None:
+        amount, unit = parse_quantity(quantity)
+        ingredient = Ingredient(str(item["name"]).strip(), amount, unit)
+    return ingredient
+
+
+def _json_meal(item):
+    if not isinstance(item, dict):
+        return None
+    dish = item.get("dish") or item.get("name") or item.get("title")
+    if not dish:
+        return None
+    macros_source = item.get("macros") if isinstance(item.get("macros"), dict) else item
+    macros = {key: _number(macros_source[key]) for key, _, _ in MACROS if macros_source.get(key) is not None}
+    ingredients = [_json_ingredient(ingredient) for ingredient in item.get("ingredients") or []]
+    return make_meal(str(item.get("meal") or "").strip(), str(dish).strip(), str(item.get("description") or "").strip(),
+                     [ingredient for ingredient in ingredients if ingredient is not None],
+                     {key: value for key, value in macros.items() if value is not None})
+
+
+def _load_json(text):
+    # Модель может обернуть JSON в ```json ... ```, добавить пояснения или оставить висячие запятые
+    text = re.sub(r"```(?:json)?", "", text)
+    start = min([position for position in (text.find("{"), text.find("[")) if position >= 0], default=-1)
+    end = max(text.rfind("}"), text.rfind("]"))
+    if start < 0 or end <= start:
+        return None
+    candidate = text[start:end + 1]
+    for attempt in (candidate, re.sub(r",\s*([}\]])", r"\1", candidate.replace("“", '"').replace("”", '"'))):
+        try:
+            return json.loads(attempt)
+        except ValueError:
+            continue
+    return None
+
+
+# Поля приема пищи, которые можно показать, пока JSON еще не дописан; последняя строка может быть не закрыта
+_PREVIEW_FIELD = re.compile(r'"(meal|dish|description)"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+
+def preview_block_json(text):
+    """Render a partial JSON block as readable text for the progress preview."""
+    lines = []
+    for key, value in _PREVIEW_FIELD.findall(text):
+        value = value.replace('\\"', '"').replace("\\n", " ").strip()
+        if not value:
+            continue
+        if key == "meal":
+            if lines:
+                lines.append("")
+            value += ":"
+        lines.append(value)
+    return "\n".join(lines)
+
+
+def parse_block_json(text, block_days):
+    data = _load_json(text)
+    if isinstance(data, dict):
+        data = data.get("meals") or data.get("plan") or []
+    if not isinstance(data, list):
+        return None
+    meals = [meal for meal in (_json_meal(item) for item in data) if meal is not None]
+    return {"days": list(block_days), "meals": meals} if meals else None
+
+
+def _ingredient_items(text):
+    # Содержимое строки "Ингредиенты: [...]": строки в кавычках или через запятую
+    quoted = re.findall(r'"([^"]+)"|«([^»]+)»', text)
+    if quoted:
+        return [a or b for a, b in quoted]
+    text = text.strip().strip("[]")
+    return [item for item in re.split(r",\s*(?![^()]*\))", text) if item.strip()]
+
+
+def _parse_macros(line):
+    macros = {}
+    for name, value in re.findall(r"([А-Яа-яЁё]+)\s*:\s*(\d+(?:[.,]\d+)?)", line):
+        key = _MACRO_NAMES.get(name.lower())
+        if key:
+            macros[key] = _number(value)
+    return macros
+
+
+def parse_block_markdown(text, block_days):
+    """Parse a block in the Markdown plan format (the plan prompt example)."""
+    meals = []
+    current = None
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        header = re.match(r"^\*\*(.+?):?\*\*:?$", line)
+        if header:
+            current = {"meal": header.group(1).strip(), "dish": None, "description": [], "ingredients": [], "macros": {}}
+            meals.append(current)
+            continue
+        if current is None or re.match(r"^План на .+ готов", line):
+            continue
+        ingredients = re.match(r"^(?:[-*]\s*)?\**Ингредиенты\**\s*:\**\s*(.*)$", line, re.IGNORECASE)
+        if ingredients:
+            parsed = [parse_ingredient(item) for item in _ingredient_items(ingredients.group(1))]
+            current["ingredients"] += [item for item in parsed if item is not None]
+            continue
+        macros = _parse_macros(line)
+        if macros and "calories" in macros:
+            current["macros"] = macros
+            continue
+        if current["dish"] is None:
+            current["dish"] = line.strip("* ")
+        else:
+            current["description"].append(line)
+
+    meals = [make_meal(meal["meal"], meal["dish"], " ".join(meal["description"]), meal["ingredients"], meal["macros"])
+             for meal in meals if meal["dish"]]
+    return {"days": list(block_days), "meals": meals} if meals else None
+
+
+def parse_block(text, block_days):
+    """Structured block from an LLM answer: JSON first, then the Markdown format.
+
+    If neither can be parsed, the raw text is kept so the block can still be
+    shown to the user as is.
+    """
+    block = parse_block_json(text, block_days) or parse_block_markdown(text, block_days)
+    if block is None:
+        block = {"days": list(block_days), "meals": [], "text": text.strip()}
+    return block
+
+
+def has_ingredients(block):
+    return any(meal.get("ingredients") for meal in block.get("meals", []))
+
+
+# --- Вывод в Markdown ---
+
+def _format_ingredient(ingredient):
+    if ingredient.amount is None:
+        return f"{ingredient.name} - по вкусу"
+    return f"{ingredient.name} - {format_amount(ingredient.amount, ingredient.unit)}"
+
+
+def render_block(block):
+    if block.get("text"):
+        return block["text"]
+    parts = [f"{', '.join(block['days'])}:"]
+    for meal in block["meals"]:
+        lines = [f"**{meal['meal']}:**"] if meal["meal"] else []
+        lines.append(meal["dish"])
+        if meal.get("description"):
+            lines.append(meal["description"])
+        if meal.get("ingredients"):
+            lines.append("Ингредиенты: " + ", ".join(_format_ingredient(item) for item in meal_ingredients(meal)))
+        if meal.get("macros"):
+            lines.append(", ".join(f"{title}: {meal['macros'][key]}{unit}"
+                                   for key, title, unit in MACROS if key in meal["macros"]))
+        parts.append("\n".join(lines))
+    return "\n\n".join(parts)
+
+
+def block_shopping_list(block, servings=1):
+    # Каждое блюдо блока едят во все его дни: количество на порцию умножаем на число дней
+    shopping = ShoppingList()
+    for meal in block.get("meals", []):
+        for ingredient in meal_ingredients(meal):
+            shopping.add(ingredient, multiplier=len(block["days"]) * servings)
+    return shopping
+
+
+def render_shopping(block, servings=1):
+    if block.get("shopping_text"):
+        return block["shopping_text"]
+    shopping = block_shopping_list(block, servings)
+    if not len(shopping):
+        return None
+    lines = [f"{', '.join(block['days'])}:", "**Список продуктов:**"]
+    lines += [f"- {name} — {quantity}" for name, quantity in shopping.items()]
+    dishes = [(meal["meal"], meal["dish"]) for meal in block["meals"]]
+    if dishes:
+        lines += ["", "**Список блюд:**"]
+        lines += [f"- {meal}: {dish}" if meal else f"- {dish}" for meal, dish in dishes]
+    return "\n".join(lines)
+
+
+def render_plan(plan):
+    return [render_block(block) for block in plan["blocks"]]
+
+
+def render_shopping_schedule(plan):
+    return [text for text in (render_shopping(block) for block in plan["blocks"]) if text]
+
+
+def summarize_blocks(blocks):
+    """Short `current_state` for the next prompt: days and dish names only."""
+    lines = []
+    for block in blocks:
+        if block.get("meals"):
+            dishes = "; ".join(f"{meal['meal']} — {meal['dish']}" if meal["meal"] else meal["dish"]
+                               for meal in block["meals"])
+            lines.append(f"{', '.join(block['days'])}: {dishes}")
+        elif block.get("text"):
+            lines.append(block["text"])
+    return "\n".join(lines)
+
+
+# --- Правка плана ---
+
+# Дни и приемы пищи в любом падеже: "в среду", "ужин в пятницу", "на выходных"
+DAY_PATTERNS = [
+    (r"\bпонедельник", ["Понедельник"]), (r"\bвторник", ["Вторник"]), (r"\bсред[аеуы]\b", ["Среда"]),
+    (r"\bчетверг", ["Четверг"]), (r"\bпятниц", ["Пятница"]), (r"\bсуббот", ["Суббота"]),
+    (r"\bвоскресень", ["Воскресенье"]), (r"\bвыходн", ["Суббота", "Воскресенье"]), (r"\bбудн", WEEK_DAYS[:5]),
+]
+MEAL_PATTERNS = [(r"\bзавтрак", "завтрак"), (r"\bобед", "обед"), (r"\bужин", "ужин"), (r"\bперекус", "перекус"),
+                 (r"\bполдник", "полдник")]
+WHOLE_PLAN_PATTERN = r"весь план|всю неделю|все дни|каждый день|полностью|целиком|с нуля"
+
+
+def meal_key(name):
+    return (name or "").strip().lower()
+
+
+def _matches_meal(meal, meals):
+    return any(meal_key(meal["meal"]).startswith(name) for name in meals)
+
+
+def find_edit_target(plan, request):
+    """Work out which blocks and meals an edit request touches.
+
+    Returns `(block_indices, meals)`, where `meals` is a set of lowercase
+    meal names or None for whole blocks, or None if the request cannot be
+    pinned down and the whole plan has to be rebuilt. All days of a block
+    share the same meals, so touching one day touches its whole block.
+    """
+    text = (request or "").lower().replace("ё", "е")
+    blocks = plan["blocks"]
+    if not blocks or re.search(WHOLE_PLAN_PATTERN, text):
+        return None
+
+    days = {day for pattern, pattern_days in DAY_PATTERNS if re.search(pattern, text) for day in pattern_days}
+    meals = {name for pattern, name in MEAL_PATTERNS if re.search(pattern, text)}
+    block_indices = {i for i, block in enumerate(blocks) if days & set(block["days"])}
+
+    if not days:
+        # Запрос может называть блюдо: "замени сырники на что-нибудь другое"
+        request_stems = product_stems(text)
+        for i, block in enumerate(blocks):
+            for meal in block.get("meals", []):
+                if request_stems & product_stems(meal["dish"]):
+                    block_indices.add(i)
+                    if not meals and meal["meal"]:
+                        meals.add(meal_key(meal["meal"]))
+        if not block_indices and meals:
+            block_indices = set(range(len(blocks)))
+
+    if not block_indices:
+        return None
+    return sorted(block_indices), meals or None
+
+
+def merge_edited_block(old_block, new_block, meals=None):
+    """Take the edited meals from `new_block` and keep the rest of `old_block` as is."""
+    if meals is None or not new_block.get("meals") or not old_block.get("meals"):
+        return new_block
+    edited = [meal for meal in new_block["meals"] if _matches_meal(meal, meals)]
+    if not edited:
+        return new_block
+    replacements = {meal_key(meal["meal"]): meal for meal in edited}
+    merged = [replacements.pop(meal_key(meal["meal"]), meal) if _matches_meal(meal, meals) else meal
+              for meal in old_block["meals"]]
+    # Приемы пищи, которых раньше не было ("добавь перекус"), дописываем в конец
+    merged += list(replacements.values())
+    return {"days": list(old_block["days"]), "meals": merged}
+
+
+# --- Хранение ---
+
+def _legacy_days(text, fallback):
+    # В старых планах дни блока стоят в первой строке: "Понедельник, Вторник:"
+    first_line = text.strip().splitlines()[0] if text.strip() else ""
+    days = [day for day in WEEK_DAYS if day.lower() in first_line.lower()]
+    return days or fallback
+
+
+def plan_from_legacy(meal_texts, shopping_texts=()):
+    """Convert a plan saved as lists of Markdown blocks into the structured form.
+
+    The original text is kept for rendering, so old plans look exactly as
+    they did; the parsed meals are used for shopping and prompts.
+    """
+    fallback_days = split_days_into_blocks(len(meal_texts)) if meal_texts else []
+    blocks = []
+    for i, text in enumerate(meal_texts):
+        block_days = _legacy_days(text, fallback_days[i] if i < len(fallback_days) else [])
+        block = parse_block(text, block_days)
+        block["text"] = text
+        if i < len(shopping_texts) and shopping_texts[i]:
+            block["shopping_text"] = shopping_texts[i]
+        blocks.append(block)
+    return new_plan(blocks)
+
+
+def load_plan(path, legacy_shopping_path=None):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "blocks" in data:
+        return data
+
+    shopping = []
+    if legacy_shopping_path and os.path.exists(legacy_shopping_path):
+        with open(legacy_shopping_path, "r", encoding="utf-8") as f:
+            shopping = json.load(f)
+    return plan_from_legacy(data or [], shopping or [])
+
+
+def save_plan(path, plan):
+    # Компактный JSON: без отступов и с кириллицей как есть
+    return atomic_write_json(path, plan, ensure_ascii=False, separators=(",", ":"))
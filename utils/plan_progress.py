@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import threading
+import time
+
+from aiogram.utils.exceptions import MessageNotModified, RetryAfter, TelegramAPIError
+
+# Telegram не пропустит сообщение длиннее 4096 символов, оставляем запас под заголовок
+PREVIEW_LENGTH = 3500
+
+
+class PlanProgress:
+    """Shows plan generation progress in the loading message.
+
+    Token and block callbacks come from worker threads. An asyncio task edits
+    the loading message with the tail of the latest streamed text at most once
+    per `interval` seconds; `preview`, if given, turns that text into what the
+    user sees. Every finished block is sent as a separate message through the
+    outbox, keeping block order.
+    """
+
+    def __init__(self, outbox, chat_id, message_id, loading_text, plan_header, interval=1.5, preview=None):
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.loading_text = loading_text
+        self.plan_header = plan_header
+        self.interval = interval
+        self.preview = preview
+        self.sent_blocks = 0
+
+        self._loop = asyncio.get_running_loop()
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._latest_block = None
+        self._version = 0
+        self._shown_version = 0
+        self._last_edit = 0.0
+        self._finished = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    # Вызываются из потоков генерации
+    def on_token(self, block_index, text):
+        with self._lock:
+            self._streams[block_index] = self._streams.get(block_index, "") + text
+            self._latest_block = block_index
+            self._version += 1
+
+    def on_block_done(self, block_index, block_plan, block_shopping):
+        self._loop.call_soon_threadsafe(self._block_done, block_index, block_plan)
+
+    def _block_done(self, block_index, block_plan):
+        self._finished[block_index] = block_plan
+        with self._lock:
+            self._streams.pop(block_index, None)
+            if self._latest_block == block_index:
+                self._latest_block = next(iter(self._streams), None)
+        self._wakeup.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._send_finished_blocks()
+
+    async def _run(self):
+        while True:
+            await self._send_finished_blocks()
+            await self._update_preview()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _send_finished_blocks(self):
+        # Блоки отправляем строго по порядку, даже если готовятся параллельно
+        sends = []
+        while self.sent_blocks in self._finished:
+            if self.sent_blocks == 0:
+                sends.append(self.outbox.enqueue(self.chat_id, self.plan_header))
+            sends.append(self.outbox.enqueue(self.chat_id, self._finished[self.sent_blocks], parse_mode="Markdown"))
+            self.sent_blocks += 1
+        if sends:
+            await asyncio.gather(*sends)
+
+    async def _update_preview(self):
+        with self._lock:
+            version = self._version
+            text = self._streams.get(self._latest_block, "")
+        if version == self._shown_version or not text:
+            return
+        if time.monotonic() - self._last_edit < self.interval:
+            return
+        if self.preview:
+            text = self.preview(text)
+            if not text:
+                return
+
+        preview = text[-PREVIEW_LENGTH:]
+        if len(text) > PREVIEW_LENGTH:
+            preview = "…" + preview
+        try:
+            await self.outbox.edit(self.chat_id, self.message_id, f"{self.loading_text}\n\n{preview}")
+        except MessageNotModified:
+            pass
+        except RetryAfter as e:
+            self._last_edit = time.monotonic() + e.timeout
+            return
+        except TelegramAPIError as e:
+            logging.debug(f"Не удалось обновить сообщение с прогрессом: {e!r}")
+        self._shown_version = version
+        self._last_edit = time.monotonic()
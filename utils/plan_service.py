@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobAlreadyRunningError(Exception):
+    pass
+
+
+class ServiceStoppingError(QueueFullError):
+    pass
+
+
+class PlanGenerationService:
+    """Runs blocking plan-generation jobs off the event loop.
+
+    Jobs wait in a bounded asyncio queue and are picked up by a fixed number of
+    workers, each of which executes one job at a time in a thread pool. The
+    number of workers is the global concurrency limit for LLM pipelines.
+    Short background jobs get their own small thread pool, so they never take
+    a worker away from a plan, and are waited for by `drain()`. So are the
+    handlers wrapped in `inflight()`, until they have sent their last message.
+    """
+
+    def __init__(self, workers, queue_size, background_workers=1):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.background_workers = background_workers
+        self._executor = None
+        self._background_executor = None
+        self._background = set()
+        self._queue = None
+        self._tasks = []
+        self._active_users = set()
+        self._inflight = 0
+        self._stopping = False
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="plan")
+        self._background_executor = ThreadPoolExecutor(max_workers=self.background_workers,
+                                                       thread_name_prefix="plan-background")
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"Сервис генерации планов запущен: {self.workers} воркеров, очередь {self.queue_size}.")
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            func, future = await self._queue.get()
+            try:
+                if not future.cancelled():
+                    result = await loop.run_in_executor(self._executor, func)
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    @property
+    def pending(self):
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def active(self):
+        return len(self._active_users)
+
+    def is_running_for(self, user_id):
+        return user_id in self._active_users
+
+    async def submit(self, user_id, func, *args, **kwargs):
+        if self._queue is None:
+            raise RuntimeError("service not started")
+        # Во время остановки новые планы не принимаем
+        if self._stopping:
+            raise ServiceStoppingError()
+        # Один пользователь — одна генерация за раз
+        if user_id in self._active_users:
+            raise JobAlreadyRunningError()
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((functools.partial(func, *args, **kwargs), future))
+        except asyncio.QueueFull:
+            raise QueueFullError()
+
+        self._active_users.add(user_id)
+        try:
+            return await future
+        finally:
+            self._active_users.discard(user_id)
+
+    @contextlib.asynccontextmanager
+    async def inflight(self):
+        # Обработчик плана считается начатым, пока не сохранит план и не отправит последнее сообщение
+        self._inflight += 1
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+
+    async def run_in_thread(self, func, *args, **kwargs):
+        # Короткие блокирующие задачи без очереди (например, фоновые вызовы LLM) в отдельном пуле потоков
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._background_executor, functools.partial(func, *args, **kwargs))
+
+    def spawn(self, coro):
+        # Держим ссылку на фоновую задачу: иначе сборщик мусора может удалить ее на ходу
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+        return task
+
+    def _background_done(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Фоновая задача завершилась с ошибкой.", exc_info=task.exception())
+
+    def _busy(self):
+        return bool(self._inflight or self._active_users or self._background)
+
+    async def drain(self, timeout):
+        # Перестаем принимать задачи и ждем, пока начатые планы будут доставлены пользователям
+        self._stopping = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._busy() and loop.time() < deadline:
+            await asyncio.sleep(0.5)
+        if self._busy():
+            logging.warning(f"Не дождались завершения {max(self._inflight, len(self._active_users))} обработчиков планов "
+                            f"и {len(self._background)} фоновых задач за {timeout} с.")
+        else:
+            logging.info("Все начатые генерации планов завершены.")
+
+    async def shutdown(self):
+        tasks = self._tasks + list(self._background)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        for executor in (self._executor, self._background_executor):
+            if executor:
+                executor.shutdown(wait=False)
@@ -0,0 +1,97 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+# Хэш текста предпочтений в готовке: по нему понимаем, актуален ли сохраненный разбор
+def cooking_preferences_hash(cooking_preferences):
+    return hashlib.sha256((cooking_preferences or "").strip().encode('utf-8')).hexdigest()[:16]
+
+
+def is_cooking_analysis_fresh(profile):
+    analysis = profile.get('cooking_analysis')
+    return bool(analysis) and \
+        analysis.get('source_hash') == cooking_preferences_hash(profile.get('cooking_preferences'))
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    # Пишем во временный файл рядом и подменяем им старый: читатель никогда не увидит половину файла
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ProfileRepository:
+    """User profiles stored as `user_{id}.json` with an in-memory LRU cache.
+
+    Saves write through to disk atomically. A cached profile is reused while
+    the file's mtime and size are unchanged, so edits made outside the bot are
+    picked up on the next read. Callers get copies and may modify them freely.
+    """
+
+    def __init__(self, directory, max_items=1024):
+        self.directory = directory
+        self.max_items = max_items
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, user_id):
+        return os.path.join(self.directory, f'user_{user_id}.json')
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _remember(self, user_id, signature, profile):
+        self._cache[user_id] = (signature, profile)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_items:
+            self._cache.popitem(last=False)
+
+    def get(self, user_id):
+        path = self.path(user_id)
+        signature = self._signature(path)
+        with self._lock:
+            if signature is None:
+                self._cache.pop(user_id, None)
+                return None
+            cached = self._cache.get(user_id)
+            if cached and cached[0] == signature:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return copy.deepcopy(cached[1])
+        self.misses += 1
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        with self._lock:
+            self._remember(user_id, signature, profile)
+        return copy.deepcopy(profile)
+
+    def save(self, user_id, profile):
+        path = self.path(user_id)
+        profile = copy.deepcopy(profile)
+        with self._lock:
+            atomic_write_json(path, profile, ensure_ascii=False, indent=4)
+            self._remember(user_id, self._signature(path), profile)
+        return path
+
+    def stats(self):
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
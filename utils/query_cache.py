@@ -0,0 +1,134 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class QueryCache:
+    """Two-level cache of query embeddings and retrieved recipe IDs.
+
+    The first level is an in-memory LRU, the second is an SQLite table that
+    survives restarts. Embeddings depend only on the query text, while recipe
+    IDs are tied to the index version they were computed for and are ignored
+    once the index changes.
+    """
+
+    def __init__(self, path, memory_size=1000, disk_size=50000):
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS query_cache (
+                query TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                recipe_ids TEXT,
+                index_version TEXT,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS query_cache_last_used ON query_cache (last_used)")
+        self._db.commit()
+
+    def get(self, query, index_version):
+        """Return `(vector, recipe_ids)`; either part is None when it is not cached."""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            else:
+                row = self._db.execute(
+                    "SELECT vector, recipe_ids, index_version FROM query_cache WHERE query = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None, None
+                vector, recipe_ids, version = row
+                entry = (np.frombuffer(vector, dtype=np.float32), recipe_ids.split(",") if recipe_ids else None,
+                         version)
+                self._remember(key, entry)
+                self._db.execute("UPDATE query_cache SET last_used = ? WHERE query = ?", (time.time(), key))
+                self._db.commit()
+                self.disk_hits += 1
+
+        vector, recipe_ids, version = entry
+        if version != index_version:
+            recipe_ids = None
+        return vector, recipe_ids
+
+    def put(self, query, vector, recipe_ids, index_version):
+        key = normalize_query(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        entry = (vector, list(recipe_ids) if recipe_ids is not None else None, index_version)
+        with self._lock:
+            self._remember(key, entry)
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_cache (query, vector, recipe_ids, index_version, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, vector.tobytes(), ",".join(recipe_ids) if recipe_ids is not None else None,
+                 index_version, time.time()),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict_disk()
+            self._db.commit()
+
+    def invalidate_results(self, index_version):
+        # Эмбеддинги запросов остаются валидными, сбрасываем только найденные рецепты
+        with self._lock:
+            for key, (vector, _, version) in list(self._memory.items()):
+                if version != index_version:
+                    self._memory[key] = (vector, None, index_version)
+            cursor = self._db.execute(
+                "UPDATE query_cache SET recipe_ids = NULL, index_version = ? WHERE index_version IS NOT ?",
+                (index_version, index_version),
+            )
+            self._db.commit()
+        if cursor.rowcount:
+            logging.info(f"Кэш запросов: сброшены результаты поиска для {cursor.rowcount} запросов.")
+
+    def stats(self):
+        with self._lock:
+            disk_items = self._db.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_items": len(self._memory),
+                "disk_items": disk_items,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        self._db.execute(
+            "DELETE FROM query_cache WHERE query IN ("
+            "SELECT query FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_size,),
+        )
@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `capacity` at once."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        # Сервер попросил подождать: обнуляем запас и сдвигаем время пополнения в будущее
+        self._refill()
+        self._tokens = 0
+        self._updated = max(self._updated, time.monotonic() + seconds)
@@ -0,0 +1,210 @@
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+NOT_SPECIFIED = "Не указано"
+
+# Все CSS-селекторы страниц eda.ru в одном месте: при смене верстки правим только эту таблицу
+SELECTORS = {
+    "recipe_card": "div.emotion-n1x91l",
+    "recipe_card_link": "a[href]",
+    "title": "h1.emotion-gl52ge",
+    "portions": "div.emotion-1047m5l",
+    "cooking_time": "div.emotion-my9yfq",
+    "ingredient_item": "div.emotion-1oyy8lz div.emotion-ydhjlb",
+    "ingredient_name": "span[itemprop='recipeIngredient']",
+    "ingredient_quantity": "span.emotion-bsdd3p",
+    "nutrition": "span[itemprop='nutrition'][itemtype='http://schema.org/NutritionInformation']",
+    "calories": "span[itemprop='calories']",
+    "nutrition_value": "div.emotion-16si75h",
+}
+
+
+class RecipeExtractor:
+    """Turns eda.ru pages into recipe dicts using the `SELECTORS` table.
+
+    Backends only implement parsing and node access; the extraction logic is
+    shared, so every backend produces the same dict.
+    """
+
+    name = None
+
+    def __init__(self, selectors=None):
+        self.selectors = dict(SELECTORS, **(selectors or {}))
+
+    def parse(self, html):
+        raise NotImplementedError
+
+    def select(self, node, key):
+        raise NotImplementedError
+
+    def select_one(self, node, key):
+        nodes = self.select(node, key)
+        return nodes[0] if nodes else None
+
+    def text(self, node):
+        raise NotImplementedError
+
+    def attr(self, node, name):
+        raise NotImplementedError
+
+    def text_of(self, node, key, default=NOT_SPECIFIED):
+        elem = self.select_one(node, key)
+        return self.text(elem) if elem is not None else default
+
+    def extract_links(self, html, base_url):
+        links = []
+        for card in self.select(self.parse(html), "recipe_card"):
+            link = self.select_one(card, "recipe_card_link")
+            if link is not None:
+                href = self.attr(link, "href")
+                links.append(base_url + href if not href.startswith('http') else href)
+        return links
+
+    def extract_recipe(self, html, recipe_url):
+        try:
+            root = self.parse(html)
+
+            title_elem = self.select_one(root, "title")
+            if title_elem is None:
+                raise ValueError("Title element not found")
+
+            ingredients = []
+            for item in self.select(root, "ingredient_item"):
+                name = self.text_of(item, "ingredient_name", "Неизвестный ингредиент")
+                quantity = self.text_of(item, "ingredient_quantity", "Количество не указано")
+                ingredients.append(f"{name}: {quantity}")
+
+            return {
+                "title": self.text(title_elem),
+                "url": recipe_url,
+                "portions": self.text_of(root, "portions"),
+                "cooking_time": self.text_of(root, "cooking_time"),
+                "ingredients": ingredients,
+                "nutrition": self.extract_nutrition(root),
+            }
+        except Exception:
+            return None
+
+    def extract_nutrition(self, root):
+        nutrition_info = {
+            "calories": NOT_SPECIFIED,
+            "proteins": NOT_SPECIFIED,
+            "fats": NOT_SPECIFIED,
+            "carbs": NOT_SPECIFIED
+        }
+
+        container = self.select_one(root, "nutrition")
+        if container is None:
+            return nutrition_info
+
+        nutrition_info["calories"] = self.text_of(container, "calories")
+
+        values = self.select(container, "nutrition_value")
+        if len(values) >= 3:
+            nutrition_info.update({
+                "proteins": self.text(values[0]),
+                "fats": self.text(values[1]),
+                "carbs": self.text(values[2])
+            })
+        return nutrition_info
+
+
+class BeautifulSoupExtractor(RecipeExtractor):
+    name = "bs4"
+
+    def parse(self, html):
+        return BeautifulSoup(html, 'html.parser')
+
+    def select(self, node, key):
+        return node.select(self.selectors[key])
+
+    def select_one(self, node, key):
+        return node.select_one(self.selectors[key])
+
+    def text(self, node):
+        return node.text.strip()
+
+    def attr(self, node, name):
+        return node.get(name)
+
+
+class LxmlExtractor(RecipeExtractor):
+    name = "lxml"
+
+    def __init__(self, selectors=None):
+        if lxml is None:
+            raise ImportError("Для бэкенда lxml установите пакеты lxml и cssselect")
+        super().__init__(selectors)
+        self._compiled = {key: CSSSelector(selector) for key, selector in self.selectors.items()}
+
+    def parse(self, html):
+        return lxml.html.fromstring(html)
+
+    def select(self, node, key):
+        return self._compiled[key](node)
+
+    def text(self, node):
+        return node.text_content().strip()
+
+    def attr(self, node, name):
+        return node.get(name)
+
+
+class SelectolaxExtractor(RecipeExtractor):
+    name = "selectolax"
+
+    def __init__(self, selectors=None):
+        if HTMLParser is None:
+            raise ImportError("Для бэкенда selectolax установите пакет selectolax")
+        super().__init__(selectors)
+
+    def parse(self, html):
+        return HTMLParser(html)
+
+    def select(self, node, key):
+        return node.css(self.selectors[key])
+
+    def select_one(self, node, key):
+        return node.css_first(self.selectors[key])
+
+    def text(self, node):
+        return node.text().strip()
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+
+EXTRACTORS = {
+    BeautifulSoupExtractor.name: BeautifulSoupExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+    SelectolaxExtractor.name: SelectolaxExtractor,
+}
+
+
+def available_backends():
+    backends = [BeautifulSoupExtractor.name]
+    if lxml is not None:
+        backends.append(LxmlExtractor.name)
+    if HTMLParser is not None:
+        backends.append(SelectolaxExtractor.name)
+    return backends
+
+
+def get_extractor(backend="auto"):
+    # "auto" — самый быстрый из установленных бэкендов
+    if backend == "auto":
+        backend = available_backends()[-1]
+    return EXTRACTORS[backend]()
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+
+import numpy as np
+from langchain_chroma import Chroma
+
+from utils.config import CHROMA_DIR, CHROMA_COLLECTION
+
+# Сколько документов отправляем в эмбеддер за один запрос
+EMBED_BATCH_SIZE = 64
+
+
+def document_id(document):
+    # ID документа — хэш его содержимого: изменился рецепт — изменился ID
+    payload = f"{document.metadata.get('source', '')}\n{document.page_content}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def sync_index(vectorstore, documents):
+    """Bring the persisted collection in line with `documents`.
+
+    Only documents whose content hash is missing from the collection are
+    embedded; hashes that no longer correspond to any document are deleted.
+    """
+    wanted = {document_id(doc): doc for doc in documents}
+    existing = set(vectorstore.get(include=[])['ids'])
+
+    stale_ids = [doc_id for doc_id in existing if doc_id not in wanted]
+    new_ids = [doc_id for doc_id in wanted if doc_id not in existing]
+
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+
+    for i in range(0, len(new_ids), EMBED_BATCH_SIZE):
+        batch_ids = new_ids[i:i + EMBED_BATCH_SIZE]
+        vectorstore.add_documents([wanted[doc_id] for doc_id in batch_ids], ids=batch_ids)
+
+    logging.info(f"Индекс рецептов синхронизирован: добавлено {len(new_ids)}, удалено {len(stale_ids)}, "
+                 f"всего {len(wanted)}.")
+    return new_ids, stale_ids
+
+
+def load_vectorstore(documents, embedding):
+    vectorstore = Chroma(
+        collection_name=CHROMA_COLLECTION,
+        embedding_function=embedding,
+        persist_directory=CHROMA_DIR,
+    )
+    sync_index(vectorstore, documents)
+    return vectorstore
+
+
+class RecipeMatrix:
+    """In-memory copy of the index embeddings for batched cosine top-k search."""
+
+    def __init__(self, ids, documents, vectors, urls=None):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.urls = list(urls) if urls is not None else [None] * len(self.ids)
+        if self.ids:
+            self.vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(self.ids), -1))
+        else:
+            # Пустая коллекция: размерность эмбеддингов неизвестна, а reshape(0, -1) ее не выведет
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.positions = {doc_id: index for index, doc_id in enumerate(self.ids)}
+        # Версия индекса меняется при любом добавлении или удалении рецепта
+        self.version = hashlib.sha256("\n".join(sorted(self.ids)).encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        data = vectorstore.get(include=["embeddings", "documents", "metadatas"])
+        urls = [(metadata or {}).get('source') for metadata in data['metadatas']]
+        return cls(data['ids'], data['documents'], data['embeddings'], urls)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rank(self, query_vectors, n, mask=None):
+        """Return, for every query, the row indices of its `n` nearest recipes, best first.
+
+        Rows where the boolean `mask` is False are never returned.
+        """
+        allowed = len(self.ids) if mask is None else int(mask.sum())
+        if not allowed or not len(query_vectors):
+            return [[] for _ in range(len(query_vectors))]
+
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+        scores = queries @ self.vectors.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+
+        n = min(allowed, n)
+        candidates = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+        return np.take_along_axis(candidates, order, axis=1).tolist()
+
+    @staticmethod
+    def pick(candidates, k=1, dedupe=True):
+        """Take `k` recipes per query from ranked `candidates`.
+
+        With `dedupe` a recipe is given to at most one query: every query gets
+        its best free recipe first, then its second best, and so on.
+        """
+        used = set()
+        results = [[] for _ in range(len(candidates))]
+        positions = [0] * len(candidates)
+        for _ in range(k):
+            for query_index, row in enumerate(candidates):
+                while positions[query_index] < len(row):
+                    index = row[positions[query_index]]
+                    positions[query_index] += 1
+                    if not dedupe or index not in used:
+                        used.add(index)
+                        results[query_index].append(index)
+                        break
+        return results
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
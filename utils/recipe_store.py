@@ -0,0 +1,164 @@
+import json
+import logging
+import mmap
+import os
+import threading
+
+
+class RecipeStore:
+    """Line-delimited recipe storage with an offset index keyed by recipe URL.
+
+    Recipes are appended to `path` one JSON object per line; every append also
+    appends `{"url", "offset", "length"}` to the sidecar index, so neither
+    file is ever rewritten. Single recipes are read through mmap by offset.
+    A later line with the same URL replaces the earlier one. On open, a record
+    cut off by a crash is dropped, and a missing, damaged or stale index is
+    rebuilt from the recipes file.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        self._offsets = {}
+        self._mmap = None
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(self.path, 'ab').close()
+        self._load_index()
+
+    def _load_index(self):
+        size = self._drop_partial_tail(self.path)
+        indexed_size = 0
+        if os.path.exists(self.index_path):
+            self._drop_partial_tail(self.index_path)
+            valid = True
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        valid = False
+                        break
+                    self._offsets[entry["url"]] = (entry["offset"], entry["length"])
+                    indexed_size = max(indexed_size, entry["offset"] + entry["length"])
+            if not valid or indexed_size > size:
+                # Индекс испорчен или ссылается за конец файла рецептов: строим его заново
+                logging.warning(f"Индекс {self.index_path} не соответствует {self.path}, перестраиваем его.")
+                self._offsets = {}
+                indexed_size = 0
+                open(self.index_path, 'w').close()
+
+        # Строки, дописанные после последней записи индекса (или индекс потерян), доиндексируем
+        if size > indexed_size:
+            self._reindex_from(indexed_size)
+
+    @staticmethod
+    def _drop_partial_tail(path):
+        # Запись, оборванная сбоем, не заканчивается переводом строки. Отрезаем ее, иначе следующая
+        # запись приклеится к ней и строку нельзя будет разобрать
+        size = os.path.getsize(path)
+        if size == 0:
+            return 0
+        with open(path, 'rb+') as f:
+            end = size
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                chunk = f.read(end - start)
+                if end == size and chunk.endswith(b"\n"):
+                    return size
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            logging.warning(f"В {path} оборвана последняя запись ({size - end} байт), отбрасываем ее.")
+            f.truncate(end)
+        return end
+
+    def _reindex_from(self, offset):
+        entries = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    url = json.loads(line)["url"]
+                except (ValueError, KeyError, TypeError):
+                    offset += len(line)
+                    continue
+                self._offsets[url] = (offset, len(line))
+                entries.append({"url": url, "offset": offset, "length": len(line)})
+                offset += len(line)
+
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, url):
+        return url in self._offsets
+
+    def urls(self):
+        return list(self._offsets)
+
+    def get(self, url):
+        location = self._offsets.get(url)
+        if location is None:
+            return None
+        offset, length = location
+        with self._lock:
+            view = self._view(offset + length)
+            return json.loads(view[offset:offset + length])
+
+    def __iter__(self):
+        # Потоковое чтение по порядку в файле, без загрузки всего корпуса в память
+        latest = set(self._offsets.values())
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if (offset, len(line)) in latest:
+                    yield json.loads(line)
+                offset += len(line)
+
+    def append(self, recipe):
+        line = (json.dumps(recipe, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"url": recipe["url"], "offset": offset, "length": len(line)},
+                                   ensure_ascii=False) + "\n")
+            self._offsets[recipe["url"]] = (offset, len(line))
+
+    def import_json(self, json_path):
+        # Перенос рецептов из старого формата (один JSON-массив)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            recipes = json.load(f)
+        imported = 0
+        for recipe in recipes:
+            if recipe and recipe["url"] not in self._offsets:
+                self.append(recipe)
+                imported += 1
+        logging.info(f"Перенесено рецептов из {json_path}: {imported}.")
+        return imported
+
+    def _view(self, size):
+        if self._mmap is None or len(self._mmap) < size:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
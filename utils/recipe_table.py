@@ -0,0 +1,86 @@
+import re
+
+import numpy as np
+
+TIME_UNITS = {"мин": 1, "час": 60, "сут": 1440, "ден": 1440, "дн": 1440}
+
+
+# "1 час  20 минут" -> 80, "15 минут + 12 часов" -> 735, "Не указано" -> nan
+def parse_minutes(text):
+    minutes = 0.0
+    found = False
+    for value, unit in re.findall(r"(\d+(?:[.,]\d+)?)\s*([а-яё]+)", (text or "").lower()):
+        for prefix, multiplier in TIME_UNITS.items():
+            if unit.startswith(prefix):
+                minutes += float(value.replace(",", ".")) * multiplier
+                found = True
+                break
+    return minutes if found else np.nan
+
+
+# "889" -> 889.0, "12,5 г" -> 12.5, "Не указано" -> nan
+def parse_number(text):
+    match = re.search(r"\d+(?:[.,]\d+)?", str(text or ""))
+    return float(match.group().replace(",", ".")) if match else np.nan
+
+
+class RecipeTable:
+    """Numeric recipe attributes in NumPy columns, parsed once at load time.
+
+    Rows are recipes (keyed by URL); unknown values are NaN. `filter` returns
+    a boolean mask over rows, `align` maps it onto another list of URLs.
+    """
+
+    COLUMNS = ("calories", "proteins", "fats", "carbs", "portions", "cooking_minutes")
+
+    def __init__(self, urls, columns):
+        self.urls = list(urls)
+        self.positions = {url: index for index, url in enumerate(self.urls)}
+        self.columns = {name: np.asarray(columns[name], dtype=np.float32) for name in self.COLUMNS}
+
+    @classmethod
+    def from_recipes(cls, recipes):
+        urls = []
+        values = {name: [] for name in cls.COLUMNS}
+        for recipe in recipes:
+            if recipe is None:
+                continue
+            urls.append(recipe['url'])
+            nutrition = recipe.get('nutrition', {})
+            for name in ("calories", "proteins", "fats", "carbs"):
+                values[name].append(parse_number(nutrition.get(name)))
+            values["portions"].append(parse_number(recipe.get('portions')))
+            values["cooking_minutes"].append(parse_minutes(recipe.get('cooking_time')))
+        return cls(urls, values)
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def filter(self, max_minutes=None, min_calories=None, max_calories=None, keep_unknown=False):
+        mask = np.ones(len(self.urls), dtype=bool)
+        for column, low, high in (("cooking_minutes", None, max_minutes),
+                                  ("calories", min_calories, max_calories)):
+            if low is None and high is None:
+                continue
+            values = self.columns[column]
+            with np.errstate(invalid="ignore"):
+                passed = np.ones(len(values), dtype=bool)
+                if low is not None:
+                    passed &= values >= low
+                if high is not None:
+                    passed &= values <= high
+            if keep_unknown:
+                passed |= np.isnan(values)
+            mask &= passed
+        return mask
+
+    def align(self, mask, urls):
+        # Маска по строкам таблицы -> маска по переданному списку URL (неизвестные URL отбрасываются)
+        rows = np.array([self.positions.get(url, -1) for url in urls], dtype=np.int64)
+        aligned = np.zeros(len(rows), dtype=bool)
+        known = rows >= 0
+        aligned[known] = mask[rows[known]]
+        return aligned
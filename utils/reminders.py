@@ -0,0 +1,100 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+_outbox = None
+
+
+# Отправка напоминания; функция вызывается из хранилища задач по ссылке, поэтому очередь отправки берется из модуля
+async def send_reminder(chat_id, text):
+    if _outbox is None:
+        logging.error(f"Очередь отправки не задана, напоминание для {chat_id} не отправлено")
+        return
+    await _outbox.send(chat_id, text)
+
+
+class ReminderScheduler:
+    """Shopping reminders kept in a persistent APScheduler job store.
+
+    Jobs are stored in SQLite through SQLAlchemy and are reloaded when the
+    bot restarts. A `reminder_jobs` table maps each user to their job ids,
+    so listing and removing reminders touches only that user's jobs.
+    """
+
+    def __init__(self, path, timezone=None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS reminder_jobs (
+                    user_id INTEGER NOT NULL,
+                    job_id TEXT NOT NULL PRIMARY KEY
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS reminder_jobs_user_id ON reminder_jobs (user_id)")
+        scheduler_options = {"timezone": timezone} if timezone else {}
+        self.scheduler = AsyncIOScheduler(
+            jobstores={"default": SQLAlchemyJobStore(url=f"sqlite:///{path}")},
+            job_defaults={"coalesce": True, "misfire_grace_time": 60 * 60},
+            **scheduler_options,
+        )
+
+    def start(self, outbox):
+        global _outbox
+        _outbox = outbox
+        if not self.scheduler.running:
+            self.scheduler.start()
+        self._reconcile()
+
+    def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        with self._lock:
+            self._db.close()
+
+    def _reconcile(self):
+        # Один проход при запуске: убираем из индекса задачи, которых уже нет в хранилище
+        job_ids = {job.id for job in self.scheduler.get_jobs()}
+        with self._lock, self._db:
+            stale = [row[0] for row in self._db.execute("SELECT job_id FROM reminder_jobs")
+                     if row[0] not in job_ids]
+            self._db.executemany("DELETE FROM reminder_jobs WHERE job_id = ?", [(job_id,) for job_id in stale])
+        logging.info(f"Загружено напоминаний: {len(job_ids)}, удалено устаревших записей индекса: {len(stale)}")
+
+    def job_ids(self, user_id):
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT job_id FROM reminder_jobs WHERE user_id = ? ORDER BY job_id", (user_id,))]
+
+    def add(self, user_id, job_id, trigger, chat_id, text):
+        self.scheduler.add_job(send_reminder, trigger, args=[chat_id, text], id=job_id, replace_existing=True)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO reminder_jobs (user_id, job_id) VALUES (?, ?)",
+                             (user_id, job_id))
+
+    def jobs_for_user(self, user_id):
+        jobs = []
+        for job_id in self.job_ids(user_id):
+            job = self.scheduler.get_job(job_id)
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    def remove_for_user(self, user_id):
+        job_ids = self.job_ids(user_id)
+        for job_id in job_ids:
+            try:
+                self.scheduler.remove_job(job_id)
+            except JobLookupError:
+                pass
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM reminder_jobs WHERE user_id = ?", (user_id,))
+        return len(job_ids)
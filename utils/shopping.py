@@ -0,0 +1,147 @@
+import math
+import re
+from collections import namedtuple
+
+from utils.ingredient_index import product_stems
+
+FRACTIONS = {"½": 0.5, "¼": 0.25, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3, "⅕": 0.2, "⅖": 0.4, "⅗": 0.6, "⅘": 0.8,
+             "⅙": 1 / 6, "⅛": 0.125}
+
+# Форма единицы -> (каноническая единица, множитель). Масса в граммах, объем в миллилитрах,
+# ложки в чайных ложках, остальное считаем поштучно в своих единицах
+UNITS = [
+    (("кг", "килограмм"), "г", 1000),
+    (("г", "гр", "грамм"), "г", 1),
+    (("мл", "миллилитр"), "мл", 1),
+    (("л", "литр"), "мл", 1000),
+    (("стакан",), "мл", 250),
+    (("ст.л", "ст. л", "столов"), "ч.л.", 3),
+    (("ч.л", "ч. л", "чайн"), "ч.л.", 1),
+    (("шт", "штук"), "шт", 1),
+    (("зубч",), "зубч.", 1),
+    (("головк", "головок"), "гол.", 1),
+    (("пуч",), "пуч.", 1),
+    (("банк", "банок"), "бан.", 1),
+    (("кус",), "кус.", 1),
+    (("стеб",), "стеб.", 1),
+    (("веточ",), "вет.", 1),
+]
+
+# Количества, которые не складываются: продукт просто попадает в список
+UNCOUNTED = ("по вкусу", "щепотк", "на кончике ножа", "для подачи", "для жарки")
+
+Ingredient = namedtuple("Ingredient", ["name", "amount", "unit"])
+
+_NUMBER = r"\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?[½¼¾⅓⅔⅕⅖⅗⅘⅙⅛]?|[½¼¾⅓⅔⅕⅖⅗⅘⅙⅛]"
+_QUANTITY = re.compile(rf"^(?P<amount>(?:{_NUMBER})(?:\s*[-–—]\s*(?:{_NUMBER}))?)?\s*(?P<unit>.*)$")
+
+
+# "1⅕" -> 1.2, "0,3" -> 0.3, "1/2" -> 0.5, "½" -> 0.5
+def parse_number(text):
+    text = text.strip().replace(",", ".")
+    fraction = 0.0
+    if text and text[-1] in FRACTIONS:
+        fraction = FRACTIONS[text[-1]]
+        text = text[:-1].strip()
+    if "/" in text:
+        numerator, denominator = text.split("/", 1)
+        return float(numerator) / float(denominator) + fraction
+    return (float(text) if text else 0.0) + fraction
+
+
+def parse_unit(text):
+    text = text.strip().lower().rstrip(".")
+    for forms, unit, multiplier in UNITS:
+        for form in forms:
+            if text == form or (len(form) > 2 and text.startswith(form)):
+                return unit, multiplier
+    return None
+
+
+def parse_quantity(text):
+    # "2 столовые ложки" -> (6.0, "ч.л."), "1-2 шт" -> (2.0, "шт"), "по вкусу" -> (None, None)
+    text = (text or "").strip().lower()
+    if not text or any(marker in text for marker in UNCOUNTED):
+        return None, None
+    match = _QUANTITY.match(text)
+    if not match.group("amount"):
+        return None, None
+    # Для диапазона берем верхнюю границу: лучше купить с запасом
+    amount = parse_number(re.split(r"\s*[-–—]\s*", match.group("amount"))[-1])
+    unit_text = match.group("unit").strip()
+    if not unit_text:
+        return amount, "шт"
+    unit = parse_unit(unit_text.split()[0]) or parse_unit(unit_text)
+    if unit is None:
+        return None, None
+    return amount * unit[1], unit[0]
+
+
+def parse_ingredient(line):
+    """Parse `"Название: количество"` or `"Название - количество"` into an `Ingredient`.
+
+    Returns None for lines that do not name a product. Products without a
+    usable quantity ("по вкусу") get `amount=None`.
+    """
+    line = line.strip().strip('"\'«»').strip()
+    line = re.sub(r"^[-•*]\s+", "", line)
+    match = re.match(r"^(?P<name>.+?)\s*(?::|\s[-–—]\s)\s*(?P<quantity>.*)$", line)
+    if match:
+        name, quantity = match.group("name"), match.group("quantity")
+    else:
+        name, quantity = line, ""
+    name = name.strip(" *")
+    if not name or not product_stems(name):
+        return None
+    amount, unit = parse_quantity(quantity)
+    return Ingredient(name, amount, unit)
+
+
+def _format_number(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".").replace(".", ",")
+
+
+def format_amount(amount, unit):
+    if unit == "г" and amount >= 1000:
+        return f"{_format_number(amount / 1000)} кг"
+    if unit == "мл" and amount >= 1000:
+        return f"{_format_number(amount / 1000)} л"
+    if unit in ("г", "мл"):
+        return f"{math.ceil(amount)} {unit}"
+    if unit == "ч.л.":
+        # Ложки округляем вверх до половины
+        if amount >= 3:
+            return f"{_format_number(math.ceil(amount / 3 * 2) / 2)} ст.л."
+        return f"{_format_number(math.ceil(amount * 2) / 2)} ч.л."
+    # Штучное покупаем целиком
+    return f"{math.ceil(amount - 1e-9)} {unit}"
+
+
+class ShoppingList:
+    """Sums ingredient quantities per canonical product and unit.
+
+    Products are matched by their word stems, so "Куриное яйцо" and "яйца
+    куриные" are one line. Quantities in different unit families (grams and
+    pieces) are listed side by side rather than converted.
+    """
+
+    def __init__(self):
+        self._products = {}  # основы названия -> [название, {единица: количество}, есть ли без количества]
+
+    def add(self, ingredient, multiplier=1):
+        key = frozenset(product_stems(ingredient.name))
+        entry = self._products.setdefault(key, [ingredient.name.strip().capitalize(), {}, False])
+        if ingredient.amount is None:
+            entry[2] = True
+        else:
+            entry[1][ingredient.unit] = entry[1].get(ingredient.unit, 0) + ingredient.amount * multiplier
+
+    def __len__(self):
+        return len(self._products)
+
+    def items(self):
+        for name, amounts, uncounted in self._products.values():
+            parts = [format_amount(amount, unit) for unit, amount in amounts.items()]
+            if not parts and uncounted:
+                parts = ["по вкусу"]
+            yield name, " + ".join(parts)
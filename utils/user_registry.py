@@ -0,0 +1,87 @@
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class UserRegistry:
+    """Registered users and the paths of their files, stored in SQLite.
+
+    `user_id` is the primary key, so lookups and upserts do not depend on the
+    number of users. WAL mode lets several processes read while one writes.
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    user_info_file TEXT NOT NULL DEFAULT '',
+                    meal_plan_file TEXT NOT NULL DEFAULT '',
+                    cook_file_path TEXT NOT NULL DEFAULT '',
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def upsert(self, user_id, user_info_file=None, meal_plan_file=None, cook_file_path=None):
+        # None означает "оставить текущее значение"
+        with self._lock, self._db:
+            self._db.execute("""
+                INSERT INTO users (user_id, user_info_file, meal_plan_file, cook_file_path, updated_at)
+                VALUES (?, COALESCE(?, ''), COALESCE(?, ''), COALESCE(?, ''), ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    user_info_file = COALESCE(?, user_info_file),
+                    meal_plan_file = COALESCE(?, meal_plan_file),
+                    cook_file_path = COALESCE(?, cook_file_path),
+                    updated_at = excluded.updated_at
+            """, (user_id, user_info_file, meal_plan_file, cook_file_path, time.time(),
+                  user_info_file, meal_plan_file, cook_file_path))
+
+    def get(self, user_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def exists(self, user_id):
+        return self.get(user_id) is not None
+
+    def user_ids(self):
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT user_id FROM users")}
+
+    def clear_plan(self, user_id):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE users SET meal_plan_file = '', cook_file_path = '', updated_at = ? WHERE user_id = ?",
+                (time.time(), user_id),
+            )
+        return cursor.rowcount > 0
+
+    def migrate_from_csv(self, csv_path):
+        """Import users from the old pandas CSV once, then rename the file."""
+        migrated = 0
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    user_id = int(float(row['user_id']))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                self.upsert(
+                    user_id,
+                    user_info_file=row.get('user_info_file') or '',
+                    meal_plan_file=row.get('plan_file_path') or row.get('meal_plan_link') or '',
+                    cook_file_path=row.get('cook_file_path') or '',
+                )
+                migrated += 1
+
+        os.replace(csv_path, csv_path + '.migrated')
+        logging.info(f"Перенесено пользователей из {csv_path}: {migrated}.")
+        return migrated